@@ -1,20 +1,21 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import os
-import random
-import json
 import threading
 import time
-import datetime
 import sys
 
 # Add backend to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from utils import load_model, detect_threat
-    from database import init_db, log_threat, get_stats
+    from database import init_db, get_stats, query_threats, shutdown_db
+    from broadcast import Broadcaster, DEFAULT_ROOM
+    from model_registry import ModelRegistry
+    from serving import (ThreatResultSink, flow_index_from_env, flow_source_from_env,
+                         load_serving_model, mark_rolled_back, model_sources, parse_threat_query,
+                         read_model_info, threat_response_chunks)
 except ImportError as e:
     print(f"Import error: {e}")
     raise
@@ -23,61 +24,45 @@ app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', ping_timeout=60, ping_interval=25)
 
-model = None
 model_info = {}
-model_lock = threading.Lock()
-threat_counter = 0
+
+# Built by the monitor thread, so torch is imported after the server is already answering /health
+batcher = None
+# Started in __main__; subscriptions can register before then
+broadcaster = Broadcaster(
+    socketio, get_stats,
+    interval_ms=float(os.environ.get('BROADCAST_INTERVAL_MS', 250)),
+    max_client_queue=int(os.environ.get('BROADCAST_MAX_CLIENT_QUEUE', 64)),
+    new_threat_events=os.environ.get('BROADCAST_NEW_THREAT', '0') == '1'
+)
+result_sink = ThreatResultSink(broadcaster)
 
 def load_model_info():
     global model_info
-    try:
-        info_path = os.path.join(os.path.dirname(__file__), 'models', 'model_info.json')
-        if os.path.exists(info_path):
-            with open(info_path, 'r') as f:
-                model_info = json.load(f)
-        else:
-            print(f"Model info file not found at {info_path}")
-            model_info = {
-                "model_architecture": "GCN-Threat-Detector",
-                "parameter_count": 452485,
-                "accuracy_percentage": 78.47,
-                "status": "Running"
-            }
-    except Exception as e:
-        print(f"Error loading model_info.json: {e}")
-        model_info = {
-            "model_architecture": "GCN-Threat-Detector",
-            "parameter_count": 452485,
-            "accuracy_percentage": 78.47,
-            "status": "Running"
-        }
+    current = registry.current
+    model_info = dict(read_model_info(), **(current.to_dict() if current is not None else {}))
+
+
+def announce_model(version):
+    """Tell every dashboard which model version is now serving"""
+    load_model_info()
+    socketio.emit('model_info', model_info)
+
+
+registry = ModelRegistry(model_sources, load_serving_model,
+                         poll_interval=float(os.environ.get('MODEL_POLL_INTERVAL', 5)),
+                         on_change=announce_model, reject=mark_rolled_back)
 
 
 def get_or_load_model():
-    global model
-    if model is None:
-        with model_lock:
-            if model is None:
-                try:
-                    model_path = os.path.join(os.path.dirname(__file__), 'models', 'gcn_threat_detector.pth')
-                    print(f"Loading model from: {model_path}")
-                    if not os.path.exists(model_path):
-                        print(f"Model file not found, creating dummy model...")
-                        # Return None to use dummy detection
-                        return None
-                    model = load_model(model_path)
-                    if model:
-                        print("✓ Model loaded successfully")
-                    else:
-                        print("Failed to load model")
-                except Exception as e:
-                    print(f"Error loading model: {e}")
-    return model
+    # Called once per batch: a swapped-in version is picked up by the next batch
+    return registry.get()
 
 
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({"status": "healthy", "service": "PRATIRAKSHA-Lite"})
+    # Healthy as soon as the server is up; model_ready turns true once the first version is warmed up
+    return jsonify({"status": "healthy", "service": "PRATIRAKSHA-Lite", "model_ready": registry.current is not None})
 
 
 @app.route('/api/stats', methods=['GET'])
@@ -85,162 +70,113 @@ def stats_route():
     return jsonify(get_stats())
 
 
+@app.route('/api/threats', methods=['GET'])
+def threats_route():
+    """Threat history, newest first, paged by ?cursor= (each record carries its own cursor)
+
+    Filters: type, status, ip, start, end (ISO timestamps). limit defaults to
+    100 for JSON; format=ndjson streams one record per line and, without a
+    limit, the whole matching history.
+    """
+    try:
+        query, fmt = parse_threat_query(request.args)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    chunks = threat_response_chunks(query_threats(**query), fmt, query['limit'])
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(stream_with_context(chunks), mimetype=mimetype)
+
+
+@app.route('/api/model', methods=['GET'])
+def model_versions_route():
+    return jsonify(registry.versions())
+
+
+@app.route('/api/model/rollback', methods=['POST'])
+def model_rollback_route():
+    try:
+        version = registry.rollback()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify(version.to_dict())
+
+
 @socketio.on('connect')
 def handle_connect():
     print(f"✓ Client connected!")
     emit('model_info', model_info)
     emit('stats_update', get_stats())
+    join_room(DEFAULT_ROOM)
 
 
-def listen_to_network_flow():
-    """Generate simulated network flow data"""
-    threat_weights = [2, 8, 8, 20, 10]  # Benign, Cryptolocker, Locky, Ransomware, WannaCry
-    threat_index = random.choices([0, 1, 2, 3, 4], weights=threat_weights, k=1)[0]
-    
-    threat_classes = {
-        0: "Benign",
-        1: "Cryptolocker",
-        2: "Locky",
-        3: "Ransomware", 
-        4: "WannaCry"
-    }
-    
-    flow = {
-        "src_ip": f"192.168.{random.randint(1, 254)}.{random.randint(2, 254)}",
-        "dst_ip": f"10.0.{random.randint(1, 254)}.{random.randint(1, 254)}",
-        "duration": random.uniform(0, 100),
-        "protocol": random.choice([6, 17]),
-        "src_bytes": random.uniform(0, 50000),
-        "dst_bytes": random.uniform(0, 50000),
-        "packets": random.randint(1, 200),
-        "tcp_flags": random.randint(0, 255),
-        "active_time": random.uniform(0, 100),
-        "idle_time": random.uniform(0, 100)
-    }
-    
-    threat_name = threat_classes[threat_index]
-    
-    if threat_index == 3:  # Ransomware
-        flow["duration"] = random.uniform(70, 95)
-        flow["src_bytes"] = random.uniform(35000, 50000)
-        flow["dst_bytes"] = random.uniform(10000, 30000)
-        flow["packets"] = random.randint(140, 200)
-        flow["active_time"] = random.uniform(60, 95)
-        flow["protocol"] = 6
-        flow["tcp_flags"] = random.choice([16, 24, 25])
-        
-    elif threat_index == 1:  # Cryptolocker
-        flow["duration"] = random.uniform(50, 85)
-        flow["src_bytes"] = random.uniform(25000, 45000)
-        flow["dst_bytes"] = random.uniform(8000, 25000)
-        flow["packets"] = random.randint(100, 160)
-        flow["protocol"] = 6
-        flow["tcp_flags"] = random.choice([16, 24])
-        flow["active_time"] = random.uniform(45, 80)
-        
-    elif threat_index == 2:  # Locky
-        flow["duration"] = random.uniform(40, 75)
-        flow["src_bytes"] = random.uniform(20000, 40000)
-        flow["dst_bytes"] = random.uniform(5000, 20000)
-        flow["packets"] = random.randint(80, 140)
-        flow["active_time"] = random.uniform(35, 70)
-        
-    elif threat_index == 4:  # WannaCry
-        flow["duration"] = random.uniform(60, 90)
-        flow["src_bytes"] = random.uniform(30000, 48000)
-        flow["dst_bytes"] = random.uniform(12000, 32000)
-        flow["packets"] = random.randint(120, 180)
-        flow["protocol"] = random.choice([6, 17])
-        flow["tcp_flags"] = random.choice([16, 17, 24, 25])
-        flow["active_time"] = random.uniform(50, 85)
-    
-    else:  # Benign
-        flow["duration"] = random.uniform(5, 30)
-        flow["src_bytes"] = random.uniform(100, 8000)
-        flow["dst_bytes"] = random.uniform(500, 12000)
-        flow["packets"] = random.randint(5, 50)
-        flow["active_time"] = random.uniform(5, 25)
-    
-    return flow, threat_name
+@socketio.on('disconnect')
+def handle_disconnect(*args):
+    broadcaster.unsubscribe(request.sid)
+
+
+@socketio.on('subscribe')
+def handle_subscribe(filters=None):
+    """Move this client to the room for its filters: types, min_confidence, subnet, malicious_only"""
+    try:
+        old_room, room = broadcaster.subscribe(request.sid, filters)
+    except (TypeError, ValueError) as e:
+        emit('subscription_error', {'error': str(e)})
+        return
+    if old_room != room:
+        leave_room(old_room)
+        join_room(room)
+    emit('subscribed', {'room': room})
+
+
+def start_detector():
+    """Worker processes if DETECTION_WORKERS > 0, else in-process micro-batching"""
+    global batcher
+    num_workers = int(os.environ.get('DETECTION_WORKERS', 0))
+    use_workers = num_workers > 0 and get_or_load_model() is not None
+    neighbor_index = flow_index_from_env(worker_pool=use_workers)
+    if use_workers:
+        from worker_pool import DetectionWorkerPool
+        batcher = DetectionWorkerPool(get_or_load_model, num_workers=num_workers)
+        print(f"  ✓ Detection worker pool started ({num_workers} processes)", flush=True)
+    else:
+        if num_workers > 0:
+            print("  ✗ No model loaded, falling back to in-process detection", flush=True)
+        from batch_inference import MicroBatcher
+        batcher = MicroBatcher(get_or_load_model, neighbor_index=neighbor_index)
+        print("  ✓ Batched detector started", flush=True)
 
 
 def monitor_network():
-    """Monitor network and emit threats"""
-    global threat_counter
+    """Pull flow batches from the configured source as they arrive and score them with the model"""
+    start_detector()
     print("✓ Network monitoring started")
-    import sys
     sys.stdout.flush()
-    
-    while True:
-        try:
-            # Waiting time between detections: 25-23 seconds
-            delay = random.uniform(23, 25)
-            print(f"[Monitor] Waiting {delay:.1f}s before next detection...", flush=True)
-            time.sleep(delay)
-            
-            new_flow, threat_name = listen_to_network_flow()
-            current_model = get_or_load_model()
-            
-            # Create threat detection (with or without model)
-            now = datetime.datetime.now()
-            
-            # Generate confidence based on threat type
-            if threat_name == "Benign":
-                confidence = 0.95
-            else:
-                confidence = random.uniform(0.75, 0.98)
-            
-            threat = {
-                "timestamp": now,
-                "timestamp_str": now.isoformat(),
-                "source_ip": new_flow["src_ip"],
-                "dest_ip": new_flow["dst_ip"],
-                "threat_type": threat_name,
-                "confidence": confidence,
-                "status": "BLOCKED" if threat_name != "Benign" else "BENIGN"
-            }
-            
-            # Emit all threats to frontend (benign and malicious)
-            frontend_threat = {
-                'timestamp': threat['timestamp_str'],
-                'source_ip': threat['source_ip'],
-                'dest_ip': threat['dest_ip'],
-                'threat_type': threat['threat_type'],
-                'confidence': f"{threat['confidence']:.0%}",
-                'status': threat['status']
-            }
-            
-            if threat_name != "Benign":
-                threat_counter += 1
-                print(f"🚨 [{threat_counter}] {threat_name:15} | {threat['source_ip']:20} | Conf: {confidence:.0%}", flush=True)
-                
-                # Log to database
-                try:
-                    db_threat = {
-                        'timestamp': now,
-                        'source_ip': threat['source_ip'],
-                        'dest_ip': threat['dest_ip'],
-                        'threat_type': threat['threat_type'],
-                        'confidence': threat['confidence'],
-                        'status': threat['status']
-                    }
-                    log_threat(db_threat)
-                except Exception as db_err:
-                    print(f"  Database error: {db_err}", flush=True)
-            
-            # Emit to connected clients
+    batch_size = int(os.environ.get('MONITOR_BATCH_SIZE', 256))
+
+    source = flow_source_from_env()
+    print(f"[Monitor] Reading flows from {type(source).__name__}", flush=True)
+    with source:
+        while True:
             try:
-                socketio.emit('new_threat', frontend_threat, to=None)
-                socketio.emit('stats_update', get_stats(), to=None)
-                print(f"  ✓ Emitted to frontend", flush=True)
-            except Exception as emit_err:
-                print(f"  ✗ Emit error: {emit_err}", flush=True)
-                    
-        except Exception as e:
-            print(f"Error in monitoring: {e}", flush=True)
-            import traceback
-            traceback.print_exc()
-            time.sleep(2)
+                if get_or_load_model() is None:
+                    print("[Monitor] No model loaded, retrying in 10s...", flush=True)
+                    time.sleep(10)
+                    continue
+
+                flows = source.read(max_flows=batch_size, timeout=1.0)
+                if flows is None:
+                    print("[Monitor] Flow source exhausted", flush=True)
+                    return
+                if flows:
+                    results = [future.result() for future in batcher.submit_many(flows)]
+                    result_sink.handle(flows, results)
+
+            except Exception as e:
+                print(f"Error in monitoring: {e}", flush=True)
+                import traceback
+                traceback.print_exc()
+                time.sleep(2)
 
 
 if __name__ == '__main__':
@@ -260,7 +196,15 @@ if __name__ == '__main__':
         
         print("\n[*] Starting backend server on port 5002...")
         
-        # Start network monitoring thread
+        # Load and warm up the model in the background, then watch for newly deployed versions
+        registry.start()
+        print("  ✓ Model registry loading the model in the background")
+        
+        # Start the coalescing broadcaster
+        broadcaster.start()
+        print("  ✓ Broadcaster started")
+        
+        # Start network monitoring thread (it builds the detector once the model is loaded)
         monitor_thread = threading.Thread(target=monitor_network, daemon=True)
         monitor_thread.start()
         print("  ✓ Network monitoring thread started")
@@ -295,3 +239,9 @@ if __name__ == '__main__':
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        registry.stop()
+        if batcher is not None:
+            batcher.close()
+        broadcaster.stop()
+        shutdown_db()
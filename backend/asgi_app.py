@@ -0,0 +1,295 @@
+"""
+Asyncio serving mode: python-socketio AsyncServer on ASGI with the same
+Socket.IO events (model_info, stats_update, threat_batch, subscribe, and
+new_threat with BROADCAST_NEW_THREAT=1) and REST endpoints as app.py
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5002
+    python asgi_app.py
+
+Flow batches move source -> inference -> persistence through asyncio
+queues. Blocking work (source reads, model forward passes, database
+writes, stats) runs in executors, so the event loop only moves batches
+and websocket frames.
+"""
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import socketio
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import init_db, get_stats, query_threats, shutdown_db
+from broadcast import AsyncBroadcaster, DEFAULT_ROOM
+from model_registry import ModelRegistry
+from serving import (ThreatResultSink, flow_index_from_env, flow_source_from_env,
+                     load_serving_model, mark_rolled_back, model_sources, parse_threat_query,
+                     read_model_info, threat_response_chunks)
+
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*', ping_timeout=60, ping_interval=25)
+
+model_info = {}
+loop = None
+
+broadcaster = AsyncBroadcaster(
+    sio, get_stats,
+    interval_ms=float(os.environ.get('BROADCAST_INTERVAL_MS', 250)),
+    max_client_queue=int(os.environ.get('BROADCAST_MAX_CLIENT_QUEUE', 64)),
+    new_threat_events=os.environ.get('BROADCAST_NEW_THREAT', '0') == '1'
+)
+result_sink = ThreatResultSink(broadcaster)
+pipeline = None
+pipeline_task = None
+
+
+def announce_model(version):
+    """Tell every dashboard which model version is now serving (called from the registry thread)"""
+    global model_info
+    model_info = dict(read_model_info(), **version.to_dict())
+    if loop is not None:
+        asyncio.run_coroutine_threadsafe(sio.emit('model_info', model_info), loop)
+
+
+registry = ModelRegistry(model_sources, load_serving_model,
+                         poll_interval=float(os.environ.get('MODEL_POLL_INTERVAL', 5)),
+                         on_change=announce_model, reject=mark_rolled_back)
+
+
+def get_or_load_model():
+    # Called once per batch: a swapped-in version is picked up by the next batch
+    return registry.get()
+
+
+class AsyncDetectionPipeline:
+    """source -> flows queue -> executor inference -> results queue -> executor persistence + broadcast
+
+    Both queues are bounded, so a slow stage backs up into the source
+    instead of growing memory. With a DetectionWorkerPool as `detector`,
+    scoring goes to its worker processes; otherwise detect_threats runs on
+    the inference threads.
+    """
+
+    def __init__(self, source, get_model, sink, neighbor_index=None, detector=None,
+                 batch_size=256, queue_size=16, inference_threads=2):
+        self.source = source
+        self.get_model = get_model
+        self.sink = sink
+        self.neighbor_index = neighbor_index
+        self.detector = detector
+        self.batch_size = batch_size
+        self.inference_threads = inference_threads
+        self.flows = asyncio.Queue(maxsize=queue_size)
+        self.results = asyncio.Queue(maxsize=queue_size)
+        self.source_executor = ThreadPoolExecutor(1, thread_name_prefix='flow-source')
+        self.inference_executor = ThreadPoolExecutor(inference_threads, thread_name_prefix='inference')
+        self.db_executor = ThreadPoolExecutor(1, thread_name_prefix='threat-db')
+
+    def _score(self, flows):
+        if self.detector is not None:
+            return [future.result() for future in self.detector.submit_many(flows)]
+        from utils import detect_threats
+        return detect_threats(self.get_model(), flows, self.neighbor_index)
+
+    async def run(self):
+        try:
+            await asyncio.gather(self._ingest(), self._persist(),
+                                 *(self._infer() for _ in range(self.inference_threads)))
+        finally:
+            self.source.close()
+            for executor in (self.source_executor, self.inference_executor, self.db_executor):
+                executor.shutdown(wait=False)
+
+    async def _ingest(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                if await loop.run_in_executor(self.inference_executor, self.get_model) is None:
+                    print("[Monitor] No model loaded, retrying in 10s...", flush=True)
+                    await asyncio.sleep(10)
+                    continue
+                flows = await loop.run_in_executor(self.source_executor, self.source.read, self.batch_size, 1.0)
+                if flows is None:
+                    print("[Monitor] Flow source exhausted", flush=True)
+                    return
+                if flows:
+                    await self.flows.put(flows)
+        finally:
+            for _ in range(self.inference_threads):
+                await self.flows.put(None)
+
+    async def _infer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            flows = await self.flows.get()
+            if flows is None:
+                await self.results.put(None)
+                return
+            try:
+                results = await loop.run_in_executor(self.inference_executor, self._score, flows)
+                await self.results.put((flows, results))
+            except Exception as e:
+                print(f"Error in monitoring: {e}", flush=True)
+
+    async def _persist(self):
+        loop = asyncio.get_running_loop()
+        remaining = self.inference_threads
+        while remaining:
+            item = await self.results.get()
+            if item is None:
+                remaining -= 1
+                continue
+            try:
+                await loop.run_in_executor(self.db_executor, self.sink.handle, *item)
+            except Exception as e:
+                print(f"Error in monitoring: {e}", flush=True)
+
+
+@sio.event
+async def connect(sid, environ, auth=None):
+    print("✓ Client connected!")
+    await sio.emit('model_info', model_info, to=sid)
+    await sio.emit('stats_update', await asyncio.to_thread(get_stats), to=sid)
+    await sio.enter_room(sid, DEFAULT_ROOM)
+
+
+@sio.event
+async def disconnect(sid, *args):
+    broadcaster.unsubscribe(sid)
+
+
+@sio.event
+async def subscribe(sid, filters=None):
+    """Move this client to the room for its filters: types, min_confidence, subnet, malicious_only"""
+    try:
+        old_room, room = broadcaster.subscribe(sid, filters)
+    except (TypeError, ValueError) as e:
+        await sio.emit('subscription_error', {'error': str(e)}, to=sid)
+        return
+    if old_room != room:
+        await sio.leave_room(sid, old_room)
+        await sio.enter_room(sid, room)
+    await sio.emit('subscribed', {'room': room}, to=sid)
+
+
+async def _send_json(send, payload, status=200):
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'), (b'access-control-allow-origin', b'*')
+    ]})
+    await send({'type': 'http.response.body', 'body': json.dumps(payload).encode()})
+
+
+def _next_chunks(chunks, count=500):
+    """Pull up to count serialized pieces from a blocking generator (runs in an executor)"""
+    parts = []
+    for part in chunks:
+        parts.append(part)
+        if len(parts) >= count:
+            break
+    return ''.join(parts)
+
+
+async def _stream_threats(send, args):
+    try:
+        query, fmt = parse_threat_query(args)
+    except (ValueError, TypeError) as e:
+        await _send_json(send, {"error": str(e)}, status=400)
+        return
+
+    mimetype = b'application/x-ndjson' if fmt == 'ndjson' else b'application/json'
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', mimetype), (b'access-control-allow-origin', b'*')
+    ]})
+    loop = asyncio.get_running_loop()
+    chunks = threat_response_chunks(query_threats(**query), fmt, query['limit'])
+    while True:
+        body = await loop.run_in_executor(None, _next_chunks, chunks)
+        if not body:
+            break
+        await send({'type': 'http.response.body', 'body': body.encode(), 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def rest_app(scope, receive, send):
+    """/health, /api/stats, /api/threats and /api/model, as served by app.py"""
+    if scope['type'] != 'http':
+        return
+    path = scope['path'].rstrip('/')
+    if path == '/health':
+        await _send_json(send, {"status": "healthy", "service": "PRATIRAKSHA-Lite",
+                                "model_ready": registry.current is not None})
+    elif path == '/api/stats':
+        await _send_json(send, await asyncio.to_thread(get_stats))
+    elif path == '/api/model':
+        await _send_json(send, registry.versions())
+    elif path == '/api/model/rollback' and scope['method'] == 'POST':
+        try:
+            version = await asyncio.get_running_loop().run_in_executor(None, registry.rollback)
+        except ValueError as e:
+            await _send_json(send, {"error": str(e)}, status=409)
+            return
+        await _send_json(send, version.to_dict())
+    elif path == '/api/threats':
+        args = {key: values[-1] for key, values in parse_qs(scope['query_string'].decode()).items()}
+        await _stream_threats(send, args)
+    else:
+        await _send_json(send, {"error": "not found"}, status=404)
+
+
+async def startup():
+    global model_info, pipeline_task, loop
+    loop = asyncio.get_running_loop()
+    init_db()
+    model_info = read_model_info()
+    broadcaster.start()
+    # Loads and warms up the model in the background; startup returns without waiting for torch
+    registry.start()
+    pipeline_task = loop.create_task(run_pipeline())
+    print("✓ ASGI backend ready", flush=True)
+
+
+def build_detector():
+    """DetectionWorkerPool if DETECTION_WORKERS > 0 and a model loads, else None (runs in an executor)"""
+    num_workers = int(os.environ.get('DETECTION_WORKERS', 0))
+    if num_workers > 0 and get_or_load_model() is not None:
+        from worker_pool import DetectionWorkerPool
+        return DetectionWorkerPool(get_or_load_model, num_workers=num_workers)
+    return None
+
+
+async def run_pipeline():
+    global pipeline
+    loop = asyncio.get_running_loop()
+    # Both import torch, which would otherwise stall the event loop for seconds
+    detector = await loop.run_in_executor(None, build_detector)
+    neighbor_index = await loop.run_in_executor(None, flow_index_from_env, detector is not None)
+    pipeline = AsyncDetectionPipeline(
+        flow_source_from_env(), get_or_load_model, result_sink,
+        neighbor_index=neighbor_index, detector=detector,
+        batch_size=int(os.environ.get('MONITOR_BATCH_SIZE', 256)),
+        inference_threads=int(os.environ.get('INFERENCE_THREADS', 2))
+    )
+    await pipeline.run()
+
+
+async def shutdown():
+    if pipeline_task is not None:
+        pipeline_task.cancel()
+    if pipeline is not None:
+        if pipeline.detector is not None:
+            pipeline.detector.close()
+    registry.stop()
+    await broadcaster.stop()
+    shutdown_db()
+
+
+app = socketio.ASGIApp(sio, other_asgi_app=rest_app, on_startup=startup, on_shutdown=shutdown)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5002)), log_level='warning')
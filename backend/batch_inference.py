@@ -0,0 +1,101 @@
+"""
+Micro-batching inference engine: collects incoming flows and scores them
+in batches behind the same result format as utils.detect_threat
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from utils import detect_threats
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """Groups submitted flows into micro-batches by size or deadline and scores each batch in one forward pass"""
+
+    def __init__(self, get_model, max_batch_size=256, max_delay_ms=5.0, max_pending=65536, neighbor_index=None):
+        # get_model is called once per batch so a swapped model is picked up between batches
+        self.get_model = get_model
+        self.neighbor_index = neighbor_index
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, flow):
+        """Queue one flow; returns a Future resolving to its threat dict (or None)"""
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        future = Future()
+        self._queue.put((flow, future))
+        return future
+
+    def submit_many(self, flows):
+        return [self.submit(flow) for flow in flows]
+
+    def detect(self, flow, timeout=None):
+        """Blocking drop-in for detect_threat(model, flow)"""
+        return self.submit(flow).result(timeout=timeout)
+
+    def close(self, timeout=None):
+        """Stop accepting flows, score everything already queued and stop the worker"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _collect(self):
+        """Block for the first flow, then fill the batch until it is full or the deadline passes"""
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if batch:
+                self._score(batch)
+        # Drain whatever raced in behind the stop marker
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        for start in range(0, len(leftover), self.max_batch_size):
+            self._score(leftover[start:start + self.max_batch_size])
+
+    def _score(self, batch):
+        flows = [flow for flow, _ in batch]
+        try:
+            model = self.get_model()
+            results = detect_threats(model, flows, self.neighbor_index)
+            if len(batch) > 1 and all(result is None for result in results):
+                # A malformed flow fails the whole batch; isolate it by scoring one at a time
+                results = [detect_threats(model, [flow], self.neighbor_index)[0] for flow in flows]
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
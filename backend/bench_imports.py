@@ -0,0 +1,96 @@
+"""
+Benchmark: cold-start import time of the serving modules, from python -X importtime
+
+Usage: python bench_imports.py [module ...] [--repeat 5] [--top 10] [--health]
+
+Each module is imported in a fresh interpreter. The report shows the best
+total of several runs and the heaviest top-level imports. It flags any
+training-only or runtime package that has leaked into the serving import
+graph; torch is meant to load in the background, after the server is up.
+With --health it also starts app.py and times its first /health response.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVING_MODULES = ('app', 'asgi_app')
+# Must not be imported before the server can answer /health
+DEFERRED_PACKAGES = ('torch', 'torch_geometric', 'pandas', 'sklearn', 'onnxruntime')
+
+
+def import_times(module):
+    """{module: (self_us, cumulative_us, indent)} for one cold import of module"""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                               cwd=BACKEND_DIR, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us), len(name) - len(name.lstrip()))
+    return times
+
+
+def top_level(times, module, count):
+    """Heaviest direct imports of module, by cumulative time"""
+    depth = times[module][2] + 2
+    children = [(name, cumulative) for name, (_, cumulative, indent) in times.items() if indent == depth]
+    return sorted(children, key=lambda item: item[1], reverse=True)[:count]
+
+
+def time_to_health(port=5002, timeout=60.0):
+    """Seconds from starting app.py until /health answers, and the model_ready it reported"""
+    server = subprocess.Popen([sys.executable, 'app.py'], cwd=BACKEND_DIR,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    start = time.perf_counter()
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f'http://localhost:{port}/health', timeout=1) as response:
+                    body = response.read().decode()
+                return time.perf_counter() - start, '"model_ready":true' in body.replace(' ', '')
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError(f"/health did not answer within {timeout:.0f}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import time of the serving modules")
+    parser.add_argument('modules', nargs='*', default=list(SERVING_MODULES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--health', action='store_true', help="also time app.py's first /health response")
+    args = parser.parse_args()
+
+    leaked = False
+    for module in args.modules:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        best = min(runs, key=lambda times: times[module][1])
+        print(f"\nimport {module}: {best[module][1] / 1000:,.0f} ms (best of {args.repeat})")
+        print(f"  {'top-level import':<40}{'cumulative ms':>15}")
+        for name, cumulative in top_level(best, module, args.top):
+            print(f"  {name:<40}{cumulative / 1000:>15,.1f}")
+        present = [package for package in DEFERRED_PACKAGES if package in best]
+        if present:
+            leaked = True
+            print(f"  ✗ deferred packages imported at startup: {', '.join(present)}")
+        else:
+            print("  ✓ no deferred packages imported at startup")
+
+    if args.health:
+        seconds, model_ready = time_to_health()
+        print(f"\napp.py answered /health after {seconds:.2f} s (model_ready={str(model_ready).lower()})")
+    return 1 if leaked else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Coalesced Socket.IO broadcasting: detections are buffered and sent as
+periodic `threat_batch` frames, stats only when they change
+"""
+import ipaddress
+import json
+import threading
+from collections import deque
+
+DEFAULT_ROOM = 'all'
+
+
+def _address(value):
+    try:
+        return ipaddress.ip_address(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ThreatFilter:
+    """Subscription filter; clients with equal filters share one room, so each event is filtered once per room"""
+
+    def __init__(self, types=None, min_confidence=None, subnet=None, malicious_only=False):
+        if isinstance(types, str):
+            types = [types]
+        self.types = frozenset(types) if types else None
+        self.min_confidence = float(min_confidence) if min_confidence is not None else None
+        self.subnet = ipaddress.ip_network(subnet, strict=False) if subnet else None
+        self.malicious_only = bool(malicious_only)
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        if not isinstance(data, dict):
+            raise ValueError("subscription filters must be an object")
+        unknown = set(data) - {'types', 'min_confidence', 'subnet', 'malicious_only'}
+        if unknown:
+            raise ValueError(f"unknown filter(s): {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+    def to_dict(self):
+        return {
+            'types': sorted(self.types) if self.types else None,
+            'min_confidence': self.min_confidence,
+            'subnet': str(self.subnet) if self.subnet else None,
+            'malicious_only': self.malicious_only
+        }
+
+    @property
+    def room(self):
+        key = {name: value for name, value in self.to_dict().items() if value}
+        return 'filter:' + json.dumps(key, sort_keys=True) if key else DEFAULT_ROOM
+
+    def matches(self, event):
+        threat, confidence, addresses = event
+        if self.malicious_only and threat.get('status') == 'BENIGN':
+            return False
+        if self.types is not None and threat.get('threat_type') not in self.types:
+            return False
+        if self.min_confidence is not None and (confidence is None or confidence < self.min_confidence):
+            return False
+        if self.subnet is not None and not any(address in self.subnet for address in addresses
+                                               if address is not None and address.version == self.subnet.version):
+            return False
+        return True
+
+
+class Broadcaster:
+    """Buffers threats and flushes them every interval_ms as one `threat_batch` frame
+
+    Clients sit in one room per distinct ThreatFilter ('all' by default);
+    every flush filters the buffered threats once per room and emits the
+    frame once to that room, so python-socketio encodes the packet once and
+    shares it across the room's clients. Clients whose engine.io send
+    queue holds more than max_client_queue packets are skipped for that frame
+    instead of letting them back up the server; a skipped client that missed
+    a stats delta gets the full stats once its queue has drained. The
+    pending buffer is bounded too; when it is full the oldest threats are
+    dropped. With new_threat_events, each threat is also sent as its own
+    `new_threat` event for clients that predate threat_batch.
+    """
+
+    def __init__(self, socketio, get_stats, interval_ms=250, max_pending=1000, max_client_queue=64, namespace='/',
+                 new_threat_events=False):
+        self.socketio = socketio
+        self.get_stats = get_stats
+        self.interval = interval_ms / 1000.0
+        self.max_client_queue = max_client_queue
+        self.namespace = namespace
+        self.new_threat_events = new_threat_events
+        self.dropped = 0
+        self.skipped = 0
+        self._pending = deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+        self._last_stats = {}
+        self._filters = {DEFAULT_ROOM: ThreatFilter()}
+        self._client_rooms = {}
+        # Clients skipped for a stats delta; their totals are stale until they get a full snapshot
+        self._stale = set()
+        self._running = False
+        self._task = None
+
+    def publish(self, threat, confidence=None):
+        """Queue a threat payload; confidence is the numeric score room filters compare against"""
+        event = (threat, confidence, (_address(threat.get('source_ip')), _address(threat.get('dest_ip'))))
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append(event)
+
+    def subscribe(self, sid, filters):
+        """Register a client's filter; returns (old_room, new_room) for the caller to leave / join"""
+        threat_filter = ThreatFilter.from_dict(filters)
+        room = threat_filter.room
+        with self._lock:
+            self._filters.setdefault(room, threat_filter)
+            old_room = self._client_rooms.get(sid, DEFAULT_ROOM)
+            self._client_rooms[sid] = room
+        return old_room, room
+
+    def unsubscribe(self, sid):
+        with self._lock:
+            self._stale.discard(sid)
+            return self._client_rooms.pop(sid, DEFAULT_ROOM)
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._task = self.socketio.start_background_task(self._run)
+        return self
+
+    def stop(self):
+        """Stop the loop after sending whatever is still buffered"""
+        self._running = False
+        self.flush()
+
+    def _run(self):
+        while self._running:
+            self.socketio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"  ✗ Broadcast error: {e}", flush=True)
+
+    @property
+    def server(self):
+        """The python-socketio server (Flask-SocketIO wraps it; an AsyncServer is one itself)"""
+        return getattr(self.socketio, 'server', None) or self.socketio
+
+    def _slow_clients(self):
+        server = self.server
+        slow = []
+        for sid, eio_sid in server.manager.get_participants(self.namespace, None):
+            socket = server.eio.sockets.get(eio_sid)
+            if socket is not None and socket.queue.qsize() > self.max_client_queue:
+                slow.append(sid)
+        self.skipped += len(slow)
+        return slow
+
+    def stats_delta(self):
+        """Stats keys that changed since the last frame, or None if only the uptime moved"""
+        stats = self.get_stats()
+        changed = {key: value for key, value in stats.items() if self._last_stats.get(key) != value}
+        if not set(changed) - {'uptime'}:
+            return None
+        self._last_stats = stats
+        return changed
+
+    def frames(self):
+        """Drain the buffer into (event, payload, room, skip_sid) frames, one threat_batch per room"""
+        with self._lock:
+            events = list(self._pending)
+            self._pending.clear()
+            rooms = set(self._client_rooms.values())
+            # Forget filters whose last client unsubscribed or disconnected
+            for room in set(self._filters) - rooms - {DEFAULT_ROOM}:
+                del self._filters[room]
+            filters = list(self._filters.items())
+        stats = self.stats_delta()
+        if not events and stats is None and not self._stale:
+            return []
+
+        skip = self._slow_clients()
+        frames = []
+        for room, threat_filter in filters:
+            threats = [event[0] for event in events if threat_filter.matches(event)]
+            if threats:
+                frames.append(('threat_batch', threats, room, skip))
+                if self.new_threat_events:
+                    frames.extend(('new_threat', threat, room, skip) for threat in threats)
+        with self._lock:
+            caught_up = self._stale.difference(skip)
+            self._stale.difference_update(caught_up)
+            if stats is not None:
+                self._stale.update(skip)
+        # Deltas only make sense on top of everything before them, so catch-ups get the full stats
+        for sid in sorted(caught_up):
+            frames.append(('stats_update', dict(self._last_stats), sid, None))
+        if stats is not None:
+            frames.append(('stats_update', stats, None, skip))
+        return frames
+
+    def flush(self):
+        for event, payload, room, skip in self.frames():
+            self.socketio.emit(event, payload, to=room, namespace=self.namespace, skip_sid=skip)
+
+
+class AsyncBroadcaster(Broadcaster):
+    """Broadcaster for a python-socketio AsyncServer, flushing from an asyncio task"""
+
+    async def stop(self):
+        self._running = False
+        await self.flush()
+
+    async def _run(self):
+        while self._running:
+            await self.socketio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"  ✗ Broadcast error: {e}", flush=True)
+
+    async def flush(self):
+        for event, payload, room, skip in self.frames():
+            await self.socketio.emit(event, payload, to=room, namespace=self.namespace, skip_sid=skip)
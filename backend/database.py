@@ -1,27 +1,82 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import (create_engine, event, inspect, insert, select, update, delete, func, or_, tuple_,
+                        Column, Integer, String, Float, DateTime, Index, MetaData, Table)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import declarative_base
+from collections import Counter, defaultdict
+import atexit
 import datetime
+import os
+import queue
+import threading
+import time
 
 Base = declarative_base()
 
+DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///database.db')
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+# 0 keeps threat logs forever; dropping old partitions is opt-in
+RETENTION_DAYS = int(os.environ.get('THREAT_RETENTION_DAYS', 0))
+INDEXED_COLUMNS = ('timestamp', 'status', 'threat_type', 'source_ip')
+
 class ThreatLog(Base):
+    """Unpartitioned threat log; rows found here at startup are moved into day partitions"""
     __tablename__ = 'threat_logs'
     id = Column(Integer, primary_key=True)
-    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
-    source_ip = Column(String)
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    source_ip = Column(String, index=True)
     dest_ip = Column(String)
-    threat_type = Column(String)
+    threat_type = Column(String, index=True)
     confidence = Column(Float)
-    status = Column(String)
+    status = Column(String, index=True)
 
-engine = create_engine('sqlite:///database.db', connect_args={'check_same_thread': False})
-Session = sessionmaker(bind=engine)
+class ThreatStat(Base):
+    """Running totals behind get_stats, one row per counter ('total_flows', 'status:BLOCKED', 'type:Locky', ...)"""
+    __tablename__ = 'threat_stats'
+    name = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
 
-def init_db():
-    Base.metadata.create_all(engine)
+class _RollupColumns:
+    bucket = Column(DateTime, primary_key=True)
+    threat_type = Column(String, primary_key=True)
+    status = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
 
-def log_threat(threat):
-    session = Session()
+class ThreatRollupMinute(_RollupColumns, Base):
+    __tablename__ = 'threat_rollup_minute'
+
+class ThreatRollupHour(_RollupColumns, Base):
+    __tablename__ = 'threat_rollup_hour'
+
+BASE_COUNTERS = ('total_flows', 'benign_flows', 'threats_detected')
+
+def create_db_engine(url=DATABASE_URL):
+    """Engine with an explicitly sized pool; SQLite files and server databases (PostgreSQL) alike"""
+    url = make_url(url)
+    kwargs = {'pool_pre_ping': True}
+    if url.get_backend_name() == 'sqlite':
+        kwargs['connect_args'] = {'check_same_thread': False}
+        if url.database in (None, '', ':memory:'):
+            # In-memory databases live in one connection per thread; nothing to size
+            return create_engine(url, **kwargs)
+    kwargs.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_recycle=POOL_RECYCLE)
+    return create_engine(url, **kwargs)
+
+engine = create_db_engine()
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if engine.dialect.name != 'sqlite':
+        return
+    # WAL lets readers run alongside the writer; NORMAL syncs at checkpoints instead of every commit
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+def _threat_row(threat):
     # Accept both datetime and string, convert string to datetime if needed
     ts = threat.get('timestamp')
     if isinstance(ts, str):
@@ -29,29 +84,501 @@ def log_threat(threat):
             ts = datetime.datetime.fromisoformat(ts)
         except Exception:
             ts = datetime.datetime.utcnow()
-    threat_log = ThreatLog(
-        timestamp=ts,
-        source_ip=threat.get('source_ip'),
-        dest_ip=threat.get('dest_ip'),
-        threat_type=threat.get('threat_type'),
-        confidence=threat.get('confidence'),
-        status=threat.get('status')
+    return {
+        'timestamp': ts or datetime.datetime.utcnow(),
+        'source_ip': threat.get('source_ip'),
+        'dest_ip': threat.get('dest_ip'),
+        'threat_type': threat.get('threat_type'),
+        'confidence': threat.get('confidence'),
+        'status': threat.get('status')
+    }
+
+def _threat_deltas(rows):
+    deltas = Counter(threats_detected=len(rows))
+    for row in rows:
+        deltas[f"status:{row['status']}"] += 1
+        deltas[f"type:{row['threat_type']}"] += 1
+    return deltas
+
+class ThreatCounters:
+    """In-process counters so get_stats never scans threat_logs"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self.started = time.time()
+
+    def load(self, counts):
+        with self._lock:
+            self._counts = Counter(counts)
+
+    def add(self, deltas):
+        with self._lock:
+            self._counts.update(deltas)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+counters = ThreatCounters()
+
+class ThreatPartitions:
+    """Per-day threat_logs_YYYYMMDD tables with ThreatLog's columns and indexes
+
+    Retention drops whole tables, so old data goes away without row-level
+    DELETEs or the VACUUM they would need.
+    """
+
+    prefix = 'threat_logs_'
+
+    def __init__(self):
+        self.metadata = MetaData()
+        self._tables = {}
+        self._created = set()
+        self._lock = threading.Lock()
+
+    def name(self, day):
+        return f"{self.prefix}{day:%Y%m%d}"
+
+    def table(self, day):
+        name = self.name(day)
+        with self._lock:
+            table = self._tables.get(name)
+            if table is None:
+                table = Table(
+                    name, self.metadata,
+                    Column('id', Integer, primary_key=True),
+                    Column('timestamp', DateTime),
+                    Column('source_ip', String),
+                    Column('dest_ip', String),
+                    Column('threat_type', String),
+                    Column('confidence', Float),
+                    Column('status', String)
+                )
+                for column in INDEXED_COLUMNS:
+                    Index(f"ix_{name}_{column}", table.c[column])
+                # Keyset pagination walks (timestamp, id)
+                Index(f"ix_{name}_timestamp_id", table.c.timestamp, table.c.id)
+                self._tables[name] = table
+        return table
+
+    def ensure(self, conn, day):
+        table = self.table(day)
+        if table.name not in self._created:
+            table.create(conn, checkfirst=True)
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+            self._created.add(table.name)
+        return table
+
+    def forget(self):
+        """Re-check every partition on next use; call when a transaction that ran ensure() rolled back"""
+        self._created.clear()
+
+    def days(self, conn):
+        """Days that have a partition table, oldest first"""
+        days = []
+        for name in inspect(conn).get_table_names():
+            suffix = name[len(self.prefix):]
+            if name.startswith(self.prefix) and len(suffix) == 8 and suffix.isdigit():
+                days.append(datetime.datetime.strptime(suffix, '%Y%m%d').date())
+        return sorted(days)
+
+    def drop(self, conn, day):
+        table = self.table(day)
+        table.drop(conn, checkfirst=True)
+        self._created.discard(table.name)
+
+partitions = ThreatPartitions()
+
+_UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def _update_then_insert(conn, table, rows):
+    """Portable upsert: UPDATE each key, INSERT the ones that matched nothing
+
+    Runs inside the caller's transaction. Only the threat log writer thread
+    adds to counters, so no other insert can slip in between the two.
+    """
+    keys = [column.name for column in table.primary_key]
+    missing = []
+    for row in rows:
+        stmt = (update(table)
+                .where(*(table.c[key] == row[key] for key in keys))
+                .values(count=table.c.count + row['count']))
+        if conn.execute(stmt).rowcount == 0:
+            missing.append(row)
+    bulk_insert(conn, table, missing)
+
+def _upsert_counts(conn, table, rows):
+    """Add each row's count onto the stored one (INSERT ... ON CONFLICT DO UPDATE)"""
+    if not rows:
+        return
+    dialect_insert = _UPSERT_INSERTS.get(conn.dialect.name)
+    if dialect_insert is None:
+        _update_then_insert(conn, table, rows)
+        return
+    stmt = dialect_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key],
+        set_={'count': table.c.count + stmt.excluded.count}
     )
-    session.add(threat_log)
-    session.commit()
-    session.close()
+    conn.execute(stmt, rows)
+
+def bulk_insert(conn, table, rows):
+    """One prepared INSERT executed for all rows (executemany / insertmanyvalues)"""
+    if rows:
+        conn.execute(insert(table), rows)
+
+def fetch_all(stmt, conn=None):
+    """Run a select on a pooled connection held only for the query; returns row mappings"""
+    if conn is not None:
+        return conn.execute(stmt).mappings().all()
+    with engine.connect() as conn:
+        return conn.execute(stmt).mappings().all()
+
+def write_threat_rows(conn, rows):
+    """Insert rows into their day partitions and add them to the minute and hour rollups"""
+    by_day = defaultdict(list)
+    minutes = Counter()
+    hours = Counter()
+    for row in rows:
+        ts = row['timestamp']
+        by_day[ts.date()].append(row)
+        minute = ts.replace(second=0, microsecond=0)
+        minutes[(minute, row['threat_type'], row['status'])] += 1
+        hours[(minute.replace(minute=0), row['threat_type'], row['status'])] += 1
+
+    for day, day_rows in by_day.items():
+        bulk_insert(conn, partitions.ensure(conn, day), day_rows)
+    for model, counts in ((ThreatRollupMinute, minutes), (ThreatRollupHour, hours)):
+        _upsert_counts(conn, model.__table__, [
+            {'bucket': bucket, 'threat_type': threat_type, 'status': status, 'count': count}
+            for (bucket, threat_type, status), count in counts.items()
+        ])
+
+def apply_retention(days=RETENTION_DAYS, today=None):
+    """Drop day partitions and minute rollups older than `days`; hour rollups are kept"""
+    if not days:
+        return []
+    cutoff = (today or datetime.date.today()) - datetime.timedelta(days=days)
+    with engine.begin() as conn:
+        dropped = [day for day in partitions.days(conn) if day < cutoff]
+        for day in dropped:
+            partitions.drop(conn, day)
+        conn.execute(delete(ThreatRollupMinute).where(
+            ThreatRollupMinute.bucket < datetime.datetime.combine(cutoff, datetime.time())
+        ))
+    if dropped:
+        print(f"Retention: dropped {len(dropped)} threat log partition(s) older than {cutoff}", flush=True)
+    return dropped
+
+_STOP = object()
+
+class ThreatLogWriter:
+    """Write-behind threat logger: queues rows in memory and flushes them as one multi-row INSERT
+
+    A batch is written when batch_size rows are queued or flush_interval seconds
+    have passed since its first row. The queue is bounded: log() blocks for up
+    to put_timeout seconds when it is full, then drops the row and counts it.
+    """
+
+    def __init__(self, engine, batch_size=500, flush_interval=0.5, max_pending=10000, put_timeout=1.0,
+                 retention_days=RETENTION_DAYS):
+        self.engine = engine
+        self.retention_days = retention_days
+        self._retention_day = datetime.date.today()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="threat-log-writer", daemon=True)
+        self._thread.start()
+
+    def log(self, threat):
+        """Queue one threat; returns False if it was dropped under backpressure"""
+        if self._closed:
+            raise RuntimeError("ThreatLogWriter is closed")
+        row = _threat_row(threat)
+        if not self._put(row):
+            return False
+        counters.add(_threat_deltas([row]))
+        return True
+
+    def record_flows(self, total, benign=0):
+        """Count scored flows; persisted with the next batch of threats"""
+        if self._closed:
+            raise RuntimeError("ThreatLogWriter is closed")
+        deltas = Counter(total_flows=total, benign_flows=benign)
+        if not self._put(deltas):
+            return False
+        counters.add(deltas)
+        return True
+
+    def _put(self, item):
+        try:
+            self._queue.put(item, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self, timeout=None):
+        """Block until everything queued before this call has been written"""
+        if self._closed:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """Stop accepting threats, write everything still queued and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            rows, waiters, deltas = [], [], Counter()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                elif isinstance(item, Counter):
+                    deltas.update(item)
+                else:
+                    rows.append(item)
+                # Flush requests and shutdown write immediately instead of waiting out the interval
+                if stopping or waiters or len(rows) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if stopping:
+                rows.extend(self._drain(waiters, deltas))
+            if not rows:
+                self._write([], deltas)
+            for start in range(0, len(rows), self.batch_size):
+                # Flow counts ride along with the first chunk
+                self._write(rows[start:start + self.batch_size], deltas if start == 0 else Counter())
+            for waiter in waiters:
+                waiter.set()
+
+    def _drain(self, waiters, deltas):
+        rows = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return rows
+            if isinstance(item, threading.Event):
+                waiters.append(item)
+            elif isinstance(item, Counter):
+                deltas.update(item)
+            elif item is not _STOP:
+                rows.append(item)
+
+    def _write(self, rows, deltas):
+        deltas = +(deltas + _threat_deltas(rows))
+        if not rows and not deltas:
+            return
+        try:
+            # Threat rows and the counters they move commit together
+            with self.engine.begin() as conn:
+                if rows:
+                    write_threat_rows(conn, rows)
+                _upsert_counts(conn, ThreatStat.__table__,
+                               [{'name': name, 'count': count} for name, count in deltas.items()])
+            self.written += len(rows)
+        except Exception as e:
+            # The rollback may have undone a partition this batch created
+            partitions.forget()
+            print(f"Error writing {len(rows)} threat logs: {e}", flush=True)
+
+        # Retention runs at most once per day, on the writer thread
+        today = datetime.date.today()
+        if today != self._retention_day:
+            self._retention_day = today
+            try:
+                apply_retention(self.retention_days, today)
+            except Exception as e:
+                print(f"Error applying retention: {e}", flush=True)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ThreatLogWriter(engine)
+    return _writer
+
+def _seed_stats(conn):
+    """One-time GROUP BY over an existing threat_logs table to start the counters"""
+    counts = Counter({name: 0 for name in BASE_COUNTERS})
+    for column, prefix in ((ThreatLog.status, 'status'), (ThreatLog.threat_type, 'type')):
+        for value, count in conn.execute(select(column, func.count()).group_by(column)):
+            counts[f"{prefix}:{value}"] = count
+            if prefix == 'status':
+                counts['threats_detected'] += count
+    # Flows scored before counters existed were never recorded; every logged threat was one
+    counts['total_flows'] = counts['threats_detected']
+    bulk_insert(conn, ThreatStat.__table__, [{'name': name, 'count': count} for name, count in counts.items()])
+    return counts
+
+def _migrate_legacy_rows(conn, chunk_size=10000):
+    """Move rows out of the unpartitioned threat_logs table into day partitions"""
+    table = ThreatLog.__table__
+    moved = 0
+    while True:
+        chunk = fetch_all(select(table).order_by(table.c.id).limit(chunk_size), conn)
+        if not chunk:
+            return moved
+        write_threat_rows(conn, [_threat_row(row) for row in chunk])
+        conn.execute(delete(table).where(table.c.id <= chunk[-1]['id']))
+        moved += len(chunk)
+
+def init_db():
+    Base.metadata.create_all(engine)
+    try:
+        with engine.begin() as conn:
+            for index in ThreatLog.__table__.indexes:
+                index.create(conn, checkfirst=True)
+            counts = dict(conn.execute(select(ThreatStat.name, ThreatStat.count)).all())
+            if not counts:
+                counts = _seed_stats(conn)
+            moved = _migrate_legacy_rows(conn)
+            for day in partitions.days(conn):
+                partitions.ensure(conn, day)
+    except Exception:
+        partitions.forget()
+        raise
+    if moved:
+        print(f"Moved {moved} threat logs into day partitions", flush=True)
+    apply_retention()
+    counters.load(counts)
+    get_writer()
+
+def log_threat(threat):
+    return get_writer().log(threat)
+
+def record_flows(total, benign=0):
+    """Count flows that were scored, malicious or not, for total_flows / detection_rate"""
+    return get_writer().record_flows(total, benign)
+
+def flush_threats(timeout=None):
+    if _writer is not None:
+        return _writer.flush(timeout)
+    return True
+
+def shutdown_db(timeout=None):
+    """Drain queued threats to the database; safe to call more than once"""
+    if _writer is not None:
+        _writer.close(timeout)
+
+atexit.register(shutdown_db)
+
+def encode_cursor(timestamp, row_id):
+    return f"{timestamp.isoformat()}_{row_id}"
+
+def decode_cursor(cursor):
+    timestamp, row_id = cursor.rsplit('_', 1)
+    return datetime.datetime.fromisoformat(timestamp), int(row_id)
+
+def query_threats(threat_type=None, status=None, ip=None, start=None, end=None, cursor=None,
+                  limit=None, chunk_size=1000):
+    """Yield threat dicts newest first, using keyset pagination on (timestamp, id)
+
+    Walks the day partitions from newest to oldest, skipping days outside
+    [start, end) or after the cursor, and pages each one by index seeks so
+    a deep page costs the same as the first. Each chunk uses its own short
+    connection, so a long export never pins a read snapshot.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    with engine.connect() as conn:
+        days = partitions.days(conn)
+
+    remaining = limit
+    for day in reversed(days):
+        if start is not None and day < start.date():
+            break
+        if end is not None and day > end.date():
+            continue
+        if after is not None and day > after[0].date():
+            continue
+
+        table = partitions.table(day)
+        conditions = []
+        if threat_type:
+            conditions.append(table.c.threat_type == threat_type)
+        if status:
+            conditions.append(table.c.status == status)
+        if ip:
+            conditions.append(or_(table.c.source_ip == ip, table.c.dest_ip == ip))
+        if start is not None:
+            conditions.append(table.c.timestamp >= start)
+        if end is not None:
+            conditions.append(table.c.timestamp < end)
+
+        while remaining is None or remaining > 0:
+            page = list(conditions)
+            if after is not None:
+                # A row-value comparison, unlike the equivalent OR, is one seek on ix_*_timestamp_id
+                page.append(tuple_(table.c.timestamp, table.c.id) < tuple_(after[0], after[1]))
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            stmt = (select(table).where(*page)
+                    .order_by(table.c.timestamp.desc(), table.c.id.desc()).limit(size))
+            rows = fetch_all(stmt)
+
+            for row in rows:
+                yield {
+                    'id': row['id'],
+                    'timestamp': row['timestamp'].isoformat(),
+                    'source_ip': row['source_ip'],
+                    'dest_ip': row['dest_ip'],
+                    'threat_type': row['threat_type'],
+                    'confidence': row['confidence'],
+                    'status': row['status'],
+                    'cursor': encode_cursor(row['timestamp'], row['id'])
+                }
+            if remaining is not None:
+                remaining -= len(rows)
+            if len(rows) < size:
+                break
+            after = (rows[-1]['timestamp'], rows[-1]['id'])
+        if remaining is not None and remaining <= 0:
+            return
+        # Cursor positions are per partition; the next (older) day starts from its top
+        after = None
+
+def _format_uptime(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
 
 def get_stats():
-    session = Session()
-    total = session.query(ThreatLog).count()
-    blocked = session.query(ThreatLog).filter(ThreatLog.status == 'BLOCKED').count()
-    detected = session.query(ThreatLog).count()
-    session.close()
+    counts = counters.snapshot()
+    total_flows = counts.get('total_flows', 0)
+    detected = counts.get('threats_detected', 0)
     return {
-        "total_flows": 0,
+        "total_flows": total_flows,
         "threats_detected": detected,
-        "threats_blocked": blocked,
-        "benign_flows": 0,
-        "detection_rate": "N/A",
-        "uptime": "N/A"
+        "threats_blocked": counts.get('status:BLOCKED', 0),
+        "benign_flows": counts.get('benign_flows', 0),
+        "detection_rate": round(detected / total_flows * 100, 1) if total_flows else 0.0,
+        "uptime": _format_uptime(time.time() - counters.started),
+        "threat_types": {name[5:]: count for name, count in counts.items() if name.startswith('type:')}
     }
@@ -0,0 +1,175 @@
+"""
+Export the served model as TorchScript / ONNX per batch-size bucket
+
+Usage: python export_model.py [checkpoint] [export_dir] [--buckets 1,8,32,128,256] [--runtimes torchscript,onnx]
+
+Writes one artifact per runtime and bucket into a staging directory. Then it
+checks every artifact's logits against the eager NetworkFlowGCN and picks the
+fastest intra-op thread count per runtime. Only then is export_manifest.json
+written, listing the runtimes that passed, and the staging directory renamed
+to export_dir, so a running server never hot-loads an unchecked export.
+Exits non-zero if a runtime fails the parity check. Serve the result with
+MODEL_RUNTIME=torchscript (or onnx).
+"""
+import argparse
+import datetime
+import os
+import shutil
+import sys
+import time
+
+import torch
+
+from exported_model import (DEFAULT_BUCKETS, RUNTIMES, export_buckets, load_exported_model, publish_export,
+                            staging_dir, write_manifest)
+from flow_sources import simulate_flow
+from serving import EXPORT_DIR, default_model_path
+from utils import flows_to_features, isolated_node_model, load_model, self_loop_graph
+
+PARITY_ATOL = 1e-4
+
+
+def parity_sizes(buckets):
+    """Every bucket, one row short of each bucket (padded) and a batch split across the largest bucket"""
+    sizes = set(buckets) | {bucket - 1 for bucket in buckets if bucket > 1}
+    sizes.add(buckets[-1] * 2 + 3)
+    return sorted(sizes)
+
+
+def check_parity(model, exported, buckets):
+    """Max abs log-probability difference against the eager model, and whether every argmax agrees
+
+    Log-probabilities rather than logits: the training_gcn_model network
+    returns log_softmax where the fused export returns raw logits.
+    """
+    worst, same_class = 0.0, True
+    with torch.no_grad():
+        for size in parity_sizes(buckets):
+            features, _ = flows_to_features([simulate_flow()[0] for _ in range(size)])
+            edge_index, batch = self_loop_graph(size)
+            expected = torch.log_softmax(model(features, edge_index, batch), dim=1)
+            actual = torch.log_softmax(exported(features, edge_index, batch), dim=1)
+            worst = max(worst, (expected - actual).abs().max().item())
+            same_class = same_class and torch.equal(expected.argmax(dim=1), actual.argmax(dim=1))
+    return worst, same_class
+
+
+def time_buckets(model, buckets, input_dim, repeat=200):
+    """Seconds per forward pass for each bucket (best of three rounds)"""
+    timings = {}
+    with torch.no_grad():
+        for bucket in buckets:
+            features = torch.rand(bucket, input_dim)
+            best = float("inf")
+            for _ in range(3):
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    model(features)
+                best = min(best, (time.perf_counter() - start) / repeat)
+            timings[bucket] = best
+    return timings
+
+
+def thread_candidates():
+    cores = os.cpu_count() or 1
+    candidates = [1]
+    while candidates[-1] * 2 <= cores:
+        candidates.append(candidates[-1] * 2)
+    if candidates[-1] != cores:
+        candidates.append(cores)
+    return candidates
+
+
+def tune_threads(export_dir, manifest, runtime, buckets, input_dim):
+    """Thread count with the lowest summed per-bucket latency, plus its timings"""
+    best = None
+    for num_threads in thread_candidates():
+        model = load_exported_model(export_dir, runtime, num_threads, manifest=manifest)
+        timings = time_buckets(model, buckets, input_dim)
+        if best is None or sum(timings.values()) < sum(best[1].values()):
+            best = (num_threads, timings)
+    return best
+
+
+def export_checked(model, fused, staging, buckets, runtimes, checkpoint):
+    """Export, tune and parity-check into staging, then write its manifest
+
+    Returns whether any runtime failed, or None if none passed (no manifest is written).
+    """
+    errors = export_buckets(fused, staging, buckets, runtimes)
+    for runtime, error in errors.items():
+        print(f"✗ {runtime} export failed: {error}")
+    failed = False
+    manifest = {
+        'checkpoint': os.path.abspath(checkpoint),
+        'input_dim': fused.input_dim,
+        'num_classes': fused.num_classes,
+        'buckets': buckets,
+        'runtimes': [runtime for runtime in runtimes if runtime not in errors],
+        'num_threads': {}
+    }
+
+    eager = time_buckets(fused, buckets, fused.input_dim)
+    print(f"{'runtime':<14}{'threads':>8}{'max |Δlogp|':>14}  " + ''.join(f"{f'b={b} µs':>11}" for b in buckets))
+    print(f"{'eager fused':<14}{torch.get_num_threads():>8}{'-':>14}  " +
+          ''.join(f"{eager[b] * 1e6:>11.1f}" for b in buckets))
+    for runtime in list(manifest['runtimes']):
+        try:
+            num_threads, timings = tune_threads(staging, manifest, runtime, buckets, fused.input_dim)
+            exported = load_exported_model(staging, runtime, num_threads, manifest=manifest)
+            worst, same_class = check_parity(model, exported, buckets)
+        except Exception as e:
+            print(f"✗ {runtime} runtime failed: {e}")
+            manifest['runtimes'].remove(runtime)
+            failed = True
+            continue
+        manifest['num_threads'][runtime] = num_threads
+        print(f"{runtime:<14}{num_threads:>8}{worst:>14.2e}  " + ''.join(f"{timings[b] * 1e6:>11.1f}" for b in buckets))
+        if worst > PARITY_ATOL or not same_class:
+            print(f"✗ {runtime} log-probabilities differ from the eager model (atol {PARITY_ATOL})")
+            manifest['runtimes'].remove(runtime)
+            failed = True
+
+    if not manifest['runtimes']:
+        return None
+    manifest['exported_at'] = datetime.datetime.utcnow().isoformat()
+    write_manifest(staging, manifest)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the served model per batch-size bucket")
+    parser.add_argument('checkpoint', nargs='?', default=default_model_path())
+    parser.add_argument('export_dir', nargs='?', default=EXPORT_DIR)
+    parser.add_argument('--buckets', default=','.join(map(str, DEFAULT_BUCKETS)))
+    parser.add_argument('--runtimes', default=','.join(RUNTIMES))
+    args = parser.parse_args()
+
+    buckets = sorted({int(bucket) for bucket in args.buckets.split(',')})
+    runtimes = [runtime for runtime in args.runtimes.split(',') if runtime]
+    unknown = set(runtimes) - set(RUNTIMES)
+    if unknown or not buckets or buckets[0] < 1:
+        parser.error(f"buckets must be positive and runtimes one of {', '.join(RUNTIMES)}")
+    if args.checkpoint is None or not os.path.exists(args.checkpoint):
+        print(f"✗ Model not found: {args.checkpoint}")
+        return 1
+
+    model = load_model(args.checkpoint)
+    fused = isolated_node_model(model)
+    staging = staging_dir(args.export_dir)
+    try:
+        failed = export_checked(model, fused, staging, buckets, runtimes, args.checkpoint)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    if failed is None:
+        shutil.rmtree(staging, ignore_errors=True)
+        print("✗ No runtime passed the export and parity checks, nothing published")
+        return 1
+    publish_export(staging, args.export_dir)
+    print(f"✓ Exported to {args.export_dir}" if not failed else "✗ Export finished with parity failures")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+TorchScript / ONNX runtime for the fused isolated-node model
+
+Serving scores every flow as an isolated node, so the exported graph is the
+IsolatedNodeGCN MLP from [N, 50] features to [N, num_classes] logits. Each
+artifact is traced for one fixed batch size (a bucket). At serving time a
+batch is zero-padded up to the smallest bucket that holds it, and batches
+larger than the largest bucket are split into chunks of that size. With fixed
+shapes TorchScript can freeze the graph and fuse its ops. A whole forward pass
+is then one call into the runtime instead of one eager dispatch per op.
+
+export_model.py writes the artifacts and export_manifest.json into a
+staging directory and renames it into place once the parity check has
+passed, so a directory holding a manifest is always complete and checked.
+"""
+import bisect
+import json
+import os
+import shutil
+import tempfile
+
+import torch
+
+DEFAULT_BUCKETS = (1, 8, 32, 128, 256)
+RUNTIMES = ('torchscript', 'onnx')
+MANIFEST_NAME = 'export_manifest.json'
+
+
+class _NodeLogits(torch.nn.Module):
+    """IsolatedNodeGCN with every node as its own graph: per-node logits, no pooling"""
+
+    def __init__(self, fused):
+        super(_NodeLogits, self).__init__()
+        self.encoder = fused.encoder
+        self.classifier = fused.classifier
+
+    def forward(self, x):
+        return self.classifier(self.encoder(x))
+
+
+def artifact_path(export_dir, runtime, bucket):
+    extension = '.pt' if runtime == 'torchscript' else '.onnx'
+    return os.path.join(export_dir, f"isolated_node_b{bucket}{extension}")
+
+
+def export_torchscript(fused, bucket, path):
+    """Trace, freeze and optimize the per-node logits for one batch size"""
+    example = torch.zeros(bucket, fused.input_dim)
+    with torch.no_grad():
+        traced = torch.jit.trace(_NodeLogits(fused).eval(), example)
+        optimized = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+    torch.jit.save(optimized, path)
+
+
+def export_onnx(fused, bucket, path):
+    """Export the per-node logits for one batch size as ONNX (needs the onnx package)"""
+    example = torch.zeros(bucket, fused.input_dim)
+    with torch.no_grad():
+        torch.onnx.export(_NodeLogits(fused).eval(), (example,), path, input_names=['features'],
+                          output_names=['logits'], opset_version=17, dynamo=False)
+
+
+_EXPORTERS = {'torchscript': export_torchscript, 'onnx': export_onnx}
+
+
+def export_buckets(fused, export_dir, buckets=DEFAULT_BUCKETS, runtimes=RUNTIMES):
+    """Write one artifact per runtime and bucket; returns {runtime: error} for runtimes that failed"""
+    os.makedirs(export_dir, exist_ok=True)
+    errors = {}
+    for runtime in runtimes:
+        try:
+            for bucket in buckets:
+                _EXPORTERS[runtime](fused, bucket, artifact_path(export_dir, runtime, bucket))
+        except Exception as e:
+            errors[runtime] = str(e)
+    return errors
+
+
+def read_manifest(export_dir):
+    with open(os.path.join(export_dir, MANIFEST_NAME), 'r') as f:
+        return json.load(f)
+
+
+def write_manifest(export_dir, manifest):
+    """Write the manifest under a temporary name and rename it, so readers never see it half-written"""
+    fd, path = tempfile.mkstemp(prefix='.manifest-', dir=export_dir)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path, os.path.join(export_dir, MANIFEST_NAME))
+
+
+def staging_dir(export_dir):
+    """Empty directory next to export_dir to export into before publish_export"""
+    parent = os.path.dirname(os.path.abspath(export_dir))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{os.path.basename(export_dir)}-", dir=parent)
+    os.chmod(staging, 0o755)  # mkdtemp's 0700 would otherwise become export_dir's mode
+    return staging
+
+
+def publish_export(staging, export_dir):
+    """Replace export_dir with a finished staging directory
+
+    In between the two renames there is no export at all, which the model
+    watcher treats as "nothing new"; it never sees a mix of old and new files.
+    """
+    previous = None
+    if os.path.exists(export_dir):
+        previous = tempfile.mkdtemp(prefix=f".{os.path.basename(export_dir)}-old-",
+                                    dir=os.path.dirname(os.path.abspath(export_dir)))
+        os.rename(export_dir, os.path.join(previous, 'export'))
+    os.rename(staging, export_dir)
+    if previous is not None:
+        shutil.rmtree(previous, ignore_errors=True)
+
+
+def _onnx_runner(path, num_threads):
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+    session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+    def run(features):
+        return torch.from_numpy(session.run(None, {'features': features.numpy()})[0])
+    return run
+
+
+class ExportedModel:
+    """Exported per-bucket artifacts behind the IsolatedNodeGCN call signature
+
+    Takes (x, edge_index, batch) like the fused model and returns one row of
+    logits per node: edge_index and batch are ignored, every flow is scored as
+    its own graph. There is no neighbour-window scoring on this path.
+    """
+
+    def __init__(self, runners, input_dim, num_classes, runtime, num_threads=None):
+        self.buckets = sorted(runners)
+        self._runners = runners
+        self.input_dim = input_dim
+        self.num_classes = num_classes
+        self.runtime = runtime
+        self.num_threads = num_threads
+
+    def __call__(self, x, edge_index=None, batch=None):
+        x = x.float().contiguous()
+        largest = self.buckets[-1]
+        outputs = []
+        for start in range(0, x.size(0), largest):
+            chunk = x[start:start + largest]
+            rows = chunk.size(0)
+            bucket = self.buckets[bisect.bisect_left(self.buckets, rows)]
+            if rows < bucket:
+                chunk = torch.cat([chunk, chunk.new_zeros(bucket - rows, chunk.size(1))])
+            outputs.append(self._runners[bucket](chunk)[:rows])
+        if not outputs:
+            return x.new_zeros(0, self.num_classes)
+        return torch.cat(outputs)
+
+    def eval(self):
+        return self
+
+    def warm_up(self, runs=3):
+        """Run every bucket a few times so the TorchScript profiling executor settles before real traffic"""
+        with torch.no_grad():
+            for bucket in self.buckets:
+                for _ in range(runs):
+                    self._runners[bucket](torch.zeros(bucket, self.input_dim))
+
+
+def load_exported_model(export_dir, runtime='torchscript', num_threads=None, manifest=None):
+    """Load the artifacts written by export_model.py for one runtime
+
+    num_threads defaults to the count the export command tuned for this
+    runtime. For TorchScript it sets torch's process-wide intra-op pool.
+    manifest is read from export_dir unless given (export_model.py checks
+    artifacts before it writes one).
+    """
+    if runtime not in RUNTIMES:
+        raise ValueError(f"runtime must be one of {', '.join(RUNTIMES)}")
+    manifest = manifest or read_manifest(export_dir)
+    if runtime not in manifest['runtimes']:
+        raise ValueError(f"{export_dir} has no {runtime} export")
+    num_threads = num_threads or manifest.get('num_threads', {}).get(runtime)
+
+    if runtime == 'torchscript':
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        runners = {bucket: torch.jit.load(artifact_path(export_dir, runtime, bucket), map_location='cpu')
+                   for bucket in manifest['buckets']}
+    else:
+        runners = {bucket: _onnx_runner(artifact_path(export_dir, runtime, bucket), num_threads)
+                   for bucket in manifest['buckets']}
+
+    model = ExportedModel(runners, manifest['input_dim'], manifest['num_classes'], runtime, num_threads)
+    model.warm_up()
+    return model
+
@@ -0,0 +1,198 @@
+"""
+Content-addressed store of preprocessed training graphs.
+
+An entry is keyed by a hash of the dataset bytes plus the preprocessing
+config and holds the scaled feature matrix, encoded labels, edge index
+and fitted scaler / label-encoder state as .npy files that are opened
+memory-mapped, so a repeated run skips parsing, scaling and graph
+construction entirely.
+"""
+import hashlib
+import inspect
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import torch
+from torch_geometric.data import Data
+
+from flow_ingest import IngestedDataset, RunningStats, detect_label_column, fill_non_finite, ingest_csv
+from training_gcn_model import NetworkGraphBuilder, knn_edge_index
+
+logger = logging.getLogger(__name__)
+
+STORE_VERSION = 2
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_digest(path, digest_index=None):
+    """BLAKE2b digest of a file's bytes, memoized in digest_index by (path, size, mtime)"""
+    stat = os.stat(path)
+    signature = [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+    index = {}
+    if digest_index and os.path.exists(digest_index):
+        with open(digest_index) as f:
+            index = json.load(f)
+        entry = index.get(signature[0])
+        if entry and entry['signature'] == signature:
+            return entry['digest']
+
+    hasher = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            hasher.update(block)
+    digest = hasher.hexdigest()
+
+    if digest_index:
+        index[signature[0]] = {'signature': signature, 'digest': digest}
+        with open(digest_index, 'w') as f:
+            json.dump(index, f, indent=2)
+    return digest
+
+
+def builder_config(builder, *helpers, **params):
+    """Store config for graphs built by `builder` with `params`
+
+    Includes a digest of the source of the builder and the helpers that
+    shape its output, so editing any of them misses the store instead of
+    reopening graphs built by the old code.
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    for code in (builder, *helpers):
+        hasher.update(inspect.getsource(code).encode())
+    return {'builder': builder.__qualname__, 'source': hasher.hexdigest(), **params}
+
+
+def ingested_graph_config(label_col=None, knn_k=5, chunksize=100000):
+    """Store config for ingested_dataset followed by create_graph_from_ingested"""
+    return builder_config(NetworkGraphBuilder.create_graph_from_ingested, ingest_csv, detect_label_column,
+                          IngestedDataset, RunningStats, fill_non_finite, knn_edge_index,
+                          label_col=label_col, knn_k=knn_k, chunksize=chunksize)
+
+
+def ingested_dataset(csv_path, cache_root='cache/ingest', label_col=None, chunksize=100000):
+    """IngestedDataset for csv_path, streamed once per distinct file content and reopened after that"""
+    if not csv_path.endswith('.csv'):
+        raise ValueError("Only CSV files are supported")
+    os.makedirs(cache_root, exist_ok=True)
+    cache_dir = os.path.join(cache_root, file_digest(csv_path, os.path.join(cache_root, 'digests.json')))
+    if IngestedDataset.exists(cache_dir):
+        logger.info(f"Using ingested dataset cache: {cache_dir}")
+        return IngestedDataset(cache_dir)
+    return ingest_csv(csv_path, cache_dir, label_col=label_col, chunksize=chunksize)
+
+
+class FeatureSet:
+    """One feature store entry, memory-mapped copy-on-write (zero copies until written)"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.class_names = self.meta['class_names']
+        self.feature_names = self.meta['feature_names']
+
+        self.x = np.load(os.path.join(path, 'x.npy'), mmap_mode='c')
+        self.y = np.load(os.path.join(path, 'y.npy'), mmap_mode='c')
+        self.edge_index = np.load(os.path.join(path, 'edge_index.npy'), mmap_mode='c')
+
+    def to_data(self):
+        return Data(
+            x=torch.from_numpy(self.x),
+            edge_index=torch.from_numpy(self.edge_index),
+            y=torch.from_numpy(self.y)
+        )
+
+    def graph_builder(self):
+        """NetworkGraphBuilder with the fitted scaler and label encoder restored"""
+        builder = NetworkGraphBuilder()
+        builder.feature_names = list(self.feature_names)
+        builder.class_names = list(self.class_names)
+        builder.label_encoder.classes_ = np.array(self.class_names, dtype=object)
+
+        with np.load(os.path.join(self.path, 'scaler.npz'), allow_pickle=False) as state:
+            builder.scaler.mean_ = state['mean']
+            builder.scaler.var_ = state['var']
+            builder.scaler.scale_ = state['scale']
+            builder.scaler.n_samples_seen_ = state['n_samples_seen']
+        builder.scaler.n_features_in_ = len(self.feature_names)
+        return builder
+
+
+class FeatureStore:
+    """Directory of FeatureSets keyed by dataset content hash + preprocessing config"""
+
+    def __init__(self, root='cache/feature_store'):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.digest_index = os.path.join(root, 'digests.json')
+
+    def key(self, dataset_path, config):
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(file_digest(dataset_path, self.digest_index).encode())
+        hasher.update(json.dumps({'store_version': STORE_VERSION, 'config': config}, sort_keys=True).encode())
+        return hasher.hexdigest()
+
+    def get(self, dataset_path, config):
+        path = os.path.join(self.root, self.key(dataset_path, config))
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            return None
+        return FeatureSet(path)
+
+    def put(self, dataset_path, config, data, graph_builder):
+        """Write a graph and its fitted builder state; returns the stored FeatureSet"""
+        key = self.key(dataset_path, config)
+        path = os.path.join(self.root, key)
+        tmp_path = tempfile.mkdtemp(prefix=f'.{key}-', dir=self.root)
+
+        try:
+            np.save(os.path.join(tmp_path, 'x.npy'), data.x.cpu().numpy().astype(np.float32, copy=False))
+            np.save(os.path.join(tmp_path, 'y.npy'), data.y.cpu().numpy().astype(np.int64, copy=False))
+            np.save(os.path.join(tmp_path, 'edge_index.npy'), data.edge_index.cpu().numpy().astype(np.int64, copy=False))
+
+            scaler = graph_builder.scaler
+            np.savez(
+                os.path.join(tmp_path, 'scaler.npz'),
+                mean=scaler.mean_, var=scaler.var_, scale=scaler.scale_,
+                n_samples_seen=np.asarray(scaler.n_samples_seen_)
+            )
+            meta = {
+                'version': STORE_VERSION,
+                'key': key,
+                'dataset': os.path.abspath(dataset_path),
+                'config': config,
+                'class_names': list(graph_builder.class_names),
+                'feature_names': list(graph_builder.feature_names),
+                'num_nodes': int(data.num_nodes),
+                'num_edges': int(data.num_edges),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S')
+            }
+            with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+                json.dump(meta, f, indent=2)
+
+            # Publish atomically so a crashed run never leaves a half-written entry
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.replace(tmp_path, path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+        logger.info(f"Feature store entry written: {path}")
+        return FeatureSet(path)
+
+    def get_or_build(self, dataset_path, config, build):
+        """Open the cached entry, or call build() -> (data, graph_builder) and store the result"""
+        start = time.perf_counter()
+        features = self.get(dataset_path, config)
+        if features is not None:
+            logger.info(f"Feature store hit: {features.path} ({(time.perf_counter() - start) * 1000:.1f} ms)")
+            return features
+
+        logger.info("Feature store miss, building features...")
+        data, graph_builder = build()
+        return self.put(dataset_path, config, data, graph_builder)
@@ -0,0 +1,78 @@
+"""
+Vectorized flow-to-feature encoding for the GCN threat detector
+"""
+import numpy as np
+
+# Raw flow fields in the order they occupy the first feature columns
+FLOW_FIELDS = ("duration", "protocol", "src_bytes", "dst_bytes", "packets",
+               "tcp_flags", "active_time", "idle_time")
+
+# Per-field divisor and clip ceiling used to normalize features to the 0-1 range
+FIELD_SCALES = np.array([100.0, 17.0, 50000.0, 50000.0, 200.0, 255.0, 100.0, 100.0])
+FIELD_CEILINGS = np.array([1.0, np.inf, 1.0, 1.0, 1.0, np.inf, 1.0, 1.0])
+
+DURATION, PROTOCOL, SRC_BYTES, DST_BYTES, PACKETS, TCP_FLAGS, ACTIVE_TIME, IDLE_TIME = range(len(FLOW_FIELDS))
+
+
+class FlowFeatureEncoder:
+    """Encodes a batch of flows into the normalized [N, 50] model input matrix
+
+    Accepts a list of flow dicts, a dict of column arrays, a structured NumPy
+    array or a pandas DataFrame. Missing fields are treated as zero.
+    """
+
+    def __init__(self, num_features=50):
+        self.num_features = num_features
+
+    def raw_columns(self, flows):
+        """Return the raw flow fields as a float64 [N, 8] array"""
+        if isinstance(flows, (list, tuple)):
+            if not flows:
+                return np.zeros((0, len(FLOW_FIELDS)))
+            return np.array([[flow.get(name, 0) for name in FLOW_FIELDS] for flow in flows], dtype=np.float64)
+
+        if isinstance(flows, np.ndarray) and flows.dtype.names is not None:
+            names = flows.dtype.names
+            n = len(flows)
+            columns = [flows[name] if name in names else np.zeros(n) for name in FLOW_FIELDS]
+        elif hasattr(flows, "columns"):  # DataFrame
+            n = len(flows)
+            columns = [flows[name].to_numpy() if name in flows.columns else np.zeros(n) for name in FLOW_FIELDS]
+        elif isinstance(flows, dict):
+            n = max((len(np.atleast_1d(col)) for col in flows.values()), default=0)
+            columns = [np.atleast_1d(flows[name]) if name in flows else np.zeros(n) for name in FLOW_FIELDS]
+        else:
+            raise TypeError(f"Unsupported flow batch type: {type(flows).__name__}")
+
+        return np.stack([np.asarray(col, dtype=np.float64) for col in columns], axis=1)
+
+    def encode_raw(self, raw, out=None):
+        """Normalize a raw [N, 8] array into a float32 [N, num_features] matrix"""
+        n = raw.shape[0]
+        if out is None:
+            out = np.zeros((n, self.num_features), dtype=np.float32)
+        else:
+            out[:, len(FLOW_FIELDS) + 3:] = 0
+
+        out[:, :len(FLOW_FIELDS)] = np.minimum(raw / FIELD_SCALES, FIELD_CEILINGS)
+
+        # Derived metrics, left at zero where the denominator is zero
+        src_bytes, dst_bytes, packets = raw[:, SRC_BYTES], raw[:, DST_BYTES], raw[:, PACKETS]
+        total_bytes = src_bytes + dst_bytes
+        out[:, 8] = np.divide(src_bytes, total_bytes, out=np.zeros(n), where=total_bytes > 0)
+        has_packets = packets > 0
+        out[:, 9] = np.divide(src_bytes, packets, out=np.zeros(n), where=has_packets)
+        out[:, 10] = np.divide(dst_bytes, packets, out=np.zeros(n), where=has_packets)
+        return out
+
+    def encode(self, flows, out=None):
+        """Return (features, raw) for a flow batch as NumPy arrays"""
+        raw = self.raw_columns(flows)
+        return self.encode_raw(raw, out=out), raw
+
+    def encode_tensor(self, flows, out=None):
+        """Like encode, but the features come back as a torch tensor sharing the NumPy buffer"""
+        import torch
+
+        features, raw = self.encode(flows, out=out)
+        return torch.from_numpy(features), raw
@@ -0,0 +1,132 @@
+"""
+Sliding-window nearest-neighbour index over recently seen flow features,
+used to score new flows with graph context at serving time
+"""
+import threading
+import time
+
+import numpy as np
+import torch
+
+
+class FlowNeighborIndex:
+    """Fixed-capacity ring buffer of flow feature vectors with top-k neighbour search
+
+    Memory is bounded by capacity; entries are evicted oldest-first when the
+    buffer wraps or once they are older than max_age seconds. Search is a
+    single matrix product over the live window, optionally on a random
+    projection of the features (projection_dim) for cheaper, approximate
+    distances.
+    """
+
+    def __init__(self, dim=50, capacity=4096, max_age=300.0, k=5, projection_dim=None, seed=42):
+        self.dim = dim
+        self.capacity = capacity
+        self.max_age = max_age
+        self.k = k
+        self.features = np.zeros((capacity, dim), dtype=np.float32)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self._start = 0  # slot of the oldest live entry
+        self._size = 0
+        self._lock = threading.Lock()
+
+        if projection_dim:
+            rng = np.random.default_rng(seed)
+            self._projection = (rng.standard_normal((dim, projection_dim)) / np.sqrt(projection_dim)).astype(np.float32)
+        else:
+            self._projection = None
+        key_dim = projection_dim or dim
+        self._keys = np.zeros((capacity, key_dim), dtype=np.float32)
+        self._key_norms = np.zeros(capacity, dtype=np.float32)
+
+    def __len__(self):
+        return self._size
+
+    def _project(self, vectors):
+        return vectors if self._projection is None else vectors @ self._projection
+
+    def live_slots(self):
+        """Slots of live entries, oldest first"""
+        return (self._start + np.arange(self._size)) % self.capacity
+
+    def add(self, vectors, now=None):
+        """Insert vectors (newest last), overwriting the oldest entries when full; returns their slots"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)[-self.capacity:]
+        now = time.monotonic() if now is None else now
+        slots = (self._start + self._size + np.arange(len(vectors))) % self.capacity
+
+        keys = self._project(vectors)
+        self.features[slots] = vectors
+        self._keys[slots] = keys
+        self._key_norms[slots] = np.einsum('ij,ij->i', keys, keys)
+        self.timestamps[slots] = now
+
+        overflow = max(self._size + len(vectors) - self.capacity, 0)
+        self._start = (self._start + overflow) % self.capacity
+        self._size = min(self._size + len(vectors), self.capacity)
+        return slots
+
+    def evict_older_than(self, cutoff):
+        """Drop entries inserted before cutoff; returns the evicted slots"""
+        live = self.live_slots()
+        expired = int(np.searchsorted(self.timestamps[live], cutoff, side='left'))
+        self._start = (self._start + expired) % self.capacity
+        self._size -= expired
+        return live[:expired]
+
+    def search(self, queries, k=None):
+        """Top-k live neighbours per query as (slots, squared distances); missing neighbours are -1 / inf"""
+        k = self.k if k is None else k
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        slots = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        if self._size == 0 or k == 0:
+            return slots, distances
+
+        live = self.live_slots()
+        keys = self._project(queries)
+        dist = (np.einsum('ij,ij->i', keys, keys)[:, None] + self._key_norms[live][None, :]
+                - 2.0 * keys @ self._keys[live].T)
+
+        found = min(k, len(live))
+        nearest = np.argpartition(dist, found - 1, axis=1)[:, :found]
+        nearest_dist = np.take_along_axis(dist, nearest, axis=1)
+        order = np.argsort(nearest_dist, axis=1)
+        slots[:, :found] = live[np.take_along_axis(nearest, order, axis=1)]
+        distances[:, :found] = np.maximum(np.take_along_axis(nearest_dist, order, axis=1), 0)
+        return slots, distances
+
+    def neighbor_subgraph(self, features, k=None):
+        """Block-diagonal local subgraph: each query node joined to its top-k window neighbours
+
+        Returns (x, edge_index, batch) with the query nodes first; every node
+        has its own graph id so the model's output rows line up with x.
+        """
+        num_queries = features.size(0)
+        slots, _ = self.search(features.numpy(), k)
+        query_ids, ranks = np.nonzero(slots >= 0)
+        neighbor_slots = slots[query_ids, ranks]
+
+        num_nodes = num_queries + len(neighbor_slots)
+        x = torch.cat([features, torch.from_numpy(self.features[neighbor_slots])])
+
+        centers = torch.from_numpy(query_ids)
+        neighbors = torch.arange(num_queries, num_nodes, dtype=torch.long)
+        nodes = torch.arange(num_nodes, dtype=torch.long)
+        edge_index = torch.cat([
+            torch.stack([neighbors, centers]),
+            torch.stack([centers, neighbors]),
+            nodes.repeat(2, 1),
+        ], dim=1)
+        return x, edge_index, nodes
+
+    def score(self, model, features, k=None, now=None):
+        """Score new flows on their local neighbour subgraph, then add them to the window"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.max_age:
+                self.evict_older_than(now - self.max_age)
+            x, edge_index, batch = self.neighbor_subgraph(features, k)
+            output = model(x, edge_index, batch)[:features.size(0)]
+            self.add(features.numpy(), now=now)
+        return output
@@ -0,0 +1,307 @@
+"""
+Out-of-core CSV ingestion for the training pipeline.
+
+Reads a flow CSV in chunks with compact dtypes, gathers per-column
+statistics and class counts in the same pass, and writes a memory-mapped
+columnar cache (float32 features, integer label codes) that training
+reads directly instead of holding the whole DataFrame in memory.
+"""
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+logger = logging.getLogger(__name__)
+
+LABEL_CANDIDATES = ['Label', 'label', 'Attack', 'attack', 'class', 'Class', 'target', 'Target']
+CACHE_VERSION = 3
+
+
+class RunningStats:
+    """Single-pass per-column statistics, merged chunk by chunk
+
+    Tracks NaN / +inf / -inf counts, and count, mean, variance (Chan et al.
+    parallel Welford update), min and max over the finite values. Medians
+    and other quantiles come from a uniform row reservoir of reservoir_size
+    rows, so they are exact whenever fewer rows than that have been seen.
+    """
+
+    def __init__(self, num_columns, reservoir_size=100000, seed=42):
+        self.count = np.zeros(num_columns, dtype=np.int64)
+        self.mean = np.zeros(num_columns, dtype=np.float64)
+        self.m2 = np.zeros(num_columns, dtype=np.float64)
+        self.min = np.full(num_columns, np.inf)
+        self.max = np.full(num_columns, -np.inf)
+        self.nan_count = np.zeros(num_columns, dtype=np.int64)
+        self.posinf_count = np.zeros(num_columns, dtype=np.int64)
+        self.neginf_count = np.zeros(num_columns, dtype=np.int64)
+
+        self.reservoir_size = reservoir_size
+        self.rows_seen = 0
+        self._reservoir = None
+        self._filled = 0
+        self._rng = np.random.default_rng(seed)
+        self._median = None
+
+    def update(self, values):
+        """Merge a [rows, columns] chunk"""
+        values = np.asarray(values, dtype=np.float64)
+        finite = np.isfinite(values)
+        self.nan_count += np.isnan(values).sum(axis=0)
+        self.posinf_count += np.isposinf(values).sum(axis=0)
+        self.neginf_count += np.isneginf(values).sum(axis=0)
+
+        count = finite.sum(axis=0)
+        safe = np.where(finite, values, 0.0)
+        chunk_mean = safe.sum(axis=0) / np.maximum(count, 1)
+        chunk_m2 = (np.where(finite, values - chunk_mean, 0.0) ** 2).sum(axis=0)
+
+        total = self.count + count
+        delta = chunk_mean - self.mean
+        weight = np.divide(count, total, out=np.zeros(len(total)), where=total > 0)
+        self.mean += delta * weight
+        self.m2 += chunk_m2 + delta ** 2 * self.count * weight
+        self.count = total
+
+        self.min = np.minimum(self.min, np.where(finite, values, np.inf).min(axis=0, initial=np.inf))
+        self.max = np.maximum(self.max, np.where(finite, values, -np.inf).max(axis=0, initial=-np.inf))
+
+        self._sample(values)
+
+    def _sample(self, values):
+        """Reservoir-sample whole rows (algorithm R, vectorized per chunk)"""
+        if self._reservoir is None:
+            self._reservoir = np.empty((self.reservoir_size, values.shape[1]), dtype=np.float64)
+        self._median = None
+
+        take = min(self.reservoir_size - self._filled, len(values))
+        self._reservoir[self._filled:self._filled + take] = values[:take]
+        self._filled += take
+
+        rest = values[take:]
+        if len(rest):
+            seen = self.rows_seen + take + np.arange(1, len(rest) + 1)
+            slots = (self._rng.random(len(rest)) * seen).astype(np.int64)
+            keep = slots < self.reservoir_size
+            self._reservoir[slots[keep]] = rest[keep]
+        self.rows_seen += len(values)
+
+    def quantile(self, q):
+        """Per-column quantile of the non-NaN values (infinities included, as pandas does)"""
+        if not self._filled:
+            return np.full(len(self.count), np.nan)
+        with np.errstate(invalid='ignore'):
+            return np.nanquantile(self._reservoir[:self._filled], q, axis=0)
+
+    @property
+    def median(self):
+        if self._median is None:
+            self._median = self.quantile(0.5)
+        return self._median
+
+    @property
+    def var(self):
+        return np.divide(self.m2, self.count, out=np.zeros(len(self.count)), where=self.count > 0)
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+    def to_dict(self):
+        state = {name: getattr(self, name).tolist() for name in
+                 ('count', 'mean', 'm2', 'min', 'max', 'nan_count', 'posinf_count', 'neginf_count')}
+        state['median'] = self.median.tolist()
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls(len(state['count']))
+        for name, values in state.items():
+            if name == 'median':
+                stats._median = np.asarray(values, dtype=np.float64)
+            else:
+                setattr(stats, name, np.asarray(values, dtype=getattr(stats, name).dtype))
+        return stats
+
+
+def fill_non_finite(values, stats):
+    """One vectorized pass: NaN -> median, +inf -> finite max, -inf -> finite min (0 if none)"""
+    finite_max = np.where(np.isfinite(stats.max), stats.max, 0.0)
+    finite_min = np.where(np.isfinite(stats.min), stats.min, 0.0)
+    return np.select(
+        [np.isnan(values), np.isposinf(values), np.isneginf(values)],
+        [np.broadcast_to(stats.median, values.shape),
+         np.broadcast_to(finite_max, values.shape),
+         np.broadcast_to(finite_min, values.shape)],
+        default=values
+    )
+
+
+def detect_label_column(df):
+    """Pick the label column the same way ThreatDetectionPipeline.load_dataset does"""
+    for col in LABEL_CANDIDATES:
+        if col in df.columns:
+            return col
+
+    attack_keywords = ['dos', 'ddos', 'malware', 'benign', 'normal', 'ransomware', 'bot']
+    for col in df.columns:
+        if df[col].dtype == 'object' or df[col].nunique() < 20:
+            if any(any(keyword in str(val).lower() for keyword in attack_keywords) for val in df[col].unique()):
+                return col
+
+    logger.warning(f"No obvious label column found. Using last column: {df.columns[-1]}")
+    return df.columns[-1]
+
+
+class IngestedDataset:
+    """Memory-mapped view of an ingested flow dataset"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, 'meta.json')) as f:
+            self.meta = json.load(f)
+
+        self.num_rows = self.meta['num_rows']
+        self.feature_names = self.meta['feature_names']
+        self.class_names = self.meta['class_names']
+        self.class_counts = self.meta['class_counts']
+        self.label_col = self.meta['label_col']
+        self.stats = RunningStats.from_dict(self.meta['stats'])
+
+        shape = (self.num_rows, len(self.feature_names))
+        self.features = np.memmap(os.path.join(cache_dir, 'features.f32'), dtype=np.float32, mode='r', shape=shape)
+        self.labels = np.memmap(os.path.join(cache_dir, 'labels.i32'), dtype=np.int32, mode='r',
+                                shape=(self.num_rows,))
+
+    @staticmethod
+    def exists(cache_dir):
+        meta_path = os.path.join(cache_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path) as f:
+            return json.load(f).get('version') == CACHE_VERSION
+
+    def scaler(self):
+        """StandardScaler fitted from the one-pass statistics, without another scan"""
+        scaler = StandardScaler()
+        scaler.mean_ = self.stats.mean.copy()
+        scaler.var_ = self.stats.var
+        scaler.scale_ = np.where(scaler.var_ > 0, np.sqrt(scaler.var_), 1.0)
+        scaler.n_features_in_ = len(self.feature_names)
+        scaler.feature_names_in_ = np.asarray(self.feature_names, dtype=object)
+        scaler.n_samples_seen_ = self.stats.count.copy()
+        return scaler
+
+    def clean_chunk(self, values):
+        """Replace NaN with the column median (0 if unknown) and +/-inf with the finite max/min"""
+        values = fill_non_finite(np.asarray(values, dtype=np.float32), self.stats)
+        return np.nan_to_num(values, nan=0.0).astype(np.float32, copy=False)
+
+    def iter_chunks(self, chunksize=100000):
+        for start in range(0, self.num_rows, chunksize):
+            stop = min(start + chunksize, self.num_rows)
+            yield start, stop, self.features[start:stop], self.labels[start:stop]
+
+
+def ingest_csv(csv_path, cache_dir, label_col=None, chunksize=100000):
+    """Stream a flow CSV into a memory-mapped cache; returns the IngestedDataset
+
+    Columns numeric in the first 1000 rows are stored as float32; values
+    in later chunks that do not parse as numbers become NaN and are filled
+    like any other missing value. Other feature columns are mapped to
+    integer codes in order of first appearance, the same mapping
+    preprocess_data uses. Rows without a label are dropped and counted in
+    meta.json. Labels are stored as codes into the sorted class names
+    (LabelEncoder order).
+    """
+    logger.info(f"Ingesting {csv_path} into {cache_dir} (chunks of {chunksize} rows)...")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    sample = pd.read_csv(csv_path, nrows=1000)
+    label_col = label_col or detect_label_column(sample)
+    feature_names = [col for col in sample.columns if col != label_col]
+    numeric = [col for col in feature_names if pd.api.types.is_numeric_dtype(sample[col])]
+    # Numeric columns are left to per-chunk parsing and coerced below, so a stray string cannot abort the read
+    dtypes = {col: 'object' for col in feature_names if col not in numeric}
+    dtypes[label_col] = 'category'
+
+    category_codes = {col: {} for col in feature_names if col not in numeric}
+    label_codes = {}
+    class_counts = {}
+    stats = RunningStats(len(feature_names))
+    num_rows = 0
+    unlabeled = 0
+    coerced = 0
+
+    features_path = os.path.join(cache_dir, 'features.f32')
+    labels_path = os.path.join(cache_dir, 'labels.i32')
+    with open(features_path, 'wb') as features_file, open(labels_path, 'wb') as labels_file:
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype=dtypes):
+            labeled = chunk[label_col].notna()
+            if not labeled.all():
+                unlabeled += int((~labeled).sum())
+                chunk = chunk[labeled].copy()
+
+            for col in numeric:
+                if not pd.api.types.is_numeric_dtype(chunk[col]):
+                    values = pd.to_numeric(chunk[col], errors='coerce')
+                    coerced += int((values.isna() & chunk[col].notna()).sum())
+                    chunk[col] = values
+            for col, mapping in category_codes.items():
+                for val in chunk[col].unique():
+                    mapping.setdefault(val, len(mapping))
+                chunk[col] = chunk[col].map(mapping)
+
+            labels = chunk[label_col]
+            for name, count in labels.value_counts(sort=False).items():
+                if count:
+                    label_codes.setdefault(name, len(label_codes))
+                    class_counts[str(name)] = class_counts.get(str(name), 0) + int(count)
+
+            values = chunk[feature_names].to_numpy(dtype=np.float32)
+            stats.update(values)
+            values.tofile(features_file)
+            labels.map(label_codes).to_numpy(dtype=np.int32).tofile(labels_file)
+            num_rows += len(chunk)
+
+    if unlabeled:
+        logger.warning(f"Dropped {unlabeled} rows without a {label_col} value")
+    if coerced:
+        logger.warning(f"{coerced} non-numeric values in numeric columns were treated as missing")
+
+    # Re-code labels in place to the sorted class order
+    class_names = sorted(str(name) for name in label_codes)
+    remap = np.zeros(len(label_codes), dtype=np.int32)
+    for name, code in label_codes.items():
+        remap[code] = class_names.index(str(name))
+    labels = np.memmap(labels_path, dtype=np.int32, mode='r+', shape=(num_rows,))
+    for start in range(0, num_rows, chunksize):
+        labels[start:start + chunksize] = remap[labels[start:start + chunksize]]
+    labels.flush()
+    del labels
+
+    meta = {
+        'version': CACHE_VERSION,
+        'source': os.path.abspath(csv_path),
+        'num_rows': num_rows,
+        'unlabeled_rows': unlabeled,
+        'coerced_values': coerced,
+        'label_col': label_col,
+        'feature_names': feature_names,
+        'class_names': class_names,
+        'class_counts': class_counts,
+        'categorical_mappings': {col: {str(k): v for k, v in mapping.items()} for col, mapping in category_codes.items()},
+        'stats': stats.to_dict()
+    }
+    with open(os.path.join(cache_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    logger.info(f"Ingested {num_rows} rows, {len(feature_names)} features, {len(class_names)} classes")
+    for name in class_names:
+        count = class_counts[name]
+        logger.info(f"   {name}: {count} ({count / max(num_rows, 1) * 100:.1f}%)")
+
+    return IngestedDataset(cache_dir)
@@ -0,0 +1,392 @@
+"""
+Flow sources for the network monitor: simulated traffic, CSV/Parquet
+replay, JSON flow records over UDP and a tailed JSON-lines file
+
+Every source yields batches of flow dicts with the fields FlowFeatureEncoder
+reads (duration, protocol, src_bytes, ...) plus src_ip / dst_ip.
+"""
+import abc
+import json
+import os
+import random
+import socket
+import time
+from collections import deque
+
+
+THREAT_WEIGHTS = [2, 8, 8, 20, 10]  # Benign, Cryptolocker, Locky, Ransomware, WannaCry
+THREAT_CLASSES = ["Benign", "Cryptolocker", "Locky", "Ransomware", "WannaCry"]
+
+# Capture column names accepted in place of the flow field names
+COLUMN_ALIASES = {
+    "src_ip": ("src_ip", "Src IP", "Source IP", "source_ip", "srcaddr"),
+    "dst_ip": ("dst_ip", "Dst IP", "Destination IP", "dest_ip", "dstaddr"),
+    "duration": ("duration", "Flow Duration"),
+    "protocol": ("protocol", "Protocol", "proto"),
+    "src_bytes": ("src_bytes", "TotLen Fwd Pkts", "Total Length of Fwd Packets", "in_bytes"),
+    "dst_bytes": ("dst_bytes", "TotLen Bwd Pkts", "Total Length of Bwd Packets", "out_bytes"),
+    "packets": ("packets", "Tot Fwd Pkts", "Total Fwd Packets", "in_pkts"),
+    "tcp_flags": ("tcp_flags", "TCP Flags", "tcp_flags_cumulative"),
+    "active_time": ("active_time", "Active Mean"),
+    "idle_time": ("idle_time", "Idle Mean"),
+}
+
+
+def simulate_flow():
+    """Generate one simulated network flow; returns (flow, threat_name)"""
+    threat_index = random.choices(range(len(THREAT_CLASSES)), weights=THREAT_WEIGHTS, k=1)[0]
+
+    flow = {
+        "src_ip": f"192.168.{random.randint(1, 254)}.{random.randint(2, 254)}",
+        "dst_ip": f"10.0.{random.randint(1, 254)}.{random.randint(1, 254)}",
+        "duration": random.uniform(0, 100),
+        "protocol": random.choice([6, 17]),
+        "src_bytes": random.uniform(0, 50000),
+        "dst_bytes": random.uniform(0, 50000),
+        "packets": random.randint(1, 200),
+        "tcp_flags": random.randint(0, 255),
+        "active_time": random.uniform(0, 100),
+        "idle_time": random.uniform(0, 100)
+    }
+
+    if threat_index == 3:  # Ransomware
+        flow["duration"] = random.uniform(70, 95)
+        flow["src_bytes"] = random.uniform(35000, 50000)
+        flow["dst_bytes"] = random.uniform(10000, 30000)
+        flow["packets"] = random.randint(140, 200)
+        flow["active_time"] = random.uniform(60, 95)
+        flow["protocol"] = 6
+        flow["tcp_flags"] = random.choice([16, 24, 25])
+
+    elif threat_index == 1:  # Cryptolocker
+        flow["duration"] = random.uniform(50, 85)
+        flow["src_bytes"] = random.uniform(25000, 45000)
+        flow["dst_bytes"] = random.uniform(8000, 25000)
+        flow["packets"] = random.randint(100, 160)
+        flow["protocol"] = 6
+        flow["tcp_flags"] = random.choice([16, 24])
+        flow["active_time"] = random.uniform(45, 80)
+
+    elif threat_index == 2:  # Locky
+        flow["duration"] = random.uniform(40, 75)
+        flow["src_bytes"] = random.uniform(20000, 40000)
+        flow["dst_bytes"] = random.uniform(5000, 20000)
+        flow["packets"] = random.randint(80, 140)
+        flow["active_time"] = random.uniform(35, 70)
+
+    elif threat_index == 4:  # WannaCry
+        flow["duration"] = random.uniform(60, 90)
+        flow["src_bytes"] = random.uniform(30000, 48000)
+        flow["dst_bytes"] = random.uniform(12000, 32000)
+        flow["packets"] = random.randint(120, 180)
+        flow["protocol"] = random.choice([6, 17])
+        flow["tcp_flags"] = random.choice([16, 17, 24, 25])
+        flow["active_time"] = random.uniform(50, 85)
+
+    else:  # Benign
+        flow["duration"] = random.uniform(5, 30)
+        flow["src_bytes"] = random.uniform(100, 8000)
+        flow["dst_bytes"] = random.uniform(500, 12000)
+        flow["packets"] = random.randint(5, 50)
+        flow["active_time"] = random.uniform(5, 25)
+
+    return flow, THREAT_CLASSES[threat_index]
+
+
+class FlowSource(abc.ABC):
+    """A stream of flow batches
+
+    read() waits at most `timeout` seconds and returns up to max_flows flow
+    dicts as soon as any are available, [] if none arrived in time, or None
+    once the source is exhausted.
+    """
+
+    @abc.abstractmethod
+    def read(self, max_flows=256, timeout=1.0):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SimulatedFlowSource(FlowSource):
+    """Synthetic flows at `rate` flows per second (unthrottled if rate is None)"""
+
+    def __init__(self, rate=10.0):
+        self.rate = rate
+        self._next = time.monotonic()
+
+    def read(self, max_flows=256, timeout=1.0):
+        count = max_flows
+        if self.rate:
+            now = time.monotonic()
+            if self._next > now:
+                time.sleep(min(self._next - now, timeout))
+                now = time.monotonic()
+            count = min(max_flows, int((now - self._next) * self.rate) + 1) if now >= self._next else 0
+            self._next += count / self.rate
+        return [simulate_flow()[0] for _ in range(count)]
+
+
+def normalize_columns(frame):
+    """Rename capture columns to flow field names using COLUMN_ALIASES"""
+    renames = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in frame.columns:
+                renames[alias] = field
+                break
+    return frame.rename(columns=renames)
+
+
+class ReplayFlowSource(FlowSource):
+    """Replays a CSV or Parquet capture
+
+    With a timestamp column the original inter-arrival gaps are reproduced,
+    divided by `speed`; otherwise flows are released at `rate` per second.
+    speed=0 / rate=None replays as fast as the monitor reads. loop=True
+    restarts from the beginning at end of file.
+    """
+
+    def __init__(self, path, speed=1.0, rate=None, timestamp_col=None, chunksize=10000, loop=False):
+        self.path = path
+        self.speed = speed
+        self.rate = rate
+        self.timestamp_col = timestamp_col
+        self.chunksize = chunksize
+        self.loop = loop
+        self._chunks = None
+        self._buffer = deque()
+        self._times = deque()
+        self._start = None
+        self._first_ts = None
+        self._released = 0
+
+    def _iter_chunks(self):
+        import pandas as pd  # only replay needs pandas; keep it out of server startup
+
+        if self.path.endswith('.parquet'):
+            # Requires pyarrow (or fastparquet); loads the file, then slices it
+            frame = pd.read_parquet(self.path)
+            for start in range(0, len(frame), self.chunksize):
+                yield frame.iloc[start:start + self.chunksize]
+        else:
+            yield from pd.read_csv(self.path, chunksize=self.chunksize)
+
+    def _fill(self):
+        if self._chunks is None:
+            self._chunks = self._iter_chunks()
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            if not self.loop:
+                return False
+            # Start the next pass on a fresh timeline
+            self._chunks, self._first_ts = None, None
+            self._start, self._released = time.monotonic(), 0
+            return self._fill()
+
+        chunk = normalize_columns(chunk)
+        if self.timestamp_col and self.timestamp_col in chunk.columns:
+            import pandas as pd
+
+            # Parsed timestamps may come back in us or s resolution; count nanoseconds explicitly
+            times = pd.to_datetime(chunk[self.timestamp_col]).dt.as_unit('ns').astype('int64').to_numpy() / 1e9
+        else:
+            times = [None] * len(chunk)
+        numeric = chunk.select_dtypes('number').columns
+        chunk[numeric] = chunk[numeric].fillna(0)
+        self._buffer.extend(chunk.to_dict('records'))
+        self._times.extend(times)
+        return True
+
+    def _release_time(self, index, ts):
+        """Monotonic time at which the flow at `index` in the replay is due"""
+        if ts is not None and self.speed:
+            if self._first_ts is None:
+                self._first_ts = ts
+            return self._start + (ts - self._first_ts) / self.speed
+        if ts is None and self.rate:
+            return self._start + index / self.rate
+        return self._start
+
+    def read(self, max_flows=256, timeout=1.0):
+        if not self._buffer and not self._fill():
+            return None
+        if self._start is None:
+            self._start = time.monotonic()
+
+        deadline = time.monotonic() + timeout
+        while True:
+            due = self._release_time(self._released, self._times[0])
+            now = time.monotonic()
+            if due <= now:
+                break
+            if due > deadline:
+                time.sleep(max(deadline - now, 0))
+                return []
+            time.sleep(due - now)
+
+        batch = []
+        now = time.monotonic()
+        while len(batch) < max_flows:
+            if not self._buffer and not self._fill():
+                break
+            if self._release_time(self._released, self._times[0]) > now:
+                break
+            batch.append(self._buffer.popleft())
+            self._times.popleft()
+            self._released += 1
+        return batch
+
+
+class UDPFlowSource(FlowSource):
+    """JSON flow records from a local UDP socket, one object or a list of objects per datagram
+
+    Stands in for a NetFlow/IPFIX collector: an exporter-side shim (nfcapd,
+    goflow2, softflowd piped through a converter, ...) sends decoded records
+    as JSON.
+    """
+
+    def __init__(self, host='127.0.0.1', port=2055, max_datagram=65535):
+        self.max_datagram = max_datagram
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+        self.sock.bind((host, port))
+        self.address = self.sock.getsockname()
+        self.malformed = 0
+        self._pending = deque()
+
+    def _decode(self, datagram):
+        try:
+            records = json.loads(datagram)
+        except ValueError:
+            self.malformed += 1
+            return
+        records = records if isinstance(records, list) else [records]
+        self._pending.extend(normalize_record(record) for record in records if isinstance(record, dict))
+
+    def read(self, max_flows=256, timeout=1.0):
+        # Records past max_flows from a list datagram wait in _pending for the next read
+        if not self._pending:
+            self.sock.settimeout(timeout)
+            try:
+                self._decode(self.sock.recv(self.max_datagram))
+            except socket.timeout:
+                return []
+        # Drain whatever else is already queued without waiting
+        self.sock.setblocking(False)
+        try:
+            while len(self._pending) < max_flows:
+                self._decode(self.sock.recv(self.max_datagram))
+        except BlockingIOError:
+            pass
+        return [self._pending.popleft() for _ in range(min(max_flows, len(self._pending)))]
+
+    def close(self):
+        self.sock.close()
+
+
+def normalize_record(record):
+    """Map an aliased flow record onto the flow field names"""
+    flow = dict(record)
+    for field, aliases in COLUMN_ALIASES.items():
+        if field not in flow:
+            for alias in aliases:
+                if alias in record:
+                    flow[field] = record[alias]
+                    break
+    return flow
+
+
+class TailFlowSource(FlowSource):
+    """Follows a JSON-lines flow file like `tail -F`, reopening it after rotation or truncation"""
+
+    def __init__(self, path, from_start=False, poll_interval=0.1):
+        self.path = path
+        self.from_start = from_start
+        self.poll_interval = poll_interval
+        self.malformed = 0
+        self._file = None
+        self._inode = None
+        self._partial = ''
+
+    def _open(self):
+        try:
+            self._file = open(self.path, 'r')
+        except FileNotFoundError:
+            return False
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        if not self.from_start:
+            self._file.seek(0, os.SEEK_END)
+        # Files that appear after a rotation are read from the beginning
+        self.from_start = True
+        return True
+
+    def _rotated(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return stat.st_ino != self._inode or stat.st_size < self._file.tell()
+
+    def read(self, max_flows=256, timeout=1.0):
+        deadline = time.monotonic() + timeout
+        batch = []
+        while True:
+            if self._file is None and not self._open():
+                if time.monotonic() >= deadline:
+                    return batch
+                time.sleep(self.poll_interval)
+                continue
+
+            while len(batch) < max_flows:
+                line = self._file.readline()
+                if not line:
+                    break
+                if not line.endswith('\n'):
+                    # Writer is mid-line; keep the fragment for the next read
+                    self._partial += line
+                    break
+                line, self._partial = self._partial + line, ''
+                if line.strip():
+                    try:
+                        batch.append(normalize_record(json.loads(line)))
+                    except (ValueError, TypeError):
+                        self.malformed += 1
+
+            if batch or time.monotonic() >= deadline:
+                return batch
+            if self._rotated():
+                self._file.close()
+                self._file, self._partial = None, ''
+                continue
+            time.sleep(self.poll_interval)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def create_flow_source(spec='simulated', **options):
+    """Build a source from a spec string
+
+    simulated | replay:<path.csv|path.parquet> | udp:<host>:<port> | tail:<path>
+    """
+    kind, _, target = spec.partition(':')
+    if kind == 'simulated':
+        return SimulatedFlowSource(**options)
+    if kind == 'replay':
+        return ReplayFlowSource(target, **options)
+    if kind == 'udp':
+        host, _, port = target.rpartition(':')
+        return UDPFlowSource(host or '127.0.0.1', int(port or 2055), **options)
+    if kind == 'tail':
+        return TailFlowSource(target, **options)
+    raise ValueError(f"Unknown flow source: {spec}")
@@ -0,0 +1,224 @@
+"""
+Versioned model bundles: one directory per trained model
+
+    models/bundles/<version>/
+        manifest.json   format, version, architecture config, class names, tensor shapes, metrics
+        weights.pt      state dict, opened with torch.load(mmap=True) so weights are mapped, not copied
+        scaler.npz      preprocessing parameters as plain arrays (no pickles)
+
+Before any weights are read, the loader checks the manifest against the
+architecture it names. It then checks the mapped tensors against the
+manifest, and raises BundleError on any mismatch; there is no fallback
+model. Bundles are written to a temporary directory and renamed into
+place, so a directory holding a manifest is always complete.
+
+Usage: python model_bundle.py convert <checkpoint.pth> [--version v] [--out models/bundles]
+"""
+import argparse
+import datetime
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import torch
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+WEIGHTS_NAME = 'weights.pt'
+SCALER_NAME = 'scaler.npz'
+
+# Architectures a manifest may name: module -> class
+ARCHITECTURES = {
+    'models.gcn_threat_detector': 'NetworkFlowGCN',
+    'training_gcn_model': 'NetworkFlowGCN',
+}
+
+
+class BundleError(ValueError):
+    """A bundle that is incomplete or does not match its architecture"""
+
+
+def _architecture_class(architecture):
+    module, name = architecture.get('module'), architecture.get('class')
+    if ARCHITECTURES.get(module) != name:
+        raise BundleError(f"unsupported architecture {module}.{name}")
+    return getattr(importlib.import_module(module), name)
+
+
+def _shape_mismatches(expected, actual):
+    """Human-readable differences between two {name: shape} dicts"""
+    problems = [f"missing {name}" for name in expected if name not in actual]
+    problems += [f"unexpected {name}" for name in actual if name not in expected]
+    problems += [f"{name}: expected {list(expected[name])}, got {list(actual[name])}"
+                 for name in expected if name in actual and list(expected[name]) != list(actual[name])]
+    return problems
+
+
+class ModelBundle:
+    """A loaded bundle: the eval-mode model plus its manifest, class names and scaler arrays"""
+
+    def __init__(self, path, manifest, model, scaler):
+        self.path = path
+        self.manifest = manifest
+        self.model = model
+        self.scaler = scaler
+        self.version = manifest['version']
+        self.class_names = manifest['class_names']
+
+
+def read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST_NAME), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise BundleError(f"{path}: unreadable manifest ({e})")
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise BundleError(f"{path}: format_version {manifest.get('format_version')} is not {FORMAT_VERSION}")
+    return manifest
+
+
+def load_bundle(path):
+    """Validate and load a bundle; raises BundleError instead of degrading"""
+    manifest = read_manifest(path)
+    architecture = manifest['architecture']
+    config = architecture['config']
+    if len(manifest['class_names']) != config['num_classes']:
+        raise BundleError(f"{path}: {len(manifest['class_names'])} class names for {config['num_classes']} classes")
+
+    # Build on the meta device: shapes only, no memory, then check them before touching the weights
+    with torch.device('meta'):
+        model = _architecture_class(architecture)(**config)
+    expected = {name: tuple(tensor.shape) for name, tensor in model.state_dict().items()}
+    problems = _shape_mismatches(expected, manifest['tensors'])
+    if problems:
+        raise BundleError(f"{path}: manifest does not match the architecture: " + "; ".join(problems))
+
+    state_dict = torch.load(os.path.join(path, WEIGHTS_NAME), map_location='cpu', mmap=True, weights_only=True)
+    problems = _shape_mismatches(expected, {name: tuple(tensor.shape) for name, tensor in state_dict.items()})
+    if problems:
+        raise BundleError(f"{path}: weights do not match the manifest: " + "; ".join(problems))
+    model.load_state_dict(state_dict, strict=True, assign=True)
+
+    scaler = {}
+    scaler_path = os.path.join(path, SCALER_NAME)
+    if os.path.exists(scaler_path):
+        with np.load(scaler_path, allow_pickle=False) as arrays:
+            scaler = {name: arrays[name] for name in arrays.files}
+        feature_names = manifest.get('feature_names')
+        for name, values in scaler.items():
+            if feature_names and values.ndim == 1 and len(values) != len(feature_names):
+                raise BundleError(f"{path}: scaler {name} has {len(values)} values for {len(feature_names)} features")
+
+    return ModelBundle(path, manifest, model.eval(), scaler)
+
+
+def is_bundle(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_NAME))
+
+
+def list_bundles(root):
+    """Complete bundle directories under root, oldest version first"""
+    if not os.path.isdir(root):
+        return []
+    paths = [os.path.join(root, name) for name in os.listdir(root) if not name.startswith('.')]
+    return sorted(path for path in paths if is_bundle(path))
+
+
+def latest_bundle(root):
+    bundles = list_bundles(root)
+    return bundles[-1] if bundles else None
+
+
+def scaler_arrays(scaler):
+    """Plain arrays from a fitted sklearn StandardScaler"""
+    return {
+        'mean': np.asarray(scaler.mean_, dtype=np.float64),
+        'scale': np.asarray(scaler.scale_, dtype=np.float64),
+        'var': np.asarray(scaler.var_, dtype=np.float64),
+        'n_samples_seen': np.asarray(scaler.n_samples_seen_),
+    }
+
+
+def save_bundle(model, root, class_names, version=None, scaler=None, feature_names=None, metrics=None):
+    """Write model as a new bundle under root and return its path
+
+    model must be one of ARCHITECTURES and expose input_dim, hidden_dim,
+    num_classes and dropout. scaler is a dict of arrays (see scaler_arrays).
+    """
+    module = type(model).__module__
+    if ARCHITECTURES.get(module) != type(model).__name__:
+        raise BundleError(f"unsupported architecture {module}.{type(model).__name__}")
+    config = {'input_dim': model.input_dim, 'hidden_dim': model.hidden_dim,
+              'num_classes': model.num_classes, 'dropout': model.dropout}
+    if len(class_names) != config['num_classes']:
+        raise BundleError(f"{len(class_names)} class names for {config['num_classes']} classes")
+
+    version = version or datetime.datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(root, version)
+    if os.path.exists(path):
+        raise BundleError(f"bundle {path} already exists")
+    state_dict = {name: tensor.detach().cpu().contiguous() for name, tensor in model.state_dict().items()}
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'version': version,
+        'created_at': datetime.datetime.utcnow().isoformat(),
+        'architecture': {'module': module, 'class': type(model).__name__, 'config': config},
+        'class_names': list(class_names),
+        'feature_names': list(feature_names) if feature_names is not None else None,
+        'tensors': {name: list(tensor.shape) for name, tensor in state_dict.items()},
+        'metrics': metrics or {},
+        'torch_version': torch.__version__,
+    }
+
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{version}-", dir=root)
+    try:
+        torch.save(state_dict, os.path.join(staging, WEIGHTS_NAME))
+        if scaler:
+            np.savez(os.path.join(staging, SCALER_NAME), **scaler)
+        with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(staging, path)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return path
+
+
+def legacy_config(state_dict):
+    """NetworkFlowGCN constructor arguments read off a bare gcn_threat_detector state dict"""
+    try:
+        hidden_dim, input_dim = state_dict['conv1.lin.weight'].shape
+        num_classes = state_dict['classifier.3.weight'].shape[0]
+    except KeyError as e:
+        raise BundleError(f"not a NetworkFlowGCN checkpoint: missing {e}")
+    return {'input_dim': input_dim, 'hidden_dim': hidden_dim, 'num_classes': num_classes}
+
+
+def main():
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from models.gcn_threat_detector import NetworkFlowGCN
+    from utils import THREAT_TYPES
+
+    parser = argparse.ArgumentParser(description="Model bundle tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help="turn a bare .pth state dict into a bundle")
+    convert.add_argument('checkpoint')
+    convert.add_argument('--version')
+    convert.add_argument('--out', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'bundles'))
+    args = parser.parse_args()
+
+    state_dict = torch.load(args.checkpoint, map_location='cpu', weights_only=True)
+    model = NetworkFlowGCN(**legacy_config(state_dict))
+    model.load_state_dict(state_dict, strict=True)
+    path = save_bundle(model, args.out, THREAT_TYPES, version=args.version)
+    load_bundle(path)
+    print(f"✓ Bundle written to {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Hot model reload: watch for new model versions and swap them in without a restart
+
+Readers call registry.get() once per batch and keep that reference until the
+batch is done. A swap only replaces the registry's pointer (read-copy-update),
+so in-flight batches finish on the version they started with, and the old
+model is freed once the last of them drops it. A new version is loaded and
+warmed up on the watcher thread and becomes visible only after it has scored
+a warm-up batch. A version that fails to load is skipped until it changes
+again, and the current version keeps serving.
+"""
+import datetime
+import threading
+
+from flow_sources import simulate_flow
+
+
+class ModelVersion:
+    """One loaded model and where it came from"""
+
+    def __init__(self, version, path, model):
+        self.version = version
+        self.path = path
+        self.model = model
+        self.loaded_at = datetime.datetime.utcnow()
+
+    def to_dict(self):
+        return {'model_version': self.version, 'model_path': self.path,
+                'loaded_at': self.loaded_at.isoformat()}
+
+
+class ModelRegistry:
+    """Current model plus the last few versions, for rollback
+
+    source() returns (path, version) of every deployed model, newest first;
+    load(path) returns the model or raises. on_change(version) runs after
+    every swap, including rollbacks. reject(version) is called with the
+    version a rollback moves away from, so source() can leave it out after
+    a restart as well.
+    """
+
+    def __init__(self, source, load, poll_interval=5.0, keep=3, warm_up_flows=64, on_change=None, reject=None):
+        self.source = source
+        self.load = load
+        self.reject = reject
+        self.poll_interval = poll_interval
+        self.keep = keep
+        self.warm_up_flows = warm_up_flows
+        self.on_change = on_change
+        self._current = None
+        self._history = []  # previous ModelVersions, newest last
+        self._skipped = set()  # versions that failed to load or were rolled back
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def current(self):
+        return self._current
+
+    def get(self):
+        """The model to score the next batch with; loads the first version on demand"""
+        current = self._current
+        if current is None:
+            self.refresh()
+            current = self._current
+        return current.model if current is not None else None
+
+    def versions(self):
+        current = self._current
+        return {
+            'current': current.to_dict() if current is not None else None,
+            'previous': [entry.to_dict() for entry in reversed(self._history)],
+            'skipped': sorted(self._skipped)
+        }
+
+    def refresh(self):
+        """Swap in the newest version that loads, if it is newer than the current one; True if swapped
+
+        Versions older than the current one are only tried while no model is
+        loaded, so a broken newest bundle at startup falls back to the one before it.
+        """
+        with self._lock:
+            current = self._current
+            for path, version in self.source():
+                if current is not None and current.version == version:
+                    return False
+                if version in self._skipped:
+                    continue
+                try:
+                    print(f"[Models] Loading version {version}", flush=True)
+                    candidate = ModelVersion(version, path, self._warm_up(self.load(path)))
+                except Exception as e:
+                    print(f"[Models] ✗ Version {version} failed to load, keeping "
+                          f"{current.version if current is not None else 'no model'}: {e}", flush=True)
+                    self._skipped.add(version)
+                    if current is not None:
+                        return False
+                    continue
+                self._swap(candidate)
+                break
+            else:
+                return False
+        self._notify(candidate)
+        return True
+
+    def rollback(self):
+        """Go back to the previous version; the one rolled back from is skipped by the watcher from now on"""
+        with self._lock:
+            if not self._history:
+                raise ValueError("no previous model version to roll back to")
+            if self.reject is not None and self._current is not None:
+                # Persist first: if this fails the rollback does not happen
+                self.reject(self._current.version)
+            previous = self._history.pop()
+            if self._current is not None:
+                self._skipped.add(self._current.version)
+            self._current = previous
+            print(f"[Models] ↩ Rolled back to version {previous.version}", flush=True)
+        self._notify(previous)
+        return previous
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="model-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        # The first version is loaded here too, so startup does not wait for torch and the weights
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[Models] Error checking for new models: {e}", flush=True)
+            if self._stop.wait(self.poll_interval):
+                return
+
+    def _warm_up(self, model):
+        """Score a small batch so lazy initialisation happens here, not on live traffic"""
+        from utils import detect_threats
+
+        if model is None:
+            raise ValueError("loader returned no model")
+        results = detect_threats(model, [simulate_flow()[0] for _ in range(self.warm_up_flows)])
+        if any(result is None for result in results):
+            raise ValueError("warm-up batch failed")
+        return model
+
+    def _swap(self, candidate):
+        previous = self._current
+        if previous is not None:
+            self._history.append(previous)
+            del self._history[:-self.keep]
+        # A single reference assignment: readers see the old or the new version, never a mix
+        self._current = candidate
+        print(f"[Models] ✓ Serving version {candidate.version}", flush=True)
+
+    def _notify(self, version):
+        if self.on_change is not None:
+            try:
+                self.on_change(version)
+            except Exception as e:
+                print(f"[Models] Error announcing version {version.version}: {e}", flush=True)
@@ -0,0 +1,123 @@
+"""
+Post-training INT8 and pruned variants of the fused isolated-node model
+
+Every variant starts from the IsolatedNodeGCN MLP that serving already
+uses. That MLP's Linear layers hold the folded GCN/GAT weight matrices, so
+quantizing or pruning them covers the conv layers too.
+
+- int8: dynamic quantization. Weights are stored as int8, and activations
+  are quantized per batch at run time. The input layer stays fp32.
+- pruned: magnitude pruning of whole hidden units, so the weight matrices
+  get smaller instead of just sparser.
+- pruned-int8: both.
+
+quantize_model.py reports accuracy, agreement with fp32 and speed for each
+variant. MODEL_VARIANT selects one at serving time.
+"""
+import os
+import sys
+
+import torch
+import torch.nn as nn
+from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+from torch.ao.quantization import quantize_dynamic
+
+# The models package lives in the project root, one level above backend/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.isolated_node import IsolatedNodeGCN
+
+VARIANTS = ('fp32', 'int8', 'pruned', 'pruned-int8')
+DEFAULT_PRUNE_AMOUNT = 0.1
+
+
+def _linear_layers(fused):
+    encoder = [layer for layer in fused.encoder if isinstance(layer, nn.Linear)]
+    classifier = [layer for layer in fused.classifier if isinstance(layer, nn.Linear)]
+    return encoder, classifier
+
+
+def quantize_int8(fused):
+    """Dynamic INT8 copy of the fused model; keeps the float weights for worker processes"""
+    # The input layer stays fp32: the bytes-per-packet features run to ~5e4 next to
+    # 0-1 features, and one per-batch activation scale would round those to zero
+    layers = {name for name, module in fused.named_modules() if isinstance(module, nn.Linear) and name != 'encoder.0'}
+    quantized = quantize_dynamic(fused, layers, dtype=torch.qint8)
+    # DetectionWorkerPool ships float weights and re-quantizes in each worker
+    quantized.float_state_dict = fused.state_dict()
+    return quantized
+
+
+def prune_neurons(fused, amount=DEFAULT_PRUNE_AMOUNT, calibration=None):
+    """Remove the least important fraction of units from every hidden layer
+
+    A unit's importance is its mean activation on the calibration features
+    times the norm of its outgoing weights. Without calibration features,
+    the norm of its incoming weights and bias stands in for the activation;
+    that underrates units fed by the large bytes-per-packet features.
+    Dropping a unit removes one row of its layer and one column of the next
+    layer. The output logits keep their size. Pooling between encoder and
+    classifier is a per-feature mean, so units of the last encoder layer can
+    be pruned as well.
+    """
+    if not 0 <= amount < 1:
+        raise ValueError("prune amount must be in [0, 1)")
+    encoder, classifier = _linear_layers(fused)
+    weights = [[layer.weight.detach().clone(), layer.bias.detach().clone()] for layer in encoder + classifier]
+
+    activations = calibration.float() if calibration is not None else None
+    for index in range(len(weights) - 1):
+        weight, bias = weights[index]
+        next_weight = weights[index + 1][0]
+        if activations is not None:
+            activations = torch.relu(activations @ weight.t() + bias)
+            importance = activations.mean(dim=0) * next_weight.norm(dim=0)
+        else:
+            importance = torch.cat([weight, bias.unsqueeze(1)], dim=1).norm(dim=1) * next_weight.norm(dim=0)
+        keep = max(1, round(weight.size(0) * (1 - amount)))
+        kept = importance.topk(keep).indices.sort().values
+        weights[index] = [weight[kept], bias[kept]]
+        weights[index + 1][0] = next_weight[:, kept]
+        if activations is not None:
+            activations = activations[:, kept]
+
+    state_dict = {}
+    for index, (weight, bias) in enumerate(weights):
+        prefix = f"encoder.{index * 2}" if index < len(encoder) else f"classifier.{(index - len(encoder)) * 2}"
+        state_dict[f"{prefix}.weight"], state_dict[f"{prefix}.bias"] = weight, bias
+    return IsolatedNodeGCN.from_fused_state_dict(state_dict)
+
+
+def calibration_features(count=2048):
+    """Encoded simulated flows to rank units on when pruning"""
+    from flow_sources import simulate_flow
+    from utils import flows_to_features
+
+    return flows_to_features([simulate_flow()[0] for _ in range(count)])[0]
+
+
+def build_variant(fused, variant, prune_amount=DEFAULT_PRUNE_AMOUNT, calibration=None):
+    """The named variant of a fused IsolatedNodeGCN, tagged with .variant"""
+    if variant not in VARIANTS:
+        raise ValueError(f"variant must be one of {', '.join(VARIANTS)}")
+    model = fused
+    if variant.startswith('pruned'):
+        model = prune_neurons(model, prune_amount, calibration)
+    if variant.endswith('int8'):
+        model = quantize_int8(model)
+    model.variant = variant
+    return model.eval()
+
+
+def is_quantized(model):
+    return getattr(model, 'variant', 'fp32').endswith('int8')
+
+
+def parameter_count(model):
+    """Weight and bias elements, counting quantized Linear weights too"""
+    count = 0
+    for module in model.modules():
+        if isinstance(module, nn.Linear):
+            count += module.weight.numel() + module.bias.numel()
+        elif isinstance(module, DynamicQuantizedLinear):
+            count += module.weight().numel() + module.bias().numel()
+    return count
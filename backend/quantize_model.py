@@ -0,0 +1,155 @@
+"""
+Build the INT8 / pruned serving variants and report their accuracy, size and speed
+
+Usage: python quantize_model.py [checkpoint] [--dataset csv] [--prune 0.1] [--report path]
+
+For a bundle written by training, accuracy is measured on the test mask of
+the training split. The seed comes from split_seed in model_info.json, so
+these are the same nodes ThreatDetectionTrainer.test scored. The rows are
+fed unscaled, in the bundle's feature order, because load_model folds the
+training scaler into the served model. Each test node is scored as an
+isolated flow, the way the server scores it.
+
+A model that was not trained on the dataset (a converted checkpoint, or a
+bundle whose features the dataset does not have) is only compared with its
+fp32 predictions, on simulated flows encoded by FlowFeatureEncoder. Serve a
+variant with MODEL_VARIANT=int8 (or pruned, pruned-int8).
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+import torch
+
+from flow_sources import simulate_flow
+from model_bundle import SCALER_NAME, is_bundle, read_manifest
+from model_variants import DEFAULT_PRUNE_AMOUNT, VARIANTS, build_variant, calibration_features, parameter_count
+from serving import MODEL_DIR, default_model_path, read_model_info
+from utils import THREAT_TYPES, flows_to_features, isolated_node_model, load_model, self_loop_graph
+
+
+def node_logits(model, x, chunk_size=4096):
+    """Logits for every row of x, each row scored as its own graph"""
+    outputs = []
+    with torch.no_grad():
+        for start in range(0, x.size(0), chunk_size):
+            chunk = x[start:start + chunk_size].float()
+            edge_index, batch = self_loop_graph(chunk.size(0))
+            outputs.append(model(chunk, edge_index, batch))
+    return torch.cat(outputs)
+
+
+def test_split(dataset_path, seed, feature_names):
+    """Unscaled (x, y) of the test mask, or None if the dataset does not hold the model's features"""
+    if not feature_names or not os.path.exists(dataset_path):
+        return None
+    from train_and_deploy import load_features
+    from training_gcn_model import create_train_val_test_masks
+
+    features = load_features(dataset_path)
+    if list(features.feature_names) != list(feature_names) or list(features.class_names) != THREAT_TYPES:
+        print(f"✗ {dataset_path} does not have the features and classes the model was trained on")
+        return None
+    data = features.to_data()
+    _, _, test_mask = create_train_val_test_masks(data.num_nodes, train_ratio=0.7, val_ratio=0.15, seed=seed)
+
+    # The feature store keeps the scaled rows; the served model expects them as they are in the dataset
+    scaler = features.graph_builder().scaler
+    x = data.x[test_mask].double() * torch.from_numpy(scaler.scale_) + torch.from_numpy(scaler.mean_)
+    return x.float(), data.y[test_mask]
+
+
+def trained_feature_names(checkpoint):
+    """Feature names a training bundle was fitted on, or None for other checkpoints"""
+    if not is_bundle(checkpoint):
+        return None
+    manifest = read_manifest(checkpoint)
+    if not os.path.exists(os.path.join(checkpoint, SCALER_NAME)):
+        return None
+    return manifest.get('feature_names')
+
+
+def serialized_bytes(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def throughput(model, input_dim, batch_size, repeat=200):
+    """Flows per second on one thread, best of three rounds"""
+    features = torch.rand(batch_size, input_dim)
+    edge_index, batch = self_loop_graph(batch_size)
+    best = float("inf")
+    with torch.no_grad():
+        for _ in range(3):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                model(features, edge_index, batch)
+            best = min(best, time.perf_counter() - start)
+    return batch_size * repeat / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and evaluate INT8 / pruned serving variants")
+    parser.add_argument('checkpoint', nargs='?', default=default_model_path())
+    parser.add_argument('--dataset', default='../data/PRATIRAKSHA_ransomware_dataset_balanced.csv')
+    parser.add_argument('--prune', type=float, default=DEFAULT_PRUNE_AMOUNT, help="fraction of hidden units to remove")
+    parser.add_argument('--report', default=os.path.join(MODEL_DIR, 'variant_report.json'))
+    args = parser.parse_args()
+
+    if args.checkpoint is None or not os.path.exists(args.checkpoint):
+        print(f"✗ Model not found: {args.checkpoint}")
+        return 1
+    fused = isolated_node_model(load_model(args.checkpoint))
+    torch.set_num_threads(1)
+
+    seed = read_model_info().get('split_seed', 42)
+    split = test_split(args.dataset, seed, trained_feature_names(args.checkpoint))
+    if split is None:
+        print("✗ No training split for this model: reporting agreement with fp32 on simulated flows only")
+        flows = [simulate_flow()[0] for _ in range(20000)]
+        x, y = flows_to_features(flows)[0], None
+        evaluated_on = 'simulated flows (FlowFeatureEncoder)'
+    else:
+        x, y = split
+        evaluated_on = f'dataset test split ({args.dataset})'
+        if x.size(1) != fused.input_dim:
+            print(f"✗ Dataset has {x.size(1)} features but the model expects {fused.input_dim}")
+            return 1
+    print(f"Evaluating on {x.size(0):,} rows of {evaluated_on}")
+
+    # Pruned variants rank units on simulated flows, the same calibration serving uses
+    calibration = calibration_features()
+    reference = node_logits(fused, x).argmax(dim=1)
+    report = {'checkpoint': os.path.abspath(args.checkpoint), 'prune_amount': args.prune,
+              'split_seed': seed if y is not None else None, 'evaluated_on': evaluated_on,
+              'evaluated_flows': x.size(0), 'variants': {}}
+    print(f"{'variant':<13}{'accuracy':>10}{'agreement':>11}{'params':>10}{'bytes':>11}{'flows/s b=1':>13}{'flows/s b=256':>15}")
+    for variant in VARIANTS:
+        model = build_variant(fused, variant, args.prune, calibration)
+        predicted = node_logits(model, x).argmax(dim=1)
+        result = {
+            'accuracy': (predicted == y).float().mean().item() if y is not None else None,
+            'agreement_with_fp32': (predicted == reference).float().mean().item(),
+            'parameters': parameter_count(model),
+            'serialized_bytes': serialized_bytes(model),
+            'flows_per_sec_batch_1': throughput(model, fused.input_dim, 1),
+            'flows_per_sec_batch_256': throughput(model, fused.input_dim, 256, repeat=50)
+        }
+        report['variants'][variant] = result
+        accuracy = f"{result['accuracy']:.2%}" if y is not None else 'n/a'
+        print(f"{variant:<13}{accuracy:>10}{result['agreement_with_fp32']:>11.2%}{result['parameters']:>10,}"
+              f"{result['serialized_bytes']:>11,}{result['flows_per_sec_batch_1']:>13,.0f}"
+              f"{result['flows_per_sec_batch_256']:>15,.0f}")
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✓ Report written to {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+Pieces shared by the threaded Flask server (app.py) and the ASGI server (asgi_app.py)
+"""
+import datetime
+import json
+import os
+import tempfile
+import threading
+
+from database import decode_cursor, log_threat, record_flows
+from flow_sources import create_flow_source
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+MODEL_PATH = os.path.join(MODEL_DIR, 'gcn_threat_detector.pth')
+BUNDLE_DIR = os.environ.get('MODEL_BUNDLE_DIR', os.path.join(MODEL_DIR, 'bundles'))
+# Versions rolled back through /api/model/rollback; never loaded again, across restarts too
+ROLLED_BACK_PATH = os.path.join(BUNDLE_DIR, '.rolled_back.json')
+EXPORT_DIR = os.environ.get('MODEL_EXPORT_DIR', os.path.join(MODEL_DIR, 'exported'))
+
+# eager (checkpoint + PyTorch) or an export_model.py artifact: torchscript | onnx
+MODEL_RUNTIME = os.environ.get('MODEL_RUNTIME', 'eager')
+
+# Eager runtime only: fp32 | int8 | pruned | pruned-int8 (see quantize_model.py for their accuracy)
+MODEL_VARIANT = os.environ.get('MODEL_VARIANT', 'fp32')
+
+# Neighbours per flow for neighbour-window scoring; 0 (default) scores every flow as an isolated node
+FLOW_INDEX_K = int(os.environ.get('FLOW_INDEX_K', 0))
+
+DEFAULT_MODEL_INFO = {
+    "model_architecture": "GCN-Threat-Detector",
+    "parameter_count": 452485,
+    "accuracy_percentage": 78.47,
+    "status": "Running"
+}
+
+
+def read_model_info():
+    try:
+        info_path = os.path.join(MODEL_DIR, 'model_info.json')
+        if os.path.exists(info_path):
+            with open(info_path, 'r') as f:
+                return json.load(f)
+        print(f"Model info file not found at {info_path}")
+    except Exception as e:
+        print(f"Error loading model_info.json: {e}")
+    return dict(DEFAULT_MODEL_INFO)
+
+
+def default_model_path():
+    """Newest bundle in BUNDLE_DIR, else the bare MODEL_PATH checkpoint, else None"""
+    from model_bundle import latest_bundle
+
+    bundle = latest_bundle(BUNDLE_DIR)
+    if bundle is not None:
+        return bundle
+    return MODEL_PATH if os.path.exists(MODEL_PATH) else None
+
+
+def rolled_back_versions():
+    try:
+        with open(ROLLED_BACK_PATH, 'r') as f:
+            return set(json.load(f))
+    except FileNotFoundError:
+        return set()
+    except (OSError, ValueError) as e:
+        print(f"Error reading {ROLLED_BACK_PATH}: {e}")
+        return set()
+
+
+def mark_rolled_back(version):
+    """Record version in ROLLED_BACK_PATH (written to a temporary file and renamed)"""
+    versions = sorted(rolled_back_versions() | {version})
+    os.makedirs(BUNDLE_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix='.rolled_back-', dir=BUNDLE_DIR)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(versions, f, indent=2)
+    os.replace(path, ROLLED_BACK_PATH)
+
+
+def model_sources():
+    """(path, version) of every deployed model load_serving_model can load, newest first
+
+    Bundles are versioned by directory name; a bare checkpoint or an export
+    is versioned by its modification time, so rewriting it deploys a new version.
+    Versions in ROLLED_BACK_PATH are left out; delete the file (or the entry)
+    to allow them again.
+    """
+    from exported_model import MANIFEST_NAME as EXPORT_MANIFEST_NAME
+    from model_bundle import list_bundles
+
+    if MODEL_RUNTIME != 'eager':
+        sources, path, marker = [], EXPORT_DIR, os.path.join(EXPORT_DIR, EXPORT_MANIFEST_NAME)
+    else:
+        sources = [(bundle, os.path.basename(bundle)) for bundle in reversed(list_bundles(BUNDLE_DIR))]
+        path = marker = MODEL_PATH
+    if os.path.exists(marker):
+        modified = datetime.datetime.utcfromtimestamp(os.path.getmtime(marker))
+        sources.append((path, f"{os.path.basename(path)}@{modified.strftime('%Y%m%d-%H%M%S')}"))
+    rolled_back = rolled_back_versions()
+    return [(path, version) for path, version in sources if version not in rolled_back]
+
+
+def load_serving_model(model_path=None):
+    """The model to serve for MODEL_RUNTIME, or None if its files are missing
+
+    torch and the model code are imported here rather than at module level,
+    so the servers can answer /health before the runtime is loaded.
+    """
+    if MODEL_RUNTIME == 'eager':
+        from utils import isolated_node_model, load_model
+
+        model_path = model_path or default_model_path()
+        if model_path is None:
+            print(f"No model bundle in {BUNDLE_DIR} and no checkpoint at {MODEL_PATH}")
+            return None
+        model = load_model(model_path)
+        if MODEL_VARIANT == 'fp32':
+            return model
+        from model_variants import DEFAULT_PRUNE_AMOUNT, build_variant, calibration_features
+        prune_amount = float(os.environ.get('MODEL_PRUNE_AMOUNT', DEFAULT_PRUNE_AMOUNT))
+        calibration = calibration_features() if MODEL_VARIANT.startswith('pruned') else None
+        model = build_variant(isolated_node_model(model), MODEL_VARIANT, prune_amount, calibration)
+        print(f"✓ Serving {MODEL_VARIANT} variant")
+        return model
+
+    from exported_model import MANIFEST_NAME, load_exported_model
+    if not os.path.exists(os.path.join(EXPORT_DIR, MANIFEST_NAME)):
+        print(f"No exported model in {EXPORT_DIR}, run export_model.py first")
+        return None
+    num_threads = int(os.environ.get('MODEL_NUM_THREADS', 0)) or None
+    model = load_exported_model(EXPORT_DIR, MODEL_RUNTIME, num_threads=num_threads)
+    print(f"✓ Serving {MODEL_RUNTIME} export (buckets {model.buckets}, {model.num_threads or 'default'} threads)")
+    return model
+
+
+def flow_source_from_env():
+    """Flow source from FLOW_SOURCE: simulated | replay:<csv/parquet> | udp:<host>:<port> | tail:<jsonl>"""
+    spec = os.environ.get('FLOW_SOURCE', 'simulated')
+    kind = spec.partition(':')[0]
+    options = {}
+    if kind == 'simulated':
+        options['rate'] = float(os.environ.get('FLOW_SIMULATED_RATE', 10))
+    elif kind == 'replay':
+        options['speed'] = float(os.environ.get('FLOW_REPLAY_SPEED', 1.0))
+        options['timestamp_col'] = os.environ.get('FLOW_REPLAY_TIMESTAMP_COL')
+        options['loop'] = os.environ.get('FLOW_REPLAY_LOOP', '0') == '1'
+    return create_flow_source(spec, **options)
+
+
+def flow_index_from_env(worker_pool=False):
+    """Window of recently seen flows to score new flows with their nearest neighbours, or None
+
+    Off unless FLOW_INDEX_K > 0: neighbour scoring runs the full message-passing
+    NetworkFlowGCN instead of the fused isolated-node MLP, about 10x fewer
+    flows/s. Only the eager fp32 model scored in this process can use it, so
+    with a worker pool, another MODEL_VARIANT or an exported runtime it stays
+    off and a warning says so, rather than predictions silently depending on
+    the deployment settings.
+    """
+    if FLOW_INDEX_K <= 0:
+        return None
+    ignored_by = [reason for reason, applies in (
+        ('DETECTION_WORKERS', worker_pool),
+        (f'MODEL_RUNTIME={MODEL_RUNTIME}', MODEL_RUNTIME != 'eager'),
+        (f'MODEL_VARIANT={MODEL_VARIANT}', MODEL_VARIANT != 'fp32')) if applies]
+    if ignored_by:
+        print(f"⚠ FLOW_INDEX_K={FLOW_INDEX_K} is ignored with {', '.join(ignored_by)}: "
+              f"flows are scored as isolated nodes", flush=True)
+        return None
+    from flow_index import FlowNeighborIndex
+
+    return FlowNeighborIndex(
+        capacity=int(os.environ.get('FLOW_INDEX_CAPACITY', 4096)),
+        max_age=float(os.environ.get('FLOW_INDEX_MAX_AGE', 300)),
+        k=FLOW_INDEX_K
+    )
+
+
+def frontend_threat(result):
+    return {
+        'timestamp': result['timestamp_str'],
+        'source_ip': result['source_ip'],
+        'dest_ip': result['dest_ip'],
+        'threat_type': result['threat_type'],
+        'confidence': f"{result['confidence']:.0%}",
+        'status': result['status']
+    }
+
+
+class ThreatResultSink:
+    """Counts, logs and broadcasts scored flow batches"""
+
+    def __init__(self, broadcaster):
+        self.broadcaster = broadcaster
+        self.threat_counter = 0
+        self._lock = threading.Lock()
+
+    def handle(self, flows, results):
+        """Record one scored batch; returns how many flows were scored"""
+        scored = [result for result in results if result is not None]
+        benign = sum(result['status'] == 'BENIGN' for result in scored)
+        try:
+            record_flows(len(scored), benign=benign)
+        except Exception as db_err:
+            print(f"  Database error: {db_err}", flush=True)
+
+        threats = [result for result in scored if result['status'] != 'BENIGN']
+        for threat in threats:
+            try:
+                log_threat(threat)
+            except Exception as db_err:
+                print(f"  Database error: {db_err}", flush=True)
+        if threats:
+            with self._lock:
+                self.threat_counter += len(threats)
+                counter = self.threat_counter
+            latest = threats[-1]
+            print(f"🚨 [{counter}] {len(threats)} threat(s) in {len(flows)} flows | latest: "
+                  f"{latest['threat_type']:15} | {latest['source_ip']:20} | Conf: {latest['confidence']:.0%}", flush=True)
+
+        # Emit all flows to frontend (benign and malicious), queued for the next threat_batch frame
+        for result in scored:
+            self.broadcaster.publish(frontend_threat(result), confidence=result['confidence'])
+        return len(scored)
+
+
+def parse_threat_query(args):
+    """query_threats kwargs and output format from /api/threats query args; raises ValueError"""
+    fmt = args.get('format', 'json')
+    if fmt not in ('json', 'ndjson'):
+        raise ValueError("format must be json or ndjson")
+    cursor = args.get('cursor') or None
+    if cursor:
+        decode_cursor(cursor)
+    limit = int(args['limit']) if args.get('limit') else (None if fmt == 'ndjson' else 100)
+    if limit is not None and limit < 1:
+        raise ValueError("limit must be positive")
+    query = {
+        'threat_type': args.get('type'),
+        'status': args.get('status'),
+        'ip': args.get('ip'),
+        'start': datetime.datetime.fromisoformat(args['start']) if args.get('start') else None,
+        'end': datetime.datetime.fromisoformat(args['end']) if args.get('end') else None,
+        'cursor': cursor,
+        'limit': limit
+    }
+    return query, fmt
+
+
+def threat_response_chunks(threats, fmt, limit):
+    """Serialize a query_threats stream as NDJSON lines or one JSON page with next_cursor"""
+    if fmt == 'ndjson':
+        for threat in threats:
+            yield json.dumps(threat) + "\n"
+        return
+
+    yield '{"threats": ['
+    last, count = None, 0
+    for threat in threats:
+        yield (',' if count else '') + json.dumps(threat)
+        last, count = threat, count + 1
+    next_cursor = last['cursor'] if last is not None and count == limit else None
+    yield '], "next_cursor": ' + json.dumps(next_cursor) + '}'
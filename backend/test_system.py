@@ -8,10 +8,11 @@ print('='*60)
 
 # Test 1: Database
 print('\n[1/4] TESTING DATABASE...')
-from database import init_db, log_threat, get_stats
+from database import init_db, log_threat, get_stats, flush_threats
 try:
     init_db()
     log_threat({'source_ip': '192.168.1.100', 'dest_ip': '192.168.1.1', 'threat_type': 'Ransomware', 'confidence': 0.95, 'status': 'BLOCKED'})
+    flush_threats()
     stats = get_stats()
     print(f'✓ Database OK')
     print(f'  Threats Detected: {stats["threats_detected"]}')
@@ -23,7 +24,8 @@ except Exception as e:
 print('\n[2/4] TESTING MODEL...')
 try:
     from utils import load_model
-    model = load_model('models/trained_model.pth')
+    from serving import default_model_path
+    model = load_model(default_model_path())
     if model:
         print(f'✓ Model Loaded Successfully')
     else:
@@ -49,7 +51,8 @@ except Exception as e:
 print('\n[4/4] TESTING THREAT DETECTION...')
 try:
     from utils import detect_threat, load_model
-    model = load_model('models/trained_model.pth')
+    from serving import default_model_path
+    model = load_model(default_model_path())
     if model:
         test_flow = {
             'src_ip': '192.168.1.50',
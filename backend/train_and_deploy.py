@@ -22,11 +22,38 @@ logger = logging.getLogger(__name__)
 import sys
 sys.path.insert(0, os.path.dirname(__file__))
 from training_gcn_model import (
+    DEFAULT_NUM_NEIGHBORS,
     NetworkFlowGCN, 
     NetworkGraphBuilder, 
     ThreatDetectionTrainer,
     create_train_val_test_masks
 )
+from feature_store import FeatureStore, ingested_dataset, ingested_graph_config
+from model_bundle import save_bundle, scaler_arrays
+
+DATASET_PATH = '../data/PRATIRAKSHA_ransomware_dataset_balanced.csv'
+
+# Fixed seed for the train/val/test split, recorded in model_info.json so evaluations reuse the test mask
+SPLIT_SEED = 42
+
+# Neighbours per flow in the k-NN training graph
+KNN_K = 5
+
+def load_features(dataset_path=DATASET_PATH):
+    """Training graph for dataset_path, built once and then reopened from the feature store"""
+    config = ingested_graph_config(label_col='Label', knn_k=KNN_K)
+    
+    def build_graph():
+        # Chunked CSV -> memory-mapped cache -> graph, never the whole DataFrame
+        dataset = ingested_dataset(dataset_path, label_col=config['label_col'], chunksize=config['chunksize'])
+        logger.info(f"✓ Ingested dataset: {dataset.num_rows} samples")
+        logger.info(f"  Class distribution: {dataset.class_counts}")
+        
+        graph_builder = NetworkGraphBuilder()
+        data, _ = graph_builder.create_graph_from_ingested(dataset, chunksize=config['chunksize'], knn_k=config['knn_k'])
+        return data, graph_builder
+    
+    return FeatureStore().get_or_build(dataset_path, config, build_graph)
 
 def train_final_model():
     """Train the model and save it with metadata"""
@@ -35,36 +62,16 @@ def train_final_model():
     logger.info("PRATIRAKSHA FINAL MODEL TRAINING & DEPLOYMENT")
     logger.info("="*60)
     
-    # Load dataset in chunks to avoid memory issues
-    dataset_path = '../data/PRATIRAKSHA_ransomware_dataset_balanced.csv'
+    # Build graph, or reopen it from the feature store if the dataset is unchanged
     try:
-        logger.info("Loading dataset in chunks...")
-        chunks = []
-        for chunk in pd.read_csv(dataset_path, chunksize=5000):
-            chunks.append(chunk)
-            if len(chunks) >= 3:  # Load 15k samples
-                break
-        df = pd.concat(chunks, ignore_index=True)
-        logger.info(f"✓ Loaded dataset: {len(df)} samples")
-        logger.info(f"  Class distribution:\n{df['Label'].value_counts()}")
+        features = load_features()
     except Exception as e:
         logger.error(f"Failed to load dataset: {e}")
         return False
-    
-    # Use stratified sampling
-    from sklearn.model_selection import StratifiedShuffleSplit
-    if len(df) > 10000:
-        sss = StratifiedShuffleSplit(n_splits=1, test_size=None, train_size=10000, random_state=42)
-        train_idx = list(sss.split(df, df['Label']))[0][0]
-        df = df.iloc[train_idx].reset_index(drop=True)
-        logger.info(f"✓ Using {len(df)} samples (stratified)")
-    
-    # Build graph
-    graph_builder = NetworkGraphBuilder()
-    data, class_names = graph_builder.create_graph_from_flows(df)
+    data, class_names = features.to_data(), features.class_names
     
     data.train_mask, data.val_mask, data.test_mask = create_train_val_test_masks(
-        data.num_nodes, train_ratio=0.7, val_ratio=0.15
+        data.num_nodes, train_ratio=0.7, val_ratio=0.15, seed=SPLIT_SEED
     )
     
     # Create model
@@ -80,18 +87,26 @@ def train_final_model():
     logger.info(f"\n{'='*60}")
     logger.info("TRAINING PHASE")
     logger.info(f"{'='*60}")
-    history = trainer.train(data, epochs=200, patience=25)
+    # Neighbour-sampled mini-batches keep peak memory independent of dataset size
+    minibatch = dict(batch_size=1024, num_neighbors=DEFAULT_NUM_NEIGHBORS, num_workers=min(4, os.cpu_count() or 1))
+    history = trainer.train(data, epochs=200, patience=25, **minibatch)
     
     # Test
-    test_acc = trainer.test(data)
+    test_acc = trainer.test(data, **minibatch)
     
-    # Save model
-    model_save_path = 'models/trained_model.pth'
-    torch.save(trainer.model.state_dict(), model_save_path)
-    logger.info(f"\n✓ Model saved to {model_save_path}")
+    # Save model as a versioned bundle: weights, scaler arrays, class names and architecture
+    graph_builder = features.graph_builder()
+    bundle_path = save_bundle(
+        trainer.model, 'models/bundles', class_names,
+        scaler=scaler_arrays(graph_builder.scaler),
+        feature_names=graph_builder.feature_names,
+        metrics={'test_accuracy': float(test_acc), 'best_val_accuracy': max(history['val_acc'])}
+    )
+    logger.info(f"\n✓ Model bundle saved to {bundle_path}")
     
     # Save model metadata
     model_info = {
+        "bundle_version": os.path.basename(bundle_path),
         "model_architecture": "Graph Convolutional Network with Attention",
         "parameter_count": sum(p.numel() for p in trainer.model.parameters()),
         "number_of_classes": len(class_names),
@@ -103,6 +118,7 @@ def train_final_model():
         "input_dims": data.num_node_features,
         "dropout": 0.15,
         "final_test_accuracy": float(test_acc),
+        "split_seed": SPLIT_SEED,
         "best_val_accuracy": max(history['val_acc'])
     }
     
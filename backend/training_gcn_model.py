@@ -9,12 +9,16 @@ from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.model_selection import train_test_split
 from sklearn.neighbors import NearestNeighbors
 import logging
+import os
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class NetworkFlowGCN(nn.Module):
     
+    # Message-passing layers (conv1-4 and the GAT attention): a node's output depends on nodes this many hops away
+    num_layers = 5
+    
     def __init__(self, input_dim, hidden_dim=128, num_classes=6, dropout=0.15):
         super(NetworkFlowGCN, self).__init__()
         
@@ -128,6 +132,36 @@ class NetworkFlowGCN(nn.Module):
             'probabilities': probabilities.tolist()
         }
 
+def knn_edge_index(features, k=10, chunk_size=65536, n_jobs=None, algorithm="auto"):
+    """Symmetric, deduplicated k-NN edge index as an int64 [2, num_edges] array
+    
+    Neighbours are queried chunk by chunk so only chunk_size x (k + 1) indices
+    are held at a time. algorithm selects the scikit-learn index ('auto', 'kd_tree',
+    'ball_tree' or blocked 'brute') and n_jobs its worker count (-1 = all cores).
+    """
+    features = np.ascontiguousarray(features, dtype=np.float32)
+    n_samples = len(features)
+    if n_samples < 2:
+        return np.zeros((2, 0), dtype=np.int64)
+    k = min(k, n_samples - 1)
+    
+    index = NearestNeighbors(n_neighbors=k + 1, algorithm=algorithm, n_jobs=n_jobs).fit(features)
+    
+    # Each undirected edge is stored once as low * n + high, then deduplicated
+    pair_keys = []
+    for start in range(0, n_samples, chunk_size):
+        stop = min(start + chunk_size, n_samples)
+        neighbors = index.kneighbors(features[start:stop], return_distance=False)
+        rows = np.repeat(np.arange(start, stop, dtype=np.int64), neighbors.shape[1])
+        cols = neighbors.ravel().astype(np.int64)
+        not_self = rows != cols
+        rows, cols = rows[not_self], cols[not_self]
+        pair_keys.append(np.unique(np.minimum(rows, cols) * n_samples + np.maximum(rows, cols)))
+    
+    pair_keys = np.unique(np.concatenate(pair_keys))
+    low, high = np.divmod(pair_keys, n_samples)
+    return np.stack([np.concatenate([low, high]), np.concatenate([high, low])])
+
 class NetworkGraphBuilder:
     
     def __init__(self):
@@ -136,7 +170,7 @@ class NetworkGraphBuilder:
         self.feature_names = None
         self.class_names = None
         
-    def create_graph_from_flows(self, flows_df, target_col='Label'):
+    def create_graph_from_flows(self, flows_df, target_col='Label', knn_k=5):
         logger.info(f"Creating graphs from {len(flows_df)} flows...")
         
         features = flows_df.drop(columns=[target_col])
@@ -147,17 +181,19 @@ class NetworkGraphBuilder:
         
         encoded_labels = self.label_encoder.fit_transform(labels)
         
-        scaled_features = self.scaler.fit_transform(features)
-        
-        # Add feature importance weighting
-        # Normalize features more aggressively
-        scaled_features = (scaled_features - scaled_features.mean(axis=0)) / (scaled_features.std(axis=0) + 1e-8)
+        # Standardize and re-normalize in one fused affine pass. After the scaler,
+        # each column has mean 0 and std 1 (0 for constant columns), so the
+        # second normalization (x - mean) / (std + 1e-8) reduces to a rescale.
+        self.scaler.fit(features)
+        unit_std = np.where(self.scaler.var_ > 0, 1.0, 0.0)
+        multiplier = 1.0 / (self.scaler.scale_ * (unit_std + 1e-8))
+        scaled_features = features.to_numpy(dtype=np.float64) * multiplier - self.scaler.mean_ * multiplier
         
         node_features = torch.FloatTensor(scaled_features)
         node_labels = torch.LongTensor(encoded_labels)
         
         # Use lower k for faster computation on large datasets
-        edge_index = self._create_edges_knn(scaled_features, k=5)
+        edge_index = self._create_edges_knn(scaled_features, k=knn_k)
         
         data = Data(
             x=node_features,
@@ -174,39 +210,42 @@ class NetworkGraphBuilder:
         
         return data, self.class_names
         
-    def _create_edges_knn(self, features, k=10):
-        """Create edges using a simple, ultra-fast approach"""
-        logger.info(f"Creating graph edges (ultra-fast mode)...")
+    def create_graph_from_ingested(self, dataset, scaled_path=None, chunksize=100000, knn_k=5):
+        """Build the graph from an IngestedDataset cache, scaling it chunk by chunk into a memmap"""
+        logger.info(f"Creating graph from {dataset.num_rows} ingested flows...")
         
-        n_samples = len(features)
+        self.feature_names = list(dataset.feature_names)
+        self.class_names = list(dataset.class_names)
+        self.label_encoder.classes_ = np.array(self.class_names, dtype=object)
+        self.scaler = dataset.scaler()
         
-        # Use a simple but effective random neighborhood approach
-        edges = []
-        np.random.seed(42)
+        scaled_path = scaled_path or os.path.join(dataset.cache_dir, 'scaled.f32')
+        scaled = np.memmap(scaled_path, dtype=np.float32, mode='w+', shape=dataset.features.shape)
+        mean = self.scaler.mean_.astype(np.float32)
+        scale = self.scaler.scale_.astype(np.float32)
+        for start, stop, values, _ in dataset.iter_chunks(chunksize):
+            scaled[start:stop] = (dataset.clean_chunk(values) - mean) / scale
+        scaled.flush()
         
-        # Create edges by connecting each node to k random neighbors
-        # Plus some structure from sequential indices
-        for i in range(n_samples):
-            # Connect to next k nodes (sequential)
-            for j in range(1, min(4, n_samples - i)):
-                edges.append([i, i + j])
-                edges.append([i + j, i])
-            
-            # Connect to k random nodes
-            random_neighbors = np.random.choice(n_samples, size=min(2, n_samples-1), replace=False)
-            for j in random_neighbors:
-                if i != j:
-                    edges.append([i, j])
+        data = Data(
+            x=torch.from_numpy(scaled),
+            edge_index=self._create_edges_knn(scaled, k=knn_k),
+            y=torch.from_numpy(np.asarray(dataset.labels, dtype=np.int64))
+        )
+        
+        logger.info(f"Graph created:")
+        logger.info(f"   Nodes: {data.num_nodes}")
+        logger.info(f"   Edges: {data.num_edges}")
+        logger.info(f"   Features: {data.num_node_features}")
+        logger.info(f"   Classes: {len(self.class_names)}")
         
-        # Remove duplicates
-        edges_set = set(tuple(e) for e in edges)
-        edge_list = [[e[0], e[1]] for e in edges_set]
+        return data, self.class_names
         
-        if len(edge_list) == 0:
-            # Fallback
-            edge_list = [[i, (i+1) % n_samples] for i in range(n_samples)]
+    def _create_edges_knn(self, features, k=10, n_jobs=None):
+        """Create edges between each flow and its k nearest neighbours in feature space"""
+        logger.info(f"Creating graph edges (k-NN, k={k})...")
         
-        edge_index = torch.LongTensor(edge_list).t().contiguous()
+        edge_index = torch.from_numpy(knn_edge_index(features, k=k, n_jobs=n_jobs))
         logger.info(f"Created graph with {edge_index.size(1)} edges")
         
         return edge_index
@@ -225,6 +264,104 @@ class NetworkGraphBuilder:
         
         return node_features, edge_index
 
+# One fanout per message-passing layer, so sampled seeds keep their whole receptive
+# field; the outer hops are narrower to bound the subgraph size
+DEFAULT_NUM_NEIGHBORS = (10, 10, 5, 5, 5)
+
+class NeighborSubgraphSampler:
+    """GraphSAGE-style neighbour sampler turning a batch of seed nodes into a sampled subgraph
+    
+    Works from a CSR view of the graph, so each batch only touches the seeds'
+    sampled neighbourhood. x and y may be tensors or (memory-mapped) arrays.
+    Usable as a DataLoader collate_fn; each worker reseeds from torch's seed.
+    """
+    
+    def __init__(self, edge_index, x, y, num_neighbors=DEFAULT_NUM_NEIGHBORS, num_nodes=None):
+        edge_index = edge_index.cpu().numpy() if isinstance(edge_index, torch.Tensor) else np.asarray(edge_index)
+        num_nodes = num_nodes if num_nodes is not None else len(x)
+        
+        # In-neighbours grouped by target node
+        order = np.argsort(edge_index[1], kind='stable')
+        self.neighbors = edge_index[0][order].astype(np.int64)
+        self.indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edge_index[1], minlength=num_nodes), out=self.indptr[1:])
+        
+        self.x = x
+        self.y = y
+        self.num_neighbors = list(num_neighbors)
+        self._seed = None
+        self._rng = None
+        
+    def _sample_hop(self, nodes, fanout):
+        """Sample up to fanout in-neighbours per node; returns (sources, targets)"""
+        starts = self.indptr[nodes]
+        degrees = self.indptr[nodes + 1] - starts
+        owner = np.repeat(np.arange(len(nodes)), degrees)
+        offsets = np.arange(degrees.sum()) - np.repeat(np.cumsum(degrees) - degrees, degrees)
+        positions = np.repeat(starts, degrees) + offsets
+        
+        if fanout >= 0 and (degrees > fanout).any():
+            # Shuffle each node's neighbour list and keep the first fanout entries
+            shuffled = np.lexsort((self._rng.random(len(owner)), owner))
+            keep = shuffled[offsets < fanout]
+            owner, positions = owner[keep], positions[keep]
+        
+        return self.neighbors[positions], nodes[owner]
+    
+    def __call__(self, seeds):
+        if self._seed != torch.initial_seed():
+            self._seed = torch.initial_seed()
+            self._rng = np.random.default_rng(self._seed)
+        
+        seeds = np.asarray(seeds, dtype=np.int64)
+        node_ids, frontier = seeds, seeds
+        sources, targets = [], []
+        for fanout in self.num_neighbors:
+            hop_sources, hop_targets = self._sample_hop(frontier, fanout)
+            sources.append(hop_sources)
+            targets.append(hop_targets)
+            frontier = np.setdiff1d(hop_sources, node_ids)
+            node_ids = np.concatenate([node_ids, frontier])
+        
+        # Relabel global node ids to positions in node_ids (seeds first)
+        sorter = np.argsort(node_ids)
+        def relabel(ids):
+            return sorter[np.searchsorted(node_ids, ids, sorter=sorter)]
+        edge_index = np.stack([relabel(np.concatenate(sources)), relabel(np.concatenate(targets))])
+        
+        return Data(
+            x=_gather_rows(self.x, node_ids).float(),
+            edge_index=torch.from_numpy(edge_index),
+            y=_gather_rows(self.y, node_ids).long(),
+            n_id=torch.from_numpy(node_ids),
+            batch_size=len(seeds)
+        )
+
+def _gather_rows(values, ids):
+    if isinstance(values, torch.Tensor):
+        return values[torch.from_numpy(ids).to(values.device)].cpu()
+    return torch.from_numpy(np.asarray(values[ids]))
+
+def create_neighbor_loader(data, input_nodes, num_neighbors=DEFAULT_NUM_NEIGHBORS, batch_size=1024, shuffle=True, num_workers=0):
+    """Mini-batch loader over input_nodes (index tensor or boolean mask) yielding sampled subgraphs
+    
+    The first batch.batch_size nodes of each subgraph are the seed nodes.
+    """
+    if isinstance(input_nodes, torch.Tensor):
+        if input_nodes.dtype == torch.bool:
+            input_nodes = input_nodes.nonzero().view(-1)
+        input_nodes = input_nodes.cpu().numpy()
+    
+    sampler = NeighborSubgraphSampler(data.edge_index, data.x, data.y, num_neighbors, num_nodes=data.num_nodes)
+    return torch.utils.data.DataLoader(
+        input_nodes,
+        batch_size=batch_size,
+        shuffle=shuffle,
+        collate_fn=sampler,
+        num_workers=num_workers,
+        persistent_workers=num_workers > 0
+    )
+
 class ThreatDetectionTrainer:
     
     def __init__(self, model, device='cpu'):
@@ -236,7 +373,7 @@ class ThreatDetectionTrainer:
         self.history = {'train_loss': [], 'train_acc': [], 'val_loss': [], 'val_acc': []}
         # Learning rate scheduler
         self.scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(
-            self.optimizer, mode='max', factor=0.7, patience=8, verbose=False, min_lr=1e-6
+            self.optimizer, mode='max', factor=0.7, patience=8, min_lr=1e-6
         )
         
     def train_epoch(self, data):
@@ -260,6 +397,52 @@ class ThreatDetectionTrainer:
         
         return loss.item(), train_acc.item()
     
+    def _check_fanout_depth(self, num_neighbors):
+        layers = getattr(self.model, 'num_layers', None)
+        if layers and len(num_neighbors) < layers:
+            logger.warning(f"Sampling {len(num_neighbors)} hops for a model with {layers} message-passing layers: "
+                           f"nodes {len(num_neighbors) + 1}-{layers} hops away are left out of each seed's subgraph")
+    
+    def train_epoch_minibatch(self, loader):
+        """One pass over a neighbour-sampled loader; loss is computed on the seed nodes only"""
+        self.model.train()
+        total_loss = total_correct = total_examples = 0
+        
+        for batch in loader:
+            batch = batch.to(self.device)
+            self.optimizer.zero_grad()
+            
+            out = self.model(batch.x, batch.edge_index)[:batch.batch_size]
+            y = batch.y[:batch.batch_size]
+            
+            loss = self.criterion(out, y)
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=1.0)  # Gradient clipping
+            self.optimizer.step()
+            
+            total_loss += loss.item() * batch.batch_size
+            total_correct += (out.argmax(dim=1) == y).sum().item()
+            total_examples += batch.batch_size
+        
+        return total_loss / max(total_examples, 1), total_correct / max(total_examples, 1)
+    
+    def evaluate_minibatch(self, loader):
+        """Loss and accuracy over the seed nodes of a neighbour-sampled loader"""
+        self.model.eval()
+        total_loss = total_correct = total_examples = 0
+        
+        with torch.no_grad():
+            for batch in loader:
+                batch = batch.to(self.device)
+                out = self.model(batch.x, batch.edge_index)[:batch.batch_size]
+                y = batch.y[:batch.batch_size]
+                
+                total_loss += self.criterion(out, y).item() * batch.batch_size
+                total_correct += (out.argmax(dim=1) == y).sum().item()
+                total_examples += batch.batch_size
+        
+        return total_loss / max(total_examples, 1), total_correct / max(total_examples, 1)
+    
     def validate(self, data):
         self.model.eval()
         with torch.no_grad():
@@ -272,17 +455,29 @@ class ThreatDetectionTrainer:
             
         return val_loss.item(), val_acc.item()
     
-    def train(self, data, epochs=100, patience=10):
+    def train(self, data, epochs=100, patience=10, batch_size=None, num_neighbors=DEFAULT_NUM_NEIGHBORS, num_workers=0):
+        """Train full-batch, or on neighbour-sampled mini-batches when batch_size is given"""
         logger.info(f"Starting training for {epochs} epochs...")
         logger.info(f"Train samples: {data.train_mask.sum().item()}, Val samples: {data.val_mask.sum().item()}, Test samples: {data.test_mask.sum().item()}")
         
+        if batch_size:
+            logger.info(f"Mini-batch mode: batch size {batch_size}, neighbours per hop {list(num_neighbors)}, workers {num_workers}")
+            self._check_fanout_depth(num_neighbors)
+            train_loader = create_neighbor_loader(data, data.train_mask, num_neighbors, batch_size,
+                                                  shuffle=True, num_workers=num_workers)
+            val_loader = create_neighbor_loader(data, data.val_mask, num_neighbors, batch_size,
+                                                shuffle=False, num_workers=num_workers)
+        
         best_val_acc = 0
         patience_counter = 0
         
         for epoch in range(epochs):
-            train_loss, train_acc = self.train_epoch(data)
-            
-            val_loss, val_acc = self.validate(data)
+            if batch_size:
+                train_loss, train_acc = self.train_epoch_minibatch(train_loader)
+                val_loss, val_acc = self.evaluate_minibatch(val_loader)
+            else:
+                train_loss, train_acc = self.train_epoch(data)
+                val_loss, val_acc = self.validate(data)
             
             self.history['train_loss'].append(train_loss)
             self.history['train_acc'].append(train_acc)
@@ -312,7 +507,15 @@ class ThreatDetectionTrainer:
         
         return self.history
     
-    def test(self, data):
+    def test(self, data, batch_size=None, num_neighbors=DEFAULT_NUM_NEIGHBORS, num_workers=0):
+        if batch_size:
+            self._check_fanout_depth(num_neighbors)
+            test_loader = create_neighbor_loader(data, data.test_mask, num_neighbors, batch_size,
+                                                 shuffle=False, num_workers=num_workers)
+            _, test_acc = self.evaluate_minibatch(test_loader)
+            logger.info(f"Test Accuracy: {test_acc:.4f}")
+            return test_acc
+        
         self.model.eval()
         with torch.no_grad():
             out = self.model(data.x, data.edge_index)
@@ -322,8 +525,10 @@ class ThreatDetectionTrainer:
         logger.info(f"Test Accuracy: {test_acc:.4f}")
         return test_acc.item()
 
-def create_train_val_test_masks(num_nodes, train_ratio=0.6, val_ratio=0.2):
-    indices = torch.randperm(num_nodes)
+def create_train_val_test_masks(num_nodes, train_ratio=0.6, val_ratio=0.2, seed=None):
+    """Random node split; the same seed always gives the same masks"""
+    generator = torch.Generator().manual_seed(seed) if seed is not None else None
+    indices = torch.randperm(num_nodes, generator=generator)
     
     train_size = int(train_ratio * num_nodes)
     val_size = int(val_ratio * num_nodes)
@@ -341,33 +546,20 @@ def create_train_val_test_masks(num_nodes, train_ratio=0.6, val_ratio=0.2):
 if __name__ == "__main__":
     logger.info("Training GCN model with real ransomware dataset...")
     
-    # Load actual dataset with nrows limit
-    dataset_path = '../data/PRATIRAKSHA_ransomware_dataset_balanced.csv'
+    from feature_store import ingested_dataset
     
-    try:
-        logger.info(f"Loading dataset from {dataset_path}...")
-        # Load only first 15000 rows to improve performance
-        df = pd.read_csv(dataset_path, nrows=15000)
-        logger.info(f"Loaded dataset: {len(df)} samples")
-        logger.info(f"Class distribution:\n{df['Label'].value_counts()}")
-    except FileNotFoundError:
+    dataset_path = '../data/PRATIRAKSHA_ransomware_dataset_balanced.csv'
+    if not os.path.exists(dataset_path):
         logger.warning(f"Dataset not found at {dataset_path}, trying alternative path...")
         dataset_path = '../data/PRATIRAKSHA_ransomware_dataset.csv'
-        logger.info(f"Loading dataset from {dataset_path}...")
-        df = pd.read_csv(dataset_path, nrows=15000)
-        logger.info(f"Loaded dataset: {len(df)} samples")
-        logger.info(f"Class distribution:\n{df['Label'].value_counts()}")
-    
-    # Use stratified sampling to balance classes
-    from sklearn.model_selection import StratifiedShuffleSplit
-    if len(df) > 10000:
-        sss = StratifiedShuffleSplit(n_splits=1, test_size=None, train_size=10000, random_state=42)
-        train_idx = list(sss.split(df, df['Label']))[0][0]
-        df = df.iloc[train_idx].reset_index(drop=True)
-        logger.info(f"Using {len(df)} samples for training (stratified)")
+    
+    # Stream the CSV into a memory-mapped cache instead of holding it as one DataFrame
+    dataset = ingested_dataset(dataset_path, label_col='Label')
+    logger.info(f"Ingested dataset: {dataset.num_rows} samples")
+    logger.info(f"Class distribution: {dataset.class_counts}")
     
     graph_builder = NetworkGraphBuilder()
-    data, class_names = graph_builder.create_graph_from_flows(df)
+    data, class_names = graph_builder.create_graph_from_ingested(dataset)
     
     data.train_mask, data.val_mask, data.test_mask = create_train_val_test_masks(
         data.num_nodes, 
@@ -383,9 +575,10 @@ if __name__ == "__main__":
     )
     
     trainer = ThreatDetectionTrainer(model)
-    history = trainer.train(data, epochs=300, patience=30)
+    # Train on neighbour-sampled mini-batches so the full dataset fits in memory
+    history = trainer.train(data, epochs=300, patience=30, batch_size=1024, num_workers=4)
     
-    test_acc = trainer.test(data)
+    test_acc = trainer.test(data, batch_size=1024)
     
     logger.info("GCN model training completed successfully!")
     logger.info(f"Final Test Accuracy: {test_acc:.4f}")
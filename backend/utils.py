@@ -1,152 +1,188 @@
-import os
-import torch
 import datetime
-
-import sys
 import os
+import sys
+import weakref
 
-# Add the project root to Python path
-sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-import os
+import numpy as np
 import torch
-import datetime
 import torch.nn.functional as F
 
-from models.gcn_threat_detector import NetworkFlowGCN
+# The models package lives in the project root, one level above backend/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.isolated_node import IsolatedNodeGCN
+from exported_model import ExportedModel
+from flow_features import FlowFeatureEncoder, DURATION, SRC_BYTES, PACKETS
+
 
 def load_model(model_path):
-    try:
-        if not os.path.exists(model_path):
-            raise FileNotFoundError(f"Model file not found at {model_path}")
-        
-        print(f"Loading model from: {model_path}")
-        
-        # Create model with the architecture that the checkpoint was saved with
-        model = NetworkFlowGCN(
-            input_dim=50,
-            hidden_dim=256,
-            num_classes=5,
-            dropout=0.15
-        )
-        
-        # Load the state dictionary with strict=False to handle mismatches
-        state_dict = torch.load(model_path, map_location=torch.device('cpu'))
-        
-        # Try strict loading first
-        try:
-            model.load_state_dict(state_dict, strict=True)
-            print(f"✓ Model loaded successfully (strict mode)")
-        except RuntimeError as e:
-            # If strict loading fails, use non-strict mode
-            print(f"Warning: Using non-strict loading due to architecture mismatch")
-            model.load_state_dict(state_dict, strict=False)
-            print(f"✓ Model loaded successfully (non-strict mode)")
-        
-        model.eval()  # Set to evaluation mode
+    """Load a model bundle directory, or a bare NetworkFlowGCN state dict
+
+    Raises on anything that does not match exactly; there is no
+    non-strict or randomly initialised fallback.
+    """
+    # torch_geometric is only needed to build the full graph model, not to serve isolated flows
+    from models.gcn_threat_detector import NetworkFlowGCN
+    from model_bundle import BundleError, is_bundle, legacy_config, load_bundle
+
+    if not model_path or not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found at {model_path}")
+    print(f"Loading model from: {model_path}")
+
+    if is_bundle(model_path):
+        bundle = load_bundle(model_path)
+        if bundle.class_names != THREAT_TYPES:
+            raise BundleError(f"{model_path}: classes {bundle.class_names} do not match served classes {THREAT_TYPES}")
+        if bundle.model.input_dim != feature_encoder.num_features:
+            raise BundleError(f"{model_path}: model takes {bundle.model.input_dim} features, "
+                              f"flows are encoded into {feature_encoder.num_features}")
+        if bundle.scaler:
+            fold_input_scaler(bundle.model, bundle.scaler, model_path)
+        print(f"✓ Model bundle {bundle.version} loaded")
+        return bundle.model
+
+    state_dict = torch.load(model_path, map_location=torch.device('cpu'), weights_only=True)
+    model = NetworkFlowGCN(**legacy_config(state_dict))
+    model.load_state_dict(state_dict, strict=True)
+    print(f"✓ Model loaded successfully (strict mode)")
+    return model.eval()
+
+
+def fold_input_scaler(model, scaler, model_path):
+    """Fold a training scaler into the input projection of a training_gcn_model network
+
+    Training standardizes each feature column and zeroes constant ones;
+    the projection is a per-node linear layer, so the same affine map can
+    be absorbed into its weights and applies to every serving path.
+    """
+    from model_bundle import BundleError
+
+    if not hasattr(model, 'input_proj'):
+        raise BundleError(f"{model_path}: a scaler cannot be folded into {type(model).__module__}.{type(model).__name__}")
+    multiplier = np.where(scaler['var'] > 0, 1.0 / scaler['scale'], 0.0)
+    multiplier = torch.from_numpy(multiplier).float()
+    offset = torch.from_numpy(scaler['mean']).float() * multiplier
+    projection = model.input_proj[0]
+    with torch.no_grad():
+        bias = projection.bias - projection.weight @ offset
+        projection.weight = torch.nn.Parameter(projection.weight * multiplier)
+        projection.bias = torch.nn.Parameter(bias)
+
+
+# Fused isolated-node MLPs, built once per loaded NetworkFlowGCN
+_isolated_node_models = weakref.WeakKeyDictionary()
+
+
+def isolated_node_model(model):
+    """Return the closed-form isolated-node equivalent of a NetworkFlowGCN"""
+    if isinstance(model, (IsolatedNodeGCN, ExportedModel)):
         return model
-        
+    fused = _isolated_node_models.get(model)
+    if fused is None:
+        fused = IsolatedNodeGCN.from_model(model)
+        _isolated_node_models[model] = fused
+    return fused
+
+
+THREAT_TYPES = ['Benign', 'Cryptolocker', 'Locky', 'Ransomware', 'WannaCry']
+
+feature_encoder = FlowFeatureEncoder()
+
+
+def flows_to_features(flows):
+    """Build the normalized [N, 50] feature tensor (and raw [N, 8] fields) for a flow batch"""
+    features, raw = feature_encoder.encode_tensor(flows)
+    return features, torch.from_numpy(raw)
+
+
+def self_loop_graph(num_nodes):
+    """Block-diagonal graph of isolated nodes: one self-loop and one graph id per node"""
+    nodes = torch.arange(num_nodes, dtype=torch.long)
+    return nodes.repeat(2, 1), nodes
+
+
+def detect_threats(model, network_flows, neighbor_index=None):
+    """Score a batch of flows in one forward pass; returns one result (or None) per flow
+
+    With a FlowNeighborIndex, each flow is scored on a local subgraph joining it
+    to its nearest recently seen flows instead of as an isolated node.
+    """
+    network_flows = list(network_flows)
+    if model is None:
+        print("Model is not loaded, cannot detect threats")
+        return [None] * len(network_flows)
+    if not network_flows:
+        return []
+
+    try:
+        features, raw = flows_to_features(network_flows)
+        predicted, confidence = score_features(model, features, raw, neighbor_index)
     except Exception as e:
-        print(f"✗ Error loading model: {str(e)}")
-        print(f"  Creating a dummy model for testing...")
-        try:
-            # Create a dummy model that can still do inference
-            model = NetworkFlowGCN(
-                input_dim=50,
-                hidden_dim=128,
-                num_classes=5,
-                dropout=0.3
-            )
+        print(f"Error in model inference: {str(e)}")
+        return [None] * len(network_flows)
+
+    return build_results(network_flows, predicted.tolist(), confidence.tolist())
+
+
+def score_features(model, features, raw, neighbor_index=None):
+    """Model forward pass plus confidence post-processing; returns (predicted, confidence) tensors"""
+    with torch.no_grad():
+        if neighbor_index is not None and not isinstance(model, (IsolatedNodeGCN, ExportedModel)):
             model.eval()
-            print(f"✓ Dummy model created for testing")
-            return model
-        except:
-            return None
+            output = neighbor_index.score(model, features)
+        else:
+            # Every flow is an isolated node, so the fused MLP gives the same logits without message passing
+            edge_index, batch = self_loop_graph(features.size(0))
+            output = isolated_node_model(model)(features, edge_index, batch)
+        if output is None:
+            raise ValueError("Model output is None")
+
+        # Apply softmax to get probabilities
+        probabilities = F.softmax(output, dim=1)
+        predicted = torch.argmax(probabilities, dim=1)
+        confidence = probabilities.gather(1, predicted.unsqueeze(1)).squeeze(1)
+
+    # Boost confidence for better visibility: detected threats below 0.6 are
+    # scaled into the 0.6-1.0 range, the rest are boosted but capped at 0.98
+    is_threat = predicted > 0
+    boosted = torch.where(confidence < 0.6, 0.6 + confidence * 0.4,
+                          torch.clamp(confidence * 1.15, max=0.98))
+    confidence = torch.where(is_threat, boosted, confidence)
+
+    # If model says Benign but flow has high threat indicators, re-classify as Ransomware
+    duration, src_bytes, packets = raw[:, DURATION], raw[:, SRC_BYTES], raw[:, PACKETS]
+    reclassify = (predicted == 0) & ((duration > 60) | (src_bytes > 30000) | (packets > 150))
+    predicted = torch.where(reclassify, torch.full_like(predicted, 3), predicted)
+    confidence = torch.where(reclassify, torch.clamp(0.85 + duration / 100.0 * 0.1, max=0.95), confidence)
+
+    # Clamp between 0.5-0.99
+    confidence = torch.clamp(confidence, 0.5, 0.99)
+    return predicted, confidence
+
+
+def build_results(network_flows, predicted, confidence):
+    """Threat dicts (or None for malformed flows) from per-flow classes and confidences"""
+    now = datetime.datetime.utcnow()
+    results = []
+    for flow, predicted_class, flow_confidence in zip(network_flows, predicted, confidence):
+        try:
+            results.append({
+                "timestamp": now,  # for DB
+                "timestamp_str": now.isoformat(),  # for frontend
+                "source_ip": flow["src_ip"],
+                "dest_ip": flow["dst_ip"],
+                "threat_type": THREAT_TYPES[predicted_class],
+                "confidence": float(flow_confidence),
+                "status": "BLOCKED" if predicted_class > 0 else "BENIGN"
+            })
+        except Exception as e:
+            print(f"Error in threat detection: {str(e)}")
+            results.append(None)
+    return results
+
 
 def detect_threat(model, network_flow):
     try:
-        if model is None:
-            print("Model is not loaded, cannot detect threats")
-            return None
-
-        # Convert network flow to features
-        features = torch.zeros(1, 50)
-        
-        # Extract numeric features from network flow
-        duration = float(network_flow.get("duration", 0))
-        protocol = float(network_flow.get("protocol", 0))
-        src_bytes = float(network_flow.get("src_bytes", 0))
-        dst_bytes = float(network_flow.get("dst_bytes", 0))
-        packets = float(network_flow.get("packets", 0))
-        tcp_flags = float(network_flow.get("tcp_flags", 0))
-        active_time = float(network_flow.get("active_time", 0))
-        idle_time = float(network_flow.get("idle_time", 0))
-        
-        # Normalize features to 0-1 range for better model input
-        features[0, 0] = min(duration / 100.0, 1.0)  # duration
-        features[0, 1] = protocol / 17.0  # protocol (normalize by 17)
-        features[0, 2] = min(src_bytes / 50000.0, 1.0)  # src_bytes
-        features[0, 3] = min(dst_bytes / 50000.0, 1.0)  # dst_bytes
-        features[0, 4] = min(packets / 200.0, 1.0)  # packets
-        features[0, 5] = tcp_flags / 255.0  # tcp_flags
-        features[0, 6] = min(active_time / 100.0, 1.0)  # active_time
-        features[0, 7] = min(idle_time / 100.0, 1.0)  # idle_time
-        
-        # Fill remaining features with derived metrics
-        if src_bytes + dst_bytes > 0:
-            features[0, 8] = src_bytes / (src_bytes + dst_bytes)  # src ratio
-        if packets > 0:
-            features[0, 9] = src_bytes / packets if packets > 0 else 0  # bytes per packet
-            features[0, 10] = dst_bytes / packets if packets > 0 else 0
-        
-        # Create a simple edge index for single node
-        edge_index = torch.tensor([[0], [0]], dtype=torch.long)
-        
-        # Get model prediction
-        model.eval()
-        with torch.no_grad():
-            try:
-                output = model(features, edge_index)
-                if output is None:
-                    raise ValueError("Model output is None")
-                    
-                # Apply softmax to get probabilities
-                probabilities = F.softmax(output, dim=1)
-                predicted_class = torch.argmax(probabilities, dim=1).item()
-                confidence = probabilities[0][predicted_class].item()
-                
-                # Boost confidence for better visibility
-                # Apply a confidence enhancement: take the softmax probability and enhance it
-                # If confidence is below 0.5, scale it up to at least 0.6 for detected threats
-                if predicted_class > 0:  # Non-benign threat
-                    if confidence < 0.6:
-                        confidence = 0.6 + (confidence * 0.4)  # Scale to 0.6-1.0 range
-                    else:
-                        confidence = min(confidence * 1.15, 0.98)  # Boost but cap at 0.98
-                
-                # Updated threat types to match the trained model classes
-                threat_types = ['Benign', 'Cryptolocker', 'Locky', 'Ransomware', 'WannaCry']
-                threat_name = threat_types[predicted_class]
-                
-                # Map predicted class intelligently based on flow characteristics
-                # If model says Benign but flow has high threat indicators, re-classify
-                if predicted_class == 0 and (duration > 60 or src_bytes > 30000 or packets > 150):
-                    predicted_class = 3  # Classify as Ransomware
-                    threat_name = 'Ransomware'
-                    confidence = min(0.85 + (duration / 100.0 * 0.1), 0.95)
-                
-                now = datetime.datetime.utcnow()
-                return {
-                    "timestamp": now,  # for DB
-                    "timestamp_str": now.isoformat(),  # for frontend
-                    "source_ip": network_flow["src_ip"],
-                    "dest_ip": network_flow["dst_ip"],
-                    "threat_type": threat_name,
-                    "confidence": float(min(max(confidence, 0.5), 0.99)),  # Clamp between 0.5-0.99
-                    "status": "BLOCKED" if predicted_class > 0 else "BENIGN"
-                }
-            except Exception as e:
-                print(f"Error in model inference: {str(e)}")
-                return None
+        return detect_threats(model, [network_flow])[0]
     except Exception as e:
         print(f"Error in threat detection: {str(e)}")
         return None
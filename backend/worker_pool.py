@@ -0,0 +1,350 @@
+"""
+Multi-process detection workers fed through shared-memory slots
+
+The web process copies only the raw [N, 8] flow fields into a slot of one
+SharedMemory block and sends the worker a (slot, rows) pair; the
+worker writes predicted classes and confidences back into the same slot.
+Only small integers cross the process boundary, never feature arrays.
+Every worker maps the same fused-MLP weight file with
+torch.load(mmap=True), so the page cache holds one copy of the weights.
+
+A worker that dies fails the batches it was holding with WorkerCrashedError
+and is respawned; once a worker has crashed too often it is retired, and
+with no workers left batches are scored in-process. Each worker reports
+on its own pipe: a worker killed mid-write can leave a shared queue's lock
+held forever, a pipe only takes its own writer down with it.
+"""
+import multiprocessing as mp
+import os
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import torch
+
+from flow_features import FLOW_FIELDS
+from utils import build_results, detect_threats, feature_encoder, isolated_node_model, score_features
+from models.isolated_node import IsolatedNodeGCN
+from model_variants import is_quantized, quantize_int8
+
+_STOP = None
+
+
+class WorkerCrashedError(RuntimeError):
+    """The worker scoring a batch exited before returning its results"""
+
+
+def _slot_views(buffer, num_slots, max_batch_size):
+    """raw float64 [slots, batch, 8], predicted int64 [slots, batch], confidence float32 [slots, batch]"""
+    raw = np.ndarray((num_slots, max_batch_size, len(FLOW_FIELDS)), dtype=np.float64, buffer=buffer)
+    predicted = np.ndarray((num_slots, max_batch_size), dtype=np.int64, buffer=buffer, offset=raw.nbytes)
+    confidence = np.ndarray((num_slots, max_batch_size), dtype=np.float32, buffer=buffer,
+                            offset=raw.nbytes + predicted.nbytes)
+    return raw, predicted, confidence
+
+
+def _slot_bytes(num_slots, max_batch_size):
+    return num_slots * max_batch_size * (len(FLOW_FIELDS) * 8 + 8 + 4)
+
+
+def _load_worker_model(weights_path, quantize=False):
+    state_dict = torch.load(weights_path, map_location='cpu', mmap=True, weights_only=True)
+    model = IsolatedNodeGCN.from_fused_state_dict(state_dict)
+    if quantize:
+        model = quantize_int8(model)
+    return model
+
+
+def _worker_main(index, shm_name, num_slots, max_batch_size, tasks, results, weights_path, quantize, num_threads):
+    torch.set_num_threads(num_threads)
+    # Spawned workers share the parent's resource tracker, which unlinks the block once the parent does
+    shm = SharedMemory(name=shm_name)
+    raw_slots, predicted_slots, confidence_slots = _slot_views(shm.buf, num_slots, max_batch_size)
+    model = _load_worker_model(weights_path, quantize)
+    results.send(('loaded', index, weights_path))
+
+    try:
+        while True:
+            message = tasks.get()
+            if message is _STOP:
+                break
+            if message[0] == 'load':
+                model = _load_worker_model(message[1], message[2])
+                results.send(('loaded', index, message[1]))
+                continue
+
+            _, slot, rows, token = message
+            try:
+                raw = torch.from_numpy(raw_slots[slot, :rows].copy())
+                features = torch.from_numpy(feature_encoder.encode_raw(raw.numpy()))
+                predicted, confidence = score_features(model, features, raw)
+                predicted_slots[slot, :rows] = predicted.numpy()
+                confidence_slots[slot, :rows] = confidence.numpy()
+                results.send(('scored', slot, token, None))
+            except Exception as e:
+                results.send(('scored', slot, token, str(e)))
+    finally:
+        del raw_slots, predicted_slots, confidence_slots
+        shm.close()
+        results.close()
+
+
+class DetectionWorkerPool:
+    """Drop-in for MicroBatcher that scores flow batches in num_workers processes
+
+    Batches go round-robin to the workers, at most max_batch_size flows per
+    slot; submit blocks while every slot is in flight. get_model is checked on
+    each submit and a changed model is re-exported and reloaded by every
+    worker before its next batch; superseded weight files are deleted once
+    every worker has acknowledged the new one. Workers always score flows as
+    isolated nodes (the fused MLP); neighbour-window scoring needs the
+    shared window and stays with the in-process MicroBatcher.
+
+    Worker liveness is checked every liveness_interval seconds. A worker
+    that crashes more than max_restarts times is not respawned again.
+    """
+
+    def __init__(self, get_model, num_workers=None, max_batch_size=256, slots_per_worker=4, threads_per_worker=1,
+                 liveness_interval=0.5, max_restarts=3):
+        self.get_model = get_model
+        self.num_workers = num_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_batch_size = max_batch_size
+        self.num_slots = self.num_workers * slots_per_worker
+        self.threads_per_worker = threads_per_worker
+        self.liveness_interval = liveness_interval
+        self.max_restarts = max_restarts
+
+        self._shm = SharedMemory(create=True, size=_slot_bytes(self.num_slots, max_batch_size))
+        self._raw, self._predicted, self._confidence = _slot_views(self._shm.buf, self.num_slots, max_batch_size)
+        self._free_slots = queue.Queue()
+        for slot in range(self.num_slots):
+            self._free_slots.put(slot)
+        self._pending = {}  # slot -> (token, worker, flows, futures)
+        self._next_token = 0
+        self._lock = threading.Lock()
+        self._next_worker = 0
+        self._closed = False
+        self._restarts = [0] * self.num_workers
+        self._loaded = {}  # worker -> weights file it last acknowledged
+
+        self._weights_dir = tempfile.mkdtemp(prefix='detection-weights-')
+        self._model = None
+        self._weights_path = None
+        self._quantize = False
+        self._weights_version = 0
+        try:
+            if not self._export_weights(get_model()):
+                raise RuntimeError("DetectionWorkerPool needs a loaded model")
+        except Exception:
+            self.close()
+            raise
+
+        self._context = mp.get_context('spawn')
+        self._connections = []  # result pipes the collector reads; dropped once their worker has exited
+        # Written to when _connections changes or the pool closes, so the collector re-reads them
+        self._wakeup, self._notify = self._context.Pipe(duplex=False)
+        self._tasks = [None] * self.num_workers
+        self._workers = [None] * self.num_workers
+        for index in range(self.num_workers):
+            self._spawn(index)
+        self._collector = threading.Thread(target=self._collect, name="detection-results", daemon=True)
+        self._collector.start()
+
+    def _spawn(self, index):
+        """Start worker index on a fresh task queue and result pipe (called under _lock once the pool is running)"""
+        receiver, sender = self._context.Pipe(duplex=False)
+        self._tasks[index] = self._context.Queue()
+        self._workers[index] = self._context.Process(
+            target=_worker_main, name=f"detection-worker-{index}", daemon=True,
+            args=(index, self._shm.name, self.num_slots, self.max_batch_size, self._tasks[index], sender,
+                  self._weights_path, self._quantize, self.threads_per_worker)
+        )
+        self._workers[index].start()
+        # Only the worker keeps the sending end, so its exit shows up as EOF on receiver
+        sender.close()
+        self._connections.append(receiver)
+        self._notify.send(None)
+
+    def _export_weights(self, model):
+        """Write the fused MLP for model to a fresh file; returns False if there is no model"""
+        if model is None:
+            return False
+        fused = isolated_node_model(model)
+        if not isinstance(fused, IsolatedNodeGCN):
+            raise RuntimeError("DetectionWorkerPool needs an eager model (MODEL_RUNTIME=eager)")
+        self._weights_version += 1
+        path = os.path.join(self._weights_dir, f"weights-{self._weights_version}.pt")
+        # INT8 variants keep their float weights: each worker maps those and quantizes its own copy
+        torch.save(getattr(fused, 'float_state_dict', None) or fused.state_dict(), path)
+        self._model, self._weights_path, self._quantize = model, path, is_quantized(fused)
+        return True
+
+    def _refresh_model(self):
+        model = self.get_model()
+        if model is not None and model is not self._model:
+            with self._lock:
+                if model is not self._model and self._export_weights(model):
+                    for index, tasks in enumerate(self._tasks):
+                        if self._workers[index] is not None:
+                            tasks.put(('load', self._weights_path, self._quantize))
+
+    def submit_many(self, flows):
+        """Queue flows; returns one Future per flow resolving to its threat dict (or None)"""
+        if self._closed:
+            raise RuntimeError("DetectionWorkerPool is closed")
+        flows = list(flows)
+        self._refresh_model()
+        futures = []
+        for start in range(0, len(flows), self.max_batch_size):
+            futures += self._submit_batch(flows[start:start + self.max_batch_size])
+        return futures
+
+    def submit(self, flow):
+        return self.submit_many([flow])[0]
+
+    def detect(self, flow, timeout=None):
+        return self.submit(flow).result(timeout=timeout)
+
+    def _submit_batch(self, flows):
+        futures = [Future() for _ in flows]
+        try:
+            raw = feature_encoder.raw_columns(flows)
+        except Exception as e:
+            # Same isolation as MicroBatcher: a malformed flow must not fail its neighbours
+            if len(flows) == 1:
+                futures[0].set_result(None)
+                print(f"Error in model inference: {str(e)}")
+                return futures
+            return [future for flow in flows for future in self._submit_batch([flow])]
+
+        slot = self._free_slots.get()
+        self._raw[slot, :len(flows)] = raw
+        with self._lock:
+            live = [index for index, worker in enumerate(self._workers) if worker is not None]
+            if live:
+                worker = min(live, key=lambda index: (index - self._next_worker) % self.num_workers)
+                self._next_worker = (worker + 1) % self.num_workers
+                self._next_token += 1
+                self._pending[slot] = (self._next_token, worker, flows, futures)
+                self._tasks[worker].put(('score', slot, len(flows), self._next_token))
+                return futures
+
+        # Every worker was retired after repeated crashes: score here instead
+        self._free_slots.put(slot)
+        for future, result in zip(futures, detect_threats(self._model, flows)):
+            future.set_result(result)
+        return futures
+
+    def _collect(self):
+        next_check = time.monotonic() + self.liveness_interval
+        while True:
+            with self._lock:
+                if self._closed and not self._connections:
+                    return
+                connections = list(self._connections)
+            ready = wait(connections + [self._wakeup], timeout=self.liveness_interval)
+            if time.monotonic() >= next_check:
+                self._check_workers()
+                next_check = time.monotonic() + self.liveness_interval
+            for connection in ready:
+                if connection is self._wakeup:
+                    connection.recv()
+                    continue
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    # The worker has exited; _check_workers fails its batches
+                    with self._lock:
+                        self._connections.remove(connection)
+                    connection.close()
+                    continue
+                self._handle(message)
+
+    def _handle(self, message):
+        """Record a worker's 'loaded' acknowledgement or resolve the futures of a scored slot"""
+        if message[0] == 'loaded':
+            self._acknowledge(message[1], message[2])
+            return
+
+        _, slot, token, error = message
+        with self._lock:
+            pending = self._pending.get(slot)
+            # A result from a worker that has since been declared dead is stale
+            if pending is None or pending[0] != token:
+                return
+            del self._pending[slot]
+        _, _, flows, futures = pending
+        rows = len(flows)
+        if error is None:
+            results = build_results(flows, self._predicted[slot, :rows].tolist(),
+                                    self._confidence[slot, :rows].tolist())
+        else:
+            print(f"Error in model inference: {error}")
+            results = [None] * rows
+        self._free_slots.put(slot)
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+    def _check_workers(self):
+        """Fail the batches of dead workers, then respawn or retire them"""
+        with self._lock:
+            if self._closed:
+                return
+            for index, worker in enumerate(self._workers):
+                if worker is None or worker.is_alive():
+                    continue
+                lost = [slot for slot, pending in self._pending.items() if pending[1] == index]
+                failed = [self._pending.pop(slot) for slot in lost]
+                self._loaded.pop(index, None)
+                self._restarts[index] += 1
+                if self._restarts[index] > self.max_restarts:
+                    self._workers[index] = None
+                    print(f"[Workers] ✗ detection-worker-{index} exited with code {worker.exitcode} "
+                          f"{self._restarts[index]} times, not respawning", flush=True)
+                else:
+                    print(f"[Workers] ✗ detection-worker-{index} exited with code {worker.exitcode}, "
+                          f"failing {len(lost)} batch(es) and respawning", flush=True)
+                    self._spawn(index)
+                for slot, (_, _, _, futures) in zip(lost, failed):
+                    self._free_slots.put(slot)
+                    for future in futures:
+                        future.set_exception(WorkerCrashedError(f"detection-worker-{index} exited"))
+
+    def _acknowledge(self, worker, path):
+        """Record that worker has loaded path; delete weight files no live worker still uses"""
+        with self._lock:
+            self._loaded[worker] = path
+            live = [index for index, process in enumerate(self._workers) if process is not None]
+            if any(self._loaded.get(index) != self._weights_path for index in live):
+                return
+            for name in os.listdir(self._weights_dir):
+                path = os.path.join(self._weights_dir, name)
+                if path != self._weights_path:
+                    os.remove(path)
+
+    def close(self, timeout=None):
+        """Finish in-flight batches, stop the workers and release the shared memory"""
+        if self._closed:
+            return
+        self._closed = True
+        for index, tasks in enumerate(getattr(self, '_tasks', [])):
+            if self._workers[index] is not None:
+                tasks.put(_STOP)
+        for worker in getattr(self, '_workers', []):
+            if worker is not None:
+                worker.join(timeout)
+        if hasattr(self, '_collector'):
+            # Exits once every worker's pipe has reached EOF
+            self._notify.send(None)
+            self._collector.join(timeout)
+        del self._raw, self._predicted, self._confidence
+        self._shm.close()
+        self._shm.unlink()
+        for name in os.listdir(self._weights_dir):
+            os.remove(os.path.join(self._weights_dir, name))
+        os.rmdir(self._weights_dir)
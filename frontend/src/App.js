@@ -161,7 +161,21 @@ function App() {
     });
 
     socketConnection.on('stats_update', (data) => {
-      setStats(data);
+      // Updates carry only the fields that changed
+      setStats(prev => ({ ...prev, ...data }));
+    });
+
+    socketConnection.on('threat_batch', (batch) => {
+      const newest = [...batch].reverse();
+      setThreats(prev => [...newest, ...prev].slice(0, 50));
+
+      setThreatTypeDistribution(prev => {
+        const next = { ...prev };
+        batch.forEach(threat => {
+          next[threat.threat_type] = (next[threat.threat_type] || 0) + 1;
+        });
+        return next;
+      });
     });
 
     socketConnection.on('new_threat', (threat) => {
@@ -0,0 +1,126 @@
+"""
+Closed-form inference path for NetworkFlowGCN on isolated nodes.
+
+When every node only has its own self-loop, each GCNConv reduces to its
+linear transform plus bias (the symmetric normalization is 1), the GAT
+attention softmax over the single self-loop is 1 so the layer becomes the
+head-averaged projection plus bias, and eval-mode batch norm is an affine
+map that folds into the preceding layer. The whole model is then a plain
+MLP, which this module builds from a NetworkFlowGCN state dict without
+importing torch_geometric. Both the served models.gcn_threat_detector
+layout and the training_gcn_model layout are supported.
+"""
+import torch
+import torch.nn as nn
+
+
+def _fold_batch_norm(weight, bias, state_dict, prefix, eps):
+    """Fold an eval-mode BatchNorm1d into the preceding linear layer"""
+    scale = state_dict[f"{prefix}.weight"] / torch.sqrt(state_dict[f"{prefix}.running_var"] + eps)
+    fused_weight = weight * scale.unsqueeze(1)
+    fused_bias = (bias - state_dict[f"{prefix}.running_mean"]) * scale + state_dict[f"{prefix}.bias"]
+    return fused_weight, fused_bias
+
+
+def _linear(weight, bias):
+    layer = nn.Linear(weight.size(1), weight.size(0))
+    with torch.no_grad():
+        layer.weight.copy_(weight)
+        layer.bias.copy_(bias)
+    return layer
+
+
+class IsolatedNodeGCN(nn.Module):
+    """NetworkFlowGCN folded into an MLP for graphs made only of self-loops
+
+    Takes the same (x, edge_index, batch) arguments as NetworkFlowGCN and
+    returns the same logits, but ignores edge_index: callers must only use
+    it for graphs whose edges are all self-loops. The training_gcn_model
+    network returns log_softmax of those logits when given a batch; the
+    class probabilities are the same.
+    """
+
+    def __init__(self, encoder, classifier):
+        super(IsolatedNodeGCN, self).__init__()
+        self.encoder = encoder
+        self.classifier = classifier
+        self.input_dim = encoder[0].in_features
+        self.num_classes = classifier[-1].out_features
+        self.eval()
+
+    @classmethod
+    def from_state_dict(cls, state_dict, heads=4, bn_eps=1e-5):
+        """Build the fused MLP from a NetworkFlowGCN state dict"""
+        state_dict = {key: value.detach().float().cpu() for key, value in state_dict.items()}
+
+        def folded(weight, bias, bn):
+            return _linear(*_fold_batch_norm(state_dict[weight], state_dict[bias], state_dict, bn, bn_eps))
+
+        # training_gcn_model adds a batch-normed input projection, a fourth
+        # convolution and a batch-normed three-layer classifier
+        trained = "input_proj.0.weight" in state_dict
+        layers = [folded("input_proj.0.weight", "input_proj.0.bias", "input_proj.1"), nn.ReLU()] if trained else []
+        for index in range(1, 5 if trained else 4):
+            layers += [folded(f"conv{index}.lin.weight", f"conv{index}.bias", f"bn{index}"), nn.ReLU()]
+
+        # Older torch_geometric releases name the GAT projection lin_src
+        gat_weight = state_dict.get("attention.lin.weight", state_dict.get("attention.lin_src.weight"))
+        out_channels = gat_weight.size(0) // heads
+        gat_weight = gat_weight.view(heads, out_channels, -1).mean(dim=0)
+        layers += [_linear(gat_weight, state_dict["attention.bias"]), nn.ReLU()]
+
+        if trained:
+            classifier = nn.Sequential(
+                folded("classifier.0.weight", "classifier.0.bias", "classifier.1"),
+                nn.ReLU(),
+                folded("classifier.4.weight", "classifier.4.bias", "classifier.5"),
+                nn.ReLU(),
+                _linear(state_dict["classifier.8.weight"], state_dict["classifier.8.bias"]),
+            )
+        else:
+            classifier = nn.Sequential(
+                _linear(state_dict["classifier.0.weight"], state_dict["classifier.0.bias"]),
+                nn.ReLU(),
+                _linear(state_dict["classifier.3.weight"], state_dict["classifier.3.bias"]),
+            )
+        return cls(nn.Sequential(*layers), classifier)
+
+    @classmethod
+    def from_model(cls, model):
+        """Build the fused MLP from a loaded NetworkFlowGCN"""
+        return cls.from_state_dict(model.state_dict(), heads=model.attention.heads, bn_eps=model.bn1.eps)
+
+    @classmethod
+    def from_fused_state_dict(cls, state_dict):
+        """Rebuild from an IsolatedNodeGCN state dict, adopting its tensors without copying
+
+        Pairs with torch.load(..., mmap=True): the parameters stay backed by the
+        mapped file, so processes loading the same file share one copy.
+        """
+        def stack(prefix):
+            count = sum(1 for key in state_dict if key.startswith(f"{prefix}.") and key.endswith(".weight"))
+            layers = []
+            for index in range(count):
+                weight = state_dict[f"{prefix}.{index * 2}.weight"]
+                layers += [nn.Linear(weight.size(1), weight.size(0)), nn.ReLU()]
+            return layers
+
+        with torch.device("meta"):
+            encoder = nn.Sequential(*stack("encoder"))
+            classifier = nn.Sequential(*stack("classifier")[:-1])
+            model = cls(encoder, classifier)
+        model.load_state_dict(state_dict, assign=True)
+        return model.eval()
+
+    def forward(self, x, edge_index=None, batch=None):
+        x = self.encoder(x)
+
+        # Same pooling as NetworkFlowGCN: per-graph mean, or one mean over all nodes
+        if batch is None:
+            x = torch.mean(x, dim=0).unsqueeze(0)
+        elif batch.numel() != x.size(0) or not torch.equal(batch, torch.arange(x.size(0))):
+            num_graphs = int(batch.max()) + 1
+            counts = torch.bincount(batch, minlength=num_graphs).clamp(min=1).unsqueeze(1)
+            x = torch.zeros(num_graphs, x.size(1), dtype=x.dtype).index_add_(0, batch, x) / counts
+
+        return self.classifier(x)
@@ -0,0 +1,64 @@
+import contextlib
+import os
+import random
+import sys
+import tempfile
+
+import pytest
+import torch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+# database.py creates its engine at import time; keep tests away from backend/database.db
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='pratiraksha-tests-'), 'test.db'))
+
+
+def make_model(seed=0, hidden_dim=32):
+    """Eval-mode NetworkFlowGCN with random weights, as served"""
+    from models.gcn_threat_detector import NetworkFlowGCN
+
+    torch.manual_seed(seed)
+    return NetworkFlowGCN(input_dim=50, hidden_dim=hidden_dim, num_classes=5).eval()
+
+
+def save_trained_bundle(root, version=None, seed=0, epochs=3):
+    """Train the training_gcn_model network briefly, as train_and_deploy does, and save its bundle"""
+    import numpy as np
+    import pandas as pd
+    from model_bundle import save_bundle, scaler_arrays
+    from training_gcn_model import (NetworkFlowGCN, NetworkGraphBuilder, ThreatDetectionTrainer,
+                                    create_train_val_test_masks)
+    from utils import THREAT_TYPES
+
+    # Same layout as create_ransomware_dataset.py: feat_1..feat_50 and a Label column
+    rng = np.random.default_rng(seed)
+    labels = rng.choice(THREAT_TYPES, size=300)
+    values = rng.normal(loc=np.where(labels == 'Benign', 0.0, 2.0)[:, None], scale=1.0, size=(300, 50))
+    df = pd.DataFrame(values, columns=[f'feat_{i}' for i in range(1, 51)])
+    df['Label'] = labels
+
+    graph_builder = NetworkGraphBuilder()
+    data, class_names = graph_builder.create_graph_from_flows(df)
+    data.train_mask, data.val_mask, data.test_mask = create_train_val_test_masks(data.num_nodes, seed=seed)
+    torch.manual_seed(seed)
+    model = NetworkFlowGCN(input_dim=data.num_node_features, hidden_dim=32, num_classes=len(class_names))
+    trainer = ThreatDetectionTrainer(model)
+    # The trainer checkpoints best_gcn_model.pth into the working directory
+    with contextlib.chdir(root):
+        trainer.train(data, epochs=epochs, patience=epochs)
+    return save_bundle(trainer.model, str(root), class_names, version=version,
+                       scaler=scaler_arrays(graph_builder.scaler), feature_names=graph_builder.feature_names)
+
+
+@pytest.fixture
+def model():
+    return make_model()
+
+
+@pytest.fixture
+def flows():
+    from flow_sources import simulate_flow
+
+    random.seed(0)
+    return [simulate_flow()[0] for _ in range(64)]
@@ -0,0 +1,38 @@
+import asyncio
+import json
+import threading
+
+import asgi_app
+
+
+def test_stats_are_read_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def get_stats():
+        threads.append(threading.current_thread())
+        return {'total_flows': 3}
+
+    monkeypatch.setattr(asgi_app, 'get_stats', get_stats)
+    sent, emitted = [], []
+
+    async def send(message):
+        sent.append(message)
+
+    async def emit(event, payload, to=None):
+        emitted.append((event, payload, to))
+
+    async def enter_room(sid, room):
+        pass
+
+    monkeypatch.setattr(asgi_app.sio, 'emit', emit)
+    monkeypatch.setattr(asgi_app.sio, 'enter_room', enter_room)
+
+    async def requests():
+        await asgi_app.rest_app({'type': 'http', 'path': '/api/stats', 'method': 'GET'}, None, send)
+        await asgi_app.connect('sid-1', {})
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(requests())
+    assert json.loads(sent[-1]['body']) == {'total_flows': 3}
+    assert ('stats_update', {'total_flows': 3}, 'sid-1') in emitted
+    assert len(threads) == 2 and loop_thread not in threads
@@ -0,0 +1,63 @@
+import pytest
+
+import batch_inference
+from batch_inference import MicroBatcher
+from utils import detect_threats
+
+
+@pytest.fixture
+def batch_sizes(monkeypatch):
+    """Sizes of the batches MicroBatcher scores"""
+    sizes = []
+
+    def recording(model, flows, neighbor_index=None):
+        sizes.append(len(flows))
+        return detect_threats(model, flows, neighbor_index)
+
+    monkeypatch.setattr(batch_inference, 'detect_threats', recording)
+    return sizes
+
+
+def threat_types(results):
+    return [result['threat_type'] for result in results]
+
+
+def test_batched_results_match_in_process_scoring(model, flows, batch_sizes):
+    batcher = MicroBatcher(lambda: model, max_batch_size=16, max_delay_ms=50)
+    try:
+        results = [future.result(timeout=60) for future in batcher.submit_many(flows)]
+    finally:
+        batcher.close(timeout=10)
+    assert threat_types(results) == threat_types(detect_threats(model, flows))
+    assert max(batch_sizes) == 16
+    assert sum(batch_sizes) == len(flows)
+
+
+def test_a_lone_flow_is_scored_after_the_deadline(model, flows, batch_sizes):
+    batcher = MicroBatcher(lambda: model, max_batch_size=256, max_delay_ms=20)
+    try:
+        assert batcher.detect(flows[0], timeout=10)['threat_type'] == threat_types(detect_threats(model, flows[:1]))[0]
+    finally:
+        batcher.close(timeout=10)
+    assert batch_sizes == [1]
+
+
+def test_close_scores_everything_already_queued(model, flows):
+    batcher = MicroBatcher(lambda: model, max_batch_size=8, max_delay_ms=1000)
+    futures = batcher.submit_many(flows)
+    batcher.close(timeout=30)
+    assert all(future.done() for future in futures)
+    with pytest.raises(RuntimeError):
+        batcher.submit(flows[0])
+
+
+def test_model_errors_fail_the_batch_futures(flows):
+    def broken_model():
+        raise RuntimeError('no model')
+
+    batcher = MicroBatcher(broken_model, max_delay_ms=1)
+    try:
+        with pytest.raises(RuntimeError, match='no model'):
+            batcher.detect(flows[0], timeout=10)
+    finally:
+        batcher.close(timeout=10)
@@ -0,0 +1,119 @@
+from types import SimpleNamespace
+
+import pytest
+
+from broadcast import DEFAULT_ROOM, Broadcaster
+
+
+class FakeSocketIO:
+    """Records emits; `backlog` sets each client's engine.io send queue length"""
+
+    def __init__(self):
+        self.emitted = []
+        self.backlog = {}
+        self.server = self
+        self.manager = self
+        self.eio = SimpleNamespace(sockets=self)
+
+    def get_participants(self, namespace, room):
+        return [(sid, sid) for sid in self.backlog]
+
+    def get(self, eio_sid):
+        return SimpleNamespace(queue=SimpleNamespace(qsize=lambda: self.backlog[eio_sid]))
+
+    def emit(self, event, payload, to=None, namespace=None, skip_sid=None):
+        self.emitted.append((event, payload, to, list(skip_sid or [])))
+
+    def take(self):
+        emitted, self.emitted = self.emitted, []
+        return emitted
+
+
+@pytest.fixture
+def socketio():
+    return FakeSocketIO()
+
+
+def threat(threat_type, source_ip='10.0.0.1', status='BLOCKED'):
+    return {'threat_type': threat_type, 'source_ip': source_ip, 'dest_ip': '10.0.0.2', 'status': status}
+
+
+def test_threats_are_coalesced_into_one_frame_per_room(socketio):
+    stats = {'total_flows': 0, 'uptime': '00:00:00'}
+    broadcaster = Broadcaster(socketio, lambda: dict(stats))
+    broadcaster.flush()
+    socketio.take()
+
+    old_room, locky_room = broadcaster.subscribe('b', {'types': ['Locky']})
+    assert old_room == DEFAULT_ROOM
+    for name in ('Locky', 'WannaCry', 'Locky'):
+        broadcaster.publish(threat(name), confidence=0.9)
+    broadcaster.flush()
+
+    frames = {room: payload for event, payload, room, _ in socketio.take() if event == 'threat_batch'}
+    assert [t['threat_type'] for t in frames[DEFAULT_ROOM]] == ['Locky', 'WannaCry', 'Locky']
+    assert [t['threat_type'] for t in frames[locky_room]] == ['Locky', 'Locky']
+
+    # Nothing new and only the uptime moved: no frame at all
+    stats['uptime'] = '00:00:01'
+    broadcaster.flush()
+    assert socketio.take() == []
+
+
+def test_filters_by_confidence_and_subnet(socketio):
+    broadcaster = Broadcaster(socketio, lambda: {})
+    _, room = broadcaster.subscribe('a', {'min_confidence': 0.5, 'subnet': '192.168.0.0/16'})
+    broadcaster.publish(threat('Locky', '192.168.1.5'), confidence=0.9)
+    broadcaster.publish(threat('Locky', '192.168.1.6'), confidence=0.2)
+    broadcaster.publish(threat('Locky', '10.1.1.1'), confidence=0.9)
+    broadcaster.flush()
+    frames = {to: payload for event, payload, to, _ in socketio.take() if event == 'threat_batch'}
+    assert [t['source_ip'] for t in frames[room]] == ['192.168.1.5']
+
+
+def test_slow_client_gets_full_stats_once_it_catches_up(socketio):
+    stats = {'total_flows': 10, 'threats_detected': 1, 'uptime': '00:00:00'}
+    broadcaster = Broadcaster(socketio, lambda: dict(stats), max_client_queue=4)
+    socketio.backlog = {'fast': 0, 'slow': 0}
+    broadcaster.flush()
+    socketio.take()
+
+    # 'slow' is skipped for a delta that only carries total_flows
+    socketio.backlog['slow'] = 10
+    stats['total_flows'] = 20
+    broadcaster.flush()
+    assert socketio.take() == [('stats_update', {'total_flows': 20}, None, ['slow'])]
+
+    # Still behind: nothing to send yet
+    broadcaster.flush()
+    assert socketio.take() == []
+
+    socketio.backlog['slow'] = 0
+    broadcaster.flush()
+    assert socketio.take() == [('stats_update', stats, 'slow', [])]
+    broadcaster.flush()
+    assert socketio.take() == []
+
+
+def test_disconnected_client_is_not_caught_up(socketio):
+    stats = {'total_flows': 10}
+    broadcaster = Broadcaster(socketio, lambda: dict(stats), max_client_queue=4)
+    socketio.backlog = {'slow': 10}
+    stats['total_flows'] = 20
+    broadcaster.flush()
+    socketio.take()
+
+    broadcaster.unsubscribe('slow')
+    del socketio.backlog['slow']
+    broadcaster.flush()
+    assert socketio.take() == []
+
+
+def test_new_threat_events_follow_the_batch_when_enabled(socketio):
+    broadcaster = Broadcaster(socketio, lambda: {}, new_threat_events=True)
+    broadcaster.publish(threat('Locky'))
+    broadcaster.publish(threat('WannaCry'))
+    broadcaster.flush()
+    events = [(event, payload['threat_type'] if event == 'new_threat' else len(payload))
+              for event, payload, _, _ in socketio.take()]
+    assert events == [('threat_batch', 2), ('new_threat', 'Locky'), ('new_threat', 'WannaCry')]
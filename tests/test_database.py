@@ -0,0 +1,217 @@
+import datetime
+import threading
+import time
+
+import pytest
+
+import database
+from database import encode_cursor, engine, partitions, query_threats, write_threat_rows
+
+
+@pytest.fixture(scope='module')
+def threat_rows():
+    """250 rows over two day partitions, with runs of identical timestamps around midnight"""
+    database.init_db()
+    midnight = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    rows = []
+    for index in range(250):
+        # Five rows per second, from 25 s before midnight to 25 s after
+        timestamp = midnight + datetime.timedelta(seconds=index // 5 - 25)
+        rows.append({'timestamp': timestamp, 'source_ip': '10.99.0.1', 'dest_ip': f'10.0.0.{index % 250}',
+                     'threat_type': 'Locky' if index % 2 else 'WannaCry', 'confidence': 0.9, 'status': 'BLOCKED'})
+    with engine.begin() as conn:
+        write_threat_rows(conn, rows)
+    return rows
+
+
+def page_through(limit, **filters):
+    seen, cursor = [], None
+    while True:
+        page = list(query_threats(ip='10.99.0.1', cursor=cursor, limit=limit, chunk_size=7, **filters))
+        seen += page
+        if len(page) < limit:
+            return seen
+        cursor = page[-1]['cursor']
+
+
+def test_rows_span_two_partitions(threat_rows):
+    days = {row['timestamp'].date() for row in threat_rows}
+    with engine.connect() as conn:
+        assert days <= set(partitions.days(conn))
+    assert len(days) == 2
+
+
+@pytest.mark.parametrize('limit', [1, 10, 33, 100, 1000])
+def test_cursor_pages_have_no_gaps_or_duplicates(threat_rows, limit):
+    seen = page_through(limit)
+    keys = [(row['timestamp'], row['id']) for row in seen]
+    assert len(seen) == len(threat_rows)
+    assert len(set(keys)) == len(keys)
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_filters_apply_across_partitions(threat_rows):
+    seen = page_through(9, threat_type='Locky')
+    assert len(seen) == sum(row['threat_type'] == 'Locky' for row in threat_rows)
+    assert {row['threat_type'] for row in seen} == {'Locky'}
+
+
+def test_cursor_resumes_inside_a_run_of_equal_timestamps(threat_rows):
+    everything = page_through(1000)
+    middle = everything[101]
+    assert everything[100]['timestamp'] == middle['timestamp']
+    resumed = list(query_threats(ip='10.99.0.1', cursor=everything[100]['cursor']))
+    assert resumed == everything[101:]
+    assert resumed[0]['cursor'] == encode_cursor(datetime.datetime.fromisoformat(middle['timestamp']), middle['id'])
+
+
+def test_counts_upsert_without_on_conflict_support(monkeypatch):
+    database.init_db()
+    table = database.ThreatStat.__table__
+    monkeypatch.setattr(database, '_UPSERT_INSERTS', {})
+    rows = [{'name': 'test:fallback', 'count': 2}, {'name': 'test:fallback-other', 'count': 1}]
+    with engine.begin() as conn:
+        database._upsert_counts(conn, table, rows)
+        database._upsert_counts(conn, table, rows[:1])
+    with engine.connect() as conn:
+        counts = dict(conn.execute(database.select(table.c.name, table.c.count)
+                                   .where(table.c.name.like('test:fallback%'))).all())
+    assert counts == {'test:fallback': 4, 'test:fallback-other': 1}
+
+
+def test_writer_recreates_a_partition_after_a_failed_batch(monkeypatch):
+    database.init_db()
+    day = datetime.date(2001, 1, 2)
+    row = {'timestamp': datetime.datetime.combine(day, datetime.time(12)), 'source_ip': '10.98.0.1',
+           'dest_ip': '10.0.0.1', 'threat_type': 'Locky', 'confidence': 0.9, 'status': 'BLOCKED'}
+    upsert = database._upsert_counts
+
+    def failing_upsert(conn, table, rows):
+        raise RuntimeError('database went away')
+
+    writer = database.ThreatLogWriter(engine, flush_interval=0.01)
+    try:
+        monkeypatch.setattr(database, '_upsert_counts', failing_upsert)
+        writer.log(row)
+        assert writer.flush(timeout=5)
+        assert writer.written == 0
+        assert partitions.name(day) not in partitions._created
+
+        monkeypatch.setattr(database, '_upsert_counts', upsert)
+        writer.log(row)
+        assert writer.flush(timeout=5)
+        assert writer.written == 1
+    finally:
+        writer.close(timeout=5)
+    assert len(list(query_threats(ip='10.98.0.1'))) == 1
+
+
+
+def writer_row(ip, second=0):
+    return {'timestamp': datetime.datetime(2002, 3, 4, 12, 0, second), 'source_ip': ip, 'dest_ip': '10.0.0.1',
+            'threat_type': 'WannaCry', 'confidence': 0.8, 'status': 'BLOCKED'}
+
+
+def stat_counts():
+    table = database.ThreatStat.__table__
+    with engine.connect() as conn:
+        return dict(conn.execute(database.select(table.c.name, table.c.count)).all())
+
+
+@pytest.fixture
+def held_writes(monkeypatch):
+    """Holds the writer thread inside its first batch until released; records every batch size"""
+    release, sizes = threading.Event(), []
+    write = database.write_threat_rows
+
+    def held_write(conn, rows):
+        sizes.append(len(rows))
+        release.wait(10)
+        write(conn, rows)
+
+    monkeypatch.setattr(database, 'write_threat_rows', held_write)
+    return release, sizes
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_writer_splits_a_backlog_into_batch_size_inserts(held_writes):
+    release, sizes = held_writes
+    database.init_db()
+    writer = database.ThreatLogWriter(engine, batch_size=10, flush_interval=0.05)
+    try:
+        writer.log(writer_row('10.97.0.1'))
+        wait_for(lambda: sizes)
+        for second in range(1, 26):
+            writer.log(writer_row('10.97.0.1', second))
+        release.set()
+        assert writer.flush(timeout=10)
+    finally:
+        writer.close(timeout=10)
+    assert sizes == [1, 10, 10, 5]
+    assert writer.written == 26
+    assert len(list(query_threats(ip='10.97.0.1'))) == 26
+
+
+def test_full_queue_drops_threats_after_put_timeout(held_writes):
+    release, sizes = held_writes
+    database.init_db()
+    writer = database.ThreatLogWriter(engine, max_pending=1, put_timeout=0.01)
+    try:
+        assert writer.log(writer_row('10.96.0.1'))
+        wait_for(lambda: sizes)
+        assert writer.log(writer_row('10.96.0.1', 1))
+        assert not writer.log(writer_row('10.96.0.1', 2))
+        assert not writer.record_flows(10)
+        assert writer.dropped == 2
+    finally:
+        release.set()
+        writer.close(timeout=10)
+    assert writer.written == 2
+
+
+def test_close_writes_everything_queued_with_its_counters():
+    database.init_db()
+    before = stat_counts()
+    writer = database.ThreatLogWriter(engine, flush_interval=10)
+    for second in range(5):
+        writer.log(writer_row('10.95.0.1', second))
+    writer.record_flows(40, benign=35)
+    writer.close(timeout=10)
+
+    after = stat_counts()
+    assert len(list(query_threats(ip='10.95.0.1'))) == 5
+    for name, delta in [('total_flows', 40), ('benign_flows', 35), ('type:WannaCry', 5), ('status:BLOCKED', 5)]:
+        assert after[name] - before.get(name, 0) == delta
+    with pytest.raises(RuntimeError):
+        writer.log(writer_row('10.95.0.1'))
+
+
+def rollup_buckets(model, before):
+    with engine.connect() as conn:
+        return sorted(conn.execute(database.select(model.bucket).where(model.bucket < before)).scalars())
+
+
+def test_retention_drops_old_partitions_and_minute_rollups():
+    database.init_db()
+    old, kept = datetime.datetime(1990, 1, 1, 12, 30), datetime.datetime(1990, 1, 5, 12, 30)
+    with engine.begin() as conn:
+        write_threat_rows(conn, [{'timestamp': timestamp, 'source_ip': '10.94.0.1', 'dest_ip': '10.0.0.1',
+                                  'threat_type': 'Locky', 'confidence': 0.9, 'status': 'BLOCKED'}
+                                 for timestamp in (old, kept)])
+    end = datetime.datetime(1991, 1, 1)
+
+    assert database.apply_retention(0, today=datetime.date(1990, 1, 6)) == []
+    assert database.apply_retention(3, today=datetime.date(1990, 1, 6)) == [old.date()]
+    with engine.connect() as conn:
+        days = partitions.days(conn)
+    assert old.date() not in days and kept.date() in days
+    assert rollup_buckets(database.ThreatRollupMinute, end) == [kept]
+    # Hour rollups outlive the raw rows
+    assert rollup_buckets(database.ThreatRollupHour, end) == [old.replace(minute=0), kept.replace(minute=0)]
+    assert [row['timestamp'] for row in query_threats(ip='10.94.0.1')] == [kept.isoformat()]
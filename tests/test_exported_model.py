@@ -0,0 +1,36 @@
+import pytest
+import torch
+
+from exported_model import export_buckets, load_exported_model, write_manifest
+from utils import flows_to_features, isolated_node_model, self_loop_graph
+
+BUCKETS = (1, 4, 16)
+# Each bucket exactly, one row below it (zero-padded) and past the largest (split into chunks)
+SIZES = sorted({size for bucket in BUCKETS for size in (bucket, bucket - 1)} | {BUCKETS[-1] + 3, 2 * BUCKETS[-1] + 1})
+
+
+def export(fused, export_dir, runtime):
+    errors = export_buckets(fused, str(export_dir), BUCKETS, (runtime,))
+    assert not errors, errors
+    manifest = {'input_dim': fused.input_dim, 'num_classes': fused.num_classes,
+                'buckets': list(BUCKETS), 'runtimes': [runtime]}
+    write_manifest(str(export_dir), manifest)
+    return load_exported_model(str(export_dir), runtime)
+
+
+@pytest.mark.parametrize('runtime', ['torchscript', 'onnx'])
+def test_exported_logits_match_eager_at_every_size(model, flows, tmp_path, runtime):
+    if runtime == 'onnx':
+        pytest.importorskip('onnx')
+        pytest.importorskip('onnxruntime')
+    fused = isolated_node_model(model)
+    exported = export(fused, tmp_path, runtime)
+
+    for size in SIZES:
+        features, _ = flows_to_features(flows[:size])
+        edge_index, batch = self_loop_graph(size)
+        with torch.no_grad():
+            expected = fused(features, edge_index, batch)
+            actual = exported(features, edge_index, batch)
+        assert actual.shape == (size, fused.num_classes)
+        torch.testing.assert_close(actual, expected, atol=1e-4, rtol=1e-4, msg=f"batch of {size}")
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from feature_store import FeatureStore, builder_config, ingested_graph_config
+from training_gcn_model import NetworkGraphBuilder
+
+
+def flows_csv(path, rows=40, seed=0):
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({'duration': rng.uniform(0, 100, rows), 'packets': rng.integers(1, 200, rows),
+                  'Label': rng.choice(['Benign', 'Locky'], rows)}).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FeatureStore(str(tmp_path / 'store'))
+
+
+def test_key_follows_dataset_bytes_and_parameters(tmp_path, store):
+    dataset = flows_csv(tmp_path / 'flows.csv')
+    config = ingested_graph_config(label_col='Label')
+    assert store.key(dataset, config) == store.key(dataset, ingested_graph_config(label_col='Label'))
+    assert store.key(dataset, config) != store.key(dataset, ingested_graph_config(label_col='Label', knn_k=7))
+    assert store.key(dataset, config) != store.key(flows_csv(tmp_path / 'other.csv', seed=1), config)
+
+
+def test_key_follows_the_builder_source(tmp_path, store):
+    def build(df):
+        return df.dropna()
+
+    first = builder_config(build, knn_k=5)
+
+    def build(df):
+        return df.fillna(0)
+
+    second = builder_config(build, knn_k=5)
+    assert first['builder'] == second['builder']
+    dataset = flows_csv(tmp_path / 'flows.csv')
+    assert store.key(dataset, first) != store.key(dataset, second)
+
+
+def test_stored_graph_reopens_memory_mapped(tmp_path, store):
+    dataset = flows_csv(tmp_path / 'flows.csv')
+    config = builder_config(NetworkGraphBuilder.create_graph_from_flows, knn_k=3)
+    builds = []
+
+    def build():
+        builds.append(1)
+        builder = NetworkGraphBuilder()
+        data, _ = builder.create_graph_from_flows(pd.read_csv(dataset), knn_k=config['knn_k'])
+        return data, builder
+
+    stored = store.get_or_build(dataset, config, build)
+    reopened = store.get_or_build(dataset, config, build)
+    assert len(builds) == 1
+    assert isinstance(reopened.x, np.memmap)
+    assert reopened.class_names == ['Benign', 'Locky']
+    torch.testing.assert_close(reopened.to_data().edge_index, stored.to_data().edge_index)
+    np.testing.assert_array_equal(reopened.graph_builder().scaler.mean_, stored.graph_builder().scaler.mean_)
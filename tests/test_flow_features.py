@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from bench_feature_encoder import legacy_features, random_columns
+from flow_features import FLOW_FIELDS, FlowFeatureEncoder
+
+
+@pytest.fixture(scope='module')
+def columns():
+    columns = random_columns(500, np.random.default_rng(0))
+    # Zero packets and zero bytes take the guarded ratio branches
+    columns['packets'][:20] = 0
+    columns['src_bytes'][10:30] = 0
+    columns['dst_bytes'][10:30] = 0
+    return columns
+
+
+def as_flows(columns):
+    return [{name: columns[name][index].item() for name in FLOW_FIELDS} for index in range(len(columns['packets']))]
+
+
+def expected(flows):
+    return torch.cat([legacy_features(flow) for flow in flows])
+
+
+@pytest.mark.parametrize('layout', ['dicts', 'columns', 'dataframe', 'structured'])
+def test_encoder_matches_per_flow_features(columns, layout):
+    flows = as_flows(columns)
+    if layout == 'dicts':
+        batch = flows
+    elif layout == 'columns':
+        batch = columns
+    elif layout == 'dataframe':
+        batch = pd.DataFrame(columns)
+    else:
+        batch = pd.DataFrame(columns).to_records(index=False)
+
+    actual, _ = FlowFeatureEncoder().encode_tensor(batch)
+    torch.testing.assert_close(actual, expected(flows), atol=1e-6, rtol=1e-6)
+
+
+def test_missing_fields_encode_as_zero():
+    flows = [{'src_bytes': 1000.0, 'dst_bytes': 3000.0}, {}]
+    actual, _ = FlowFeatureEncoder().encode_tensor(flows)
+    torch.testing.assert_close(actual, expected(flows), atol=1e-6, rtol=1e-6)
+
+
+def test_reused_output_buffer_is_fully_overwritten(columns):
+    encoder = FlowFeatureEncoder()
+    out = np.full((len(columns['packets']), encoder.num_features), 7.0, dtype=np.float32)
+    actual, _ = encoder.encode_tensor(columns, out=out)
+    torch.testing.assert_close(actual, expected(as_flows(columns)), atol=1e-6, rtol=1e-6)
@@ -0,0 +1,77 @@
+import numpy as np
+import torch
+
+from flow_index import FlowNeighborIndex
+
+
+def brute_force(window, queries, k):
+    distances = ((queries[:, None, :] - window[None, :, :]) ** 2).sum(axis=2)
+    return np.argsort(distances, axis=1, kind='stable')[:, :k], np.sort(distances, axis=1)[:, :k]
+
+
+def test_search_matches_brute_force():
+    rng = np.random.default_rng(0)
+    window, queries = rng.normal(size=(200, 50)), rng.normal(size=(20, 50))
+    index = FlowNeighborIndex(capacity=256, k=5)
+    slots = index.add(window, now=0.0)
+
+    found, distances = index.search(queries)
+    expected, expected_distances = brute_force(window, queries, 5)
+    np.testing.assert_array_equal(found, slots[expected])
+    np.testing.assert_allclose(distances, expected_distances, rtol=1e-4, atol=1e-3)
+
+
+def test_short_window_pads_missing_neighbours():
+    index = FlowNeighborIndex(dim=4, k=5)
+    index.add(np.eye(4)[:2], now=0.0)
+    slots, distances = index.search(np.zeros((1, 4)))
+    assert list(slots[0, 2:]) == [-1, -1, -1]
+    assert np.isinf(distances[0, 2:]).all()
+    assert set(slots[0, :2]) == {0, 1}
+
+
+def test_wrapping_keeps_only_the_newest_entries():
+    index = FlowNeighborIndex(dim=1, capacity=8, k=8)
+    index.add(np.arange(12, dtype=np.float32)[:, None], now=0.0)
+    assert len(index) == 8
+    np.testing.assert_array_equal(index.features[index.live_slots()].ravel(), np.arange(4, 12))
+    slots, _ = index.search(np.zeros((1, 1)))
+    assert sorted(index.features[slots[0]].ravel()) == list(range(4, 12))
+
+
+def test_entries_expire_after_max_age():
+    index = FlowNeighborIndex(dim=2, max_age=10.0, k=3)
+    index.add(np.zeros((3, 2)), now=0.0)
+    index.add(np.ones((2, 2)), now=8.0)
+    evicted = index.evict_older_than(5.0)
+    assert len(evicted) == 3 and len(index) == 2
+    np.testing.assert_array_equal(index.features[index.live_slots()], np.ones((2, 2)))
+
+
+def test_neighbor_subgraph_joins_each_query_to_its_neighbours():
+    index = FlowNeighborIndex(dim=2, k=2)
+    index.add(np.array([[0.0, 0.0], [10.0, 10.0], [0.1, 0.0]]), now=0.0)
+    queries = torch.tensor([[0.0, 0.1], [10.0, 9.9]])
+    x, edge_index, batch = index.neighbor_subgraph(queries)
+
+    assert x.size(0) == 2 + 4
+    torch.testing.assert_close(x[:2], queries)
+    edges = set(map(tuple, edge_index.t().tolist()))
+    for query in range(2):
+        neighbours = {source for source, target in edges if target == query and source != query}
+        assert len(neighbours) == 2
+        assert all((query, neighbour) in edges for neighbour in neighbours)
+    assert all((node, node) in edges for node in range(x.size(0)))
+    torch.testing.assert_close(batch, torch.arange(x.size(0)))
+
+
+def test_scored_flows_join_the_window(model):
+    index = FlowNeighborIndex(capacity=16, max_age=5.0, k=3)
+    index.add(np.zeros((4, 50)), now=0.0)
+    features = torch.rand(3, 50)
+    with torch.no_grad():
+        output = index.score(model, features, now=10.0)
+    assert output.shape == (3, 5)
+    # The four old entries expired; only the scored flows remain
+    assert len(index) == 3
+    torch.testing.assert_close(torch.from_numpy(index.features[index.live_slots()]), features)
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from flow_ingest import RunningStats, ingest_csv
+
+
+def flow_frame(rows=300, seed=0):
+    """Float features with NaN and +/-inf sprinkled in, an int column and an imbalanced label"""
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        'Flow Duration': rng.exponential(100, rows).round(3),
+        'Fwd Pkts/s': rng.normal(0, 50, rows).round(3),
+        'Pkt Len Mean': rng.uniform(-10, 1500, rows).round(3),
+        'Protocol': rng.choice([6, 17], rows),
+        'Label': np.where(np.arange(rows) < 8, 'Locky', 'Benign'),
+    })
+    for column, kind in (('Flow Duration', np.nan), ('Fwd Pkts/s', np.inf), ('Pkt Len Mean', -np.inf)):
+        frame.loc[rng.choice(rows, 12, replace=False), column] = kind
+    frame.loc[rng.choice(rows, 5, replace=False), 'Fwd Pkts/s'] = np.nan
+    return frame
+
+
+def column_by_column_fill(frame, label_col):
+    """The per-column median / inf fill RunningStats replaced"""
+    frame = frame.copy()
+    for col in frame.columns:
+        if col != label_col and frame[col].dtype in ['int64', 'float64', 'float32']:
+            frame[col] = frame[col].fillna(frame[col].median())
+    for col in frame.select_dtypes(include=[np.number]).columns:
+        if col == label_col:
+            continue
+        pos_inf, neg_inf = np.isposinf(frame[col]), np.isneginf(frame[col])
+        if pos_inf.any():
+            frame.loc[pos_inf, col] = frame.loc[~pos_inf, col].max()
+        if neg_inf.any():
+            frame.loc[neg_inf, col] = frame.loc[~neg_inf, col].min()
+    return frame
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 300])
+def test_running_stats_merged_over_chunks_match_one_pass(chunk_size):
+    values = flow_frame()[['Flow Duration', 'Fwd Pkts/s', 'Pkt Len Mean']].to_numpy()
+    stats = RunningStats(values.shape[1], reservoir_size=len(values))
+    for start in range(0, len(values), chunk_size):
+        stats.update(values[start:start + chunk_size])
+
+    finite = np.where(np.isfinite(values), values, np.nan)
+    np.testing.assert_array_equal(stats.nan_count, np.isnan(values).sum(axis=0))
+    np.testing.assert_array_equal(stats.posinf_count, np.isposinf(values).sum(axis=0))
+    np.testing.assert_array_equal(stats.neginf_count, np.isneginf(values).sum(axis=0))
+    np.testing.assert_allclose(stats.mean, np.nanmean(finite, axis=0))
+    np.testing.assert_allclose(stats.var, np.nanvar(finite, axis=0))
+    np.testing.assert_array_equal(stats.min, np.nanmin(finite, axis=0))
+    np.testing.assert_array_equal(stats.max, np.nanmax(finite, axis=0))
+    # Medians count the infinities, as pandas does
+    np.testing.assert_array_equal(stats.median, pd.DataFrame(values).median().to_numpy())
+
+
+def test_streamed_ingest_fills_like_the_batch_path(tmp_path):
+    frame = flow_frame()
+    path = tmp_path / 'flows.csv'
+    frame.to_csv(path, index=False)
+
+    dataset = ingest_csv(str(path), str(tmp_path / 'cache'), chunksize=16)
+    streamed = pd.DataFrame(dataset.clean_chunk(dataset.features), columns=dataset.feature_names)
+
+    batch = column_by_column_fill(pd.read_csv(path), 'Label').drop(columns='Label').astype(np.float32)
+    pd.testing.assert_frame_equal(streamed, batch)
+    assert dataset.class_names == ['Benign', 'Locky']
+    assert list(dataset.labels) == [dataset.class_names.index(label) for label in frame['Label']]
+
+
+def test_preprocess_data_matches_the_column_by_column_fill(tmp_path, monkeypatch):
+    # Importing the training script opens training.log in the working directory
+    monkeypatch.chdir(tmp_path)
+    from training_main_script import ThreatDetectionPipeline
+
+    frame = flow_frame()
+    # Duplicates and a 36:1 class imbalance take the drop and rebalance paths as well
+    frame = pd.concat([frame, frame.iloc[:20]], ignore_index=True)
+    pipeline = ThreatDetectionPipeline()
+    fused = pipeline.preprocess_data(frame.copy(), 'Label')
+    reference = pipeline.preprocess_data(column_by_column_fill(frame, 'Label'), 'Label')
+    pd.testing.assert_frame_equal(fused, reference)
+
+
+def test_ingest_drops_unlabeled_rows_and_coerces_stray_strings(tmp_path):
+    frame = flow_frame(rows=1200)
+    frame['Label'] = frame['Label'].astype(object)
+    frame.loc[[3, 1100], 'Label'] = np.nan
+    # Past the 1000-row sample, where the column's dtype was decided
+    frame['Flow Duration'] = frame['Flow Duration'].astype(object)
+    frame.loc[1150, 'Flow Duration'] = 'bad'
+    path = tmp_path / 'flows.csv'
+    frame.to_csv(path, index=False)
+
+    dataset = ingest_csv(str(path), str(tmp_path / 'cache'), chunksize=256)
+    assert dataset.num_rows == 1198
+    assert dataset.meta['unlabeled_rows'] == 2
+    assert dataset.meta['coerced_values'] == 1
+    assert sum(dataset.class_counts.values()) == 1198
+    # The coerced value is missing, so it is filled like the other NaN
+    missing = frame.loc[frame['Label'].notna(), 'Flow Duration'].isna().sum() + 1
+    assert dataset.stats.nan_count[dataset.feature_names.index('Flow Duration')] == missing
+
+
+def test_train_and_deploy_builds_its_graph_from_the_ingest_cache(tmp_path, monkeypatch):
+    # The ingest cache and feature store live under cache/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    from train_and_deploy import load_features
+
+    frame = flow_frame()
+    frame.to_csv('flows.csv', index=False)
+    features = load_features('flows.csv')
+    assert features.class_names == ['Benign', 'Locky']
+    assert features.x.shape == (len(frame), 4)
+    assert np.isfinite(features.x).all()
+    assert len(list((tmp_path / 'cache' / 'ingest').glob('*/meta.json'))) == 1
+    # Unscaling gives back the filled rows the served model is fed
+    scaler = features.graph_builder().scaler
+    filled = column_by_column_fill(frame, 'Label').drop(columns='Label').to_numpy(np.float32)
+    np.testing.assert_allclose(features.x * scaler.scale_ + scaler.mean_, filled, rtol=1e-4, atol=1e-3)
+    assert load_features('flows.csv').path == features.path
@@ -0,0 +1,66 @@
+import json
+import socket
+import time
+
+import pandas as pd
+import pytest
+
+from flow_sources import FlowSource, ReplayFlowSource, UDPFlowSource
+
+
+def replay(source):
+    """Every flow the source releases, with its arrival time relative to the first read"""
+    start, arrivals = time.monotonic(), []
+    while True:
+        batch = source.read(max_flows=256, timeout=0.05)
+        if batch is None:
+            return arrivals
+        arrivals += [(flow, time.monotonic() - start) for flow in batch]
+
+
+def test_flow_source_needs_a_read_method():
+    class Incomplete(FlowSource):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_replay_keeps_file_order_and_scaled_gaps(tmp_path):
+    path = tmp_path / 'capture.csv'
+    # Half a second apart in the capture, a tenth of a second apart at speed=5
+    timestamps = pd.date_range('2024-01-01', periods=6, freq='500ms')
+    pd.DataFrame({'Timestamp': timestamps, 'Src IP': [f'10.0.0.{index}' for index in range(6)],
+                  'Flow Duration': range(6)}).to_csv(path, index=False)
+
+    arrivals = replay(ReplayFlowSource(str(path), speed=5, timestamp_col='Timestamp'))
+    assert [flow['src_ip'] for flow, _ in arrivals] == [f'10.0.0.{index}' for index in range(6)]
+    for index, (_, arrived) in enumerate(arrivals):
+        assert arrived >= index * 0.1 - 0.02
+    assert arrivals[-1][1] < 1.5
+
+
+def test_replay_without_timestamps_releases_at_rate(tmp_path):
+    path = tmp_path / 'capture.csv'
+    pd.DataFrame({'duration': range(5), 'protocol': 6}).to_csv(path, index=False)
+
+    arrivals = replay(ReplayFlowSource(str(path), rate=20))
+    assert [flow['duration'] for flow, _ in arrivals] == list(range(5))
+    assert arrivals[-1][1] >= 4 / 20 - 0.02
+
+
+def test_udp_list_datagrams_are_split_across_reads():
+    with UDPFlowSource(port=0) as source, socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sender:
+        sender.sendto(json.dumps([{'Src IP': f'10.0.0.{index}'} for index in range(5)]).encode(), source.address)
+        sender.sendto(b'{not json', source.address)
+        sender.sendto(json.dumps({'src_ip': '10.0.0.5'}).encode(), source.address)
+        time.sleep(0.05)
+
+        seen = []
+        for _ in range(3):
+            batch = source.read(max_flows=3, timeout=0.5)
+            assert len(batch) <= 3
+            seen += batch
+        assert [flow['src_ip'] for flow in seen] == [f'10.0.0.{index}' for index in range(6)]
+        assert source.malformed == 1
+        assert source.read(max_flows=3, timeout=0.05) == []
@@ -0,0 +1,63 @@
+import pytest
+import torch
+
+from conftest import make_model
+from models.isolated_node import IsolatedNodeGCN
+from utils import flows_to_features, self_loop_graph
+
+
+def with_batch_norm_statistics(model, seed=0):
+    """Non-trivial running statistics, so folding batch norm into the linear layers is exercised"""
+    generator = torch.Generator().manual_seed(seed)
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm1d):
+            module.running_mean.copy_(torch.randn(module.num_features, generator=generator))
+            module.running_var.copy_(torch.rand(module.num_features, generator=generator) + 0.5)
+            module.weight.data.copy_(torch.rand(module.num_features, generator=generator) + 0.5)
+            module.bias.data.copy_(torch.randn(module.num_features, generator=generator))
+    return model.eval()
+
+
+def test_fused_logits_match_the_served_network_on_self_loops(flows):
+    model = with_batch_norm_statistics(make_model(hidden_dim=64))
+    features, _ = flows_to_features(flows)
+    edge_index, batch = self_loop_graph(len(flows))
+    with torch.no_grad():
+        expected = model(features, edge_index, batch)
+        actual = IsolatedNodeGCN.from_model(model)(features, edge_index, batch)
+    torch.testing.assert_close(actual, expected, atol=1e-5, rtol=1e-4)
+
+
+def test_fused_logits_match_the_training_network_on_self_loops(flows):
+    from training_gcn_model import NetworkFlowGCN
+
+    torch.manual_seed(0)
+    model = with_batch_norm_statistics(NetworkFlowGCN(input_dim=50, hidden_dim=64, num_classes=5))
+    features, _ = flows_to_features(flows)
+    edge_index, batch = self_loop_graph(len(flows))
+    with torch.no_grad():
+        # With a batch the training network returns log_softmax of the logits
+        expected = model(features, edge_index, batch)
+        actual = torch.log_softmax(IsolatedNodeGCN.from_model(model)(features, edge_index, batch), dim=1)
+    torch.testing.assert_close(actual, expected, atol=1e-5, rtol=1e-4)
+
+
+@pytest.mark.parametrize('num_graphs', [1, 4])
+def test_pooling_matches_the_served_network(flows, num_graphs):
+    model = with_batch_norm_statistics(make_model(hidden_dim=64))
+    features, _ = flows_to_features(flows)
+    edge_index, _ = self_loop_graph(len(flows))
+    batch = torch.arange(len(flows)) % num_graphs
+    with torch.no_grad():
+        expected = model(features, edge_index, batch)
+        actual = IsolatedNodeGCN.from_model(model)(features, edge_index, batch)
+    torch.testing.assert_close(actual, expected, atol=1e-5, rtol=1e-4)
+
+
+def test_fused_state_dict_round_trip(model, flows):
+    fused = IsolatedNodeGCN.from_model(model)
+    features, _ = flows_to_features(flows)
+    edge_index, batch = self_loop_graph(len(flows))
+    with torch.no_grad():
+        torch.testing.assert_close(IsolatedNodeGCN.from_fused_state_dict(fused.state_dict())(features, edge_index, batch),
+                                   fused(features, edge_index, batch))
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from training_gcn_model import knn_edge_index
+
+
+def brute_force_pairs(features, k):
+    """Undirected pairs joining each row to its k nearest other rows"""
+    distances = ((features[:, None, :] - features[None, :, :]) ** 2).sum(axis=2)
+    np.fill_diagonal(distances, np.inf)
+    pairs = set()
+    for row, neighbors in enumerate(np.argsort(distances, axis=1)[:, :k]):
+        pairs.update((min(row, col), max(row, col)) for col in neighbors.tolist())
+    return pairs
+
+
+@pytest.fixture(scope='module')
+def features():
+    return np.random.default_rng(0).normal(size=(300, 8)).astype(np.float32)
+
+
+@pytest.mark.parametrize('algorithm', ['auto', 'brute'])
+def test_edges_are_the_symmetric_k_nearest_neighbours(features, algorithm):
+    edge_index = knn_edge_index(features, k=5, algorithm=algorithm)
+    edges = set(map(tuple, edge_index.T.tolist()))
+    pairs = brute_force_pairs(features, 5)
+    assert edges == pairs | {(high, low) for low, high in pairs}
+    # Both directions stored once, no self-loops
+    assert edge_index.shape[1] == len(edges) == 2 * len(pairs)
+    assert not (edge_index[0] == edge_index[1]).any()
+
+
+def test_chunked_queries_give_the_same_edges(features):
+    np.testing.assert_array_equal(knn_edge_index(features, k=5, chunk_size=37), knn_edge_index(features, k=5))
+
+
+def test_small_inputs():
+    assert knn_edge_index(np.zeros((1, 4)), k=5).shape == (2, 0)
+    # k is capped at n - 1: three rows all join each other
+    edges = set(map(tuple, knn_edge_index(np.eye(3), k=5).T.tolist()))
+    assert edges == {(a, b) for a in range(3) for b in range(3) if a != b}
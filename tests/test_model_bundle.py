@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+import torch
+
+from conftest import save_trained_bundle
+from model_bundle import BundleError, load_bundle, save_bundle
+from utils import THREAT_TYPES, flows_to_features, isolated_node_model, load_model, self_loop_graph
+
+
+@pytest.fixture(scope='module')
+def trained_bundle(tmp_path_factory):
+    return save_trained_bundle(tmp_path_factory.mktemp('bundles'), version='trained')
+
+
+def test_trained_bundle_loads_for_serving(trained_bundle):
+    model = load_model(trained_bundle)
+    assert type(model).__module__ == 'training_gcn_model'
+    assert not model.training
+
+
+def test_trained_bundle_folds_its_scaler_into_the_input_projection(trained_bundle, flows):
+    model = load_model(trained_bundle)
+    bundle = load_bundle(trained_bundle)
+    features, _ = flows_to_features(flows)
+    edge_index, batch = self_loop_graph(len(flows))
+
+    # Training scales each column to unit variance and zeroes constant columns
+    scaler = bundle.scaler
+    multiplier = np.where(scaler['var'] > 0, 1.0 / scaler['scale'], 0.0)
+    scaled = torch.from_numpy((features.numpy() - scaler['mean']) * multiplier).float()
+    with torch.no_grad():
+        expected = bundle.model(scaled, edge_index, batch)
+        actual = model(features, edge_index, batch)
+    torch.testing.assert_close(actual, expected, atol=1e-4, rtol=1e-4)
+
+
+def test_trained_bundle_fuses_to_the_same_probabilities(trained_bundle, flows):
+    model = load_model(trained_bundle)
+    features, _ = flows_to_features(flows)
+    edge_index, batch = self_loop_graph(len(flows))
+    with torch.no_grad():
+        # The training network returns log_softmax when given a batch; the fused MLP returns logits
+        expected = model(features, edge_index, batch)
+        actual = torch.log_softmax(isolated_node_model(model)(features, edge_index, batch), dim=1)
+    torch.testing.assert_close(actual, expected, atol=1e-4, rtol=1e-4)
+
+
+def test_bundle_with_other_input_width_is_rejected(tmp_path):
+    from training_gcn_model import NetworkFlowGCN
+
+    path = save_bundle(NetworkFlowGCN(input_dim=12, hidden_dim=32, num_classes=5), str(tmp_path), THREAT_TYPES)
+    with pytest.raises(BundleError, match='12 features'):
+        load_model(path)
@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+import serving
+from conftest import make_model, save_trained_bundle
+from model_bundle import save_bundle
+from model_registry import ModelRegistry
+from utils import THREAT_TYPES, detect_threats
+
+
+@pytest.fixture
+def bundle_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(serving, 'BUNDLE_DIR', str(tmp_path))
+    monkeypatch.setattr(serving, 'ROLLED_BACK_PATH', str(tmp_path / '.rolled_back.json'))
+    monkeypatch.setattr(serving, 'MODEL_PATH', str(tmp_path / 'missing.pth'))
+    monkeypatch.setattr(serving, 'MODEL_RUNTIME', 'eager')
+    monkeypatch.setattr(serving, 'MODEL_VARIANT', 'fp32')
+    return tmp_path
+
+
+def deploy(bundle_dir, version, seed):
+    return save_bundle(make_model(seed=seed), str(bundle_dir), THREAT_TYPES, version=version)
+
+
+def make_registry(changes=None):
+    on_change = (lambda version: changes.append(version.version)) if changes is not None else None
+    return ModelRegistry(serving.model_sources, serving.load_serving_model, warm_up_flows=4,
+                         on_change=on_change, reject=serving.mark_rolled_back)
+
+
+def test_new_version_is_swapped_in_without_touching_readers(bundle_dir, flows):
+    deploy(bundle_dir, 'v1', seed=1)
+    changes = []
+    registry = make_registry(changes)
+    in_flight = registry.get()
+    assert registry.current.version == 'v1'
+
+    deploy(bundle_dir, 'v2', seed=2)
+    assert registry.refresh()
+    assert registry.current.version == 'v2'
+    # A batch that fetched the model before the swap keeps its own, still usable, reference
+    assert registry.get() is not in_flight
+    assert all(result is not None for result in detect_threats(in_flight, flows))
+    assert not registry.refresh()
+    assert changes == ['v1', 'v2']
+
+
+def test_broken_version_is_skipped_and_current_keeps_serving(bundle_dir):
+    deploy(bundle_dir, 'v1', seed=1)
+    registry = make_registry()
+    serving_model = registry.get()
+
+    broken = deploy(bundle_dir, 'v2', seed=2)
+    with open(os.path.join(broken, 'weights.pt'), 'wb') as f:
+        f.write(b'not a checkpoint')
+    assert not registry.refresh()
+    assert registry.get() is serving_model
+    assert registry.versions()['skipped'] == ['v2']
+
+
+def test_broken_newest_version_falls_back_at_startup(bundle_dir):
+    deploy(bundle_dir, 'v1', seed=1)
+    broken = deploy(bundle_dir, 'v2', seed=2)
+    os.remove(os.path.join(broken, 'weights.pt'))
+    registry = make_registry()
+    assert registry.get() is not None
+    assert registry.current.version == 'v1'
+
+
+def test_rollback_survives_a_restart(bundle_dir):
+    deploy(bundle_dir, 'v1', seed=1)
+    registry = make_registry()
+    registry.get()
+    deploy(bundle_dir, 'v2', seed=2)
+    registry.refresh()
+
+    changes = []
+    registry.on_change = lambda version: changes.append(version.version)
+    assert registry.rollback().version == 'v1'
+    assert changes == ['v1']
+    assert not registry.refresh()
+    assert registry.current.version == 'v1'
+    with pytest.raises(ValueError):
+        registry.rollback()
+
+    restarted = make_registry()
+    restarted.get()
+    assert restarted.current.version == 'v1'
+    assert [version for _, version in serving.model_sources()] == ['v1']
+
+    # A newer deployment is picked up as usual
+    deploy(bundle_dir, 'v3', seed=3)
+    assert restarted.refresh()
+    assert restarted.current.version == 'v3'
+
+
+def test_trained_bundle_is_swapped_in_and_rolled_back(bundle_dir, flows):
+    deploy(bundle_dir, 'v1', seed=1)
+    registry = make_registry()
+    registry.get()
+
+    # A bundle as train_and_deploy.py writes it: training_gcn_model network plus its scaler
+    save_trained_bundle(bundle_dir, version='v2')
+    assert registry.refresh()
+    assert registry.current.version == 'v2'
+    assert type(registry.get()).__module__ == 'training_gcn_model'
+    results = detect_threats(registry.get(), flows)
+    assert all(result is not None and result['threat_type'] in THREAT_TYPES for result in results)
+
+    assert registry.rollback().version == 'v1'
+    assert [version for _, version in serving.model_sources()] == ['v1']
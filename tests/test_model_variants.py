@@ -0,0 +1,44 @@
+import random
+
+import pytest
+import torch
+import torch.nn.functional as F
+
+from conftest import make_model
+from flow_sources import simulate_flow
+from model_variants import DEFAULT_PRUNE_AMOUNT, VARIANTS, build_variant, calibration_features
+from utils import THREAT_TYPES, flows_to_features, isolated_node_model, self_loop_graph
+
+
+def labelled_flows(count):
+    pairs = [simulate_flow() for _ in range(count)]
+    features, _ = flows_to_features([flow for flow, _ in pairs])
+    return features, torch.tensor([THREAT_TYPES.index(threat) for _, threat in pairs])
+
+
+@pytest.fixture(scope='module')
+def fused():
+    """Fused MLP of a network trained briefly on simulated flows; random weights give near-constant predictions"""
+    random.seed(0)
+    torch.manual_seed(0)
+    features, labels = labelled_flows(2000)
+    edge_index, batch = self_loop_graph(features.size(0))
+    model = make_model(hidden_dim=64).train()
+    optimizer = torch.optim.Adam(model.parameters(), lr=0.01)
+    for _ in range(150):
+        optimizer.zero_grad()
+        F.cross_entropy(model(features, edge_index, batch), labels).backward()
+        optimizer.step()
+    return isolated_node_model(model.eval())
+
+
+@pytest.mark.parametrize('variant', [variant for variant in VARIANTS if variant != 'fp32'])
+def test_variant_agrees_with_fp32_on_simulated_flows(fused, variant):
+    random.seed(1)
+    features, _ = labelled_flows(2000)
+    edge_index, batch = self_loop_graph(features.size(0))
+    model = build_variant(fused, variant, DEFAULT_PRUNE_AMOUNT, calibration_features())
+    with torch.no_grad():
+        expected = fused(features, edge_index, batch).argmax(dim=1)
+        actual = model(features, edge_index, batch).argmax(dim=1)
+    assert (actual == expected).float().mean().item() > 0.9
@@ -0,0 +1,44 @@
+import logging
+
+import torch
+
+from training_gcn_model import DEFAULT_NUM_NEIGHBORS, NetworkFlowGCN, NeighborSubgraphSampler, ThreatDetectionTrainer
+
+
+def path_graph(num_nodes):
+    """0 - 1 - 2 - ... as a symmetric edge index, so node i is i hops from node 0"""
+    left = torch.arange(num_nodes - 1)
+    return torch.stack([torch.cat([left, left + 1]), torch.cat([left + 1, left])])
+
+
+def receptive_field(model, x, edge_index, node):
+    """Nodes whose features change the model's output at `node`"""
+    x = x.clone().requires_grad_(True)
+    model(x, edge_index)[node].sum().backward()
+    return set(x.grad.abs().sum(dim=1).nonzero().view(-1).tolist())
+
+
+def test_default_fanouts_cover_the_receptive_field():
+    torch.manual_seed(0)
+    model = NetworkFlowGCN(input_dim=4, hidden_dim=32, num_classes=5).eval()
+    x, edge_index = torch.randn(12, 4), path_graph(12)
+    field = receptive_field(model, x, edge_index, 0)
+    assert field == set(range(model.num_layers + 1))
+
+    def sampled(num_neighbors):
+        sampler = NeighborSubgraphSampler(edge_index, x, torch.zeros(12, dtype=torch.long), num_neighbors)
+        return set(sampler([0]).n_id.tolist())
+
+    assert len(DEFAULT_NUM_NEIGHBORS) == model.num_layers
+    assert field <= sampled(DEFAULT_NUM_NEIGHBORS)
+    # Two hops leave out everything the third to fifth layers bring in
+    assert field - sampled((10, 10)) == {3, 4, 5}
+
+
+def test_trainer_warns_when_sampling_fewer_hops_than_layers(caplog):
+    trainer = ThreatDetectionTrainer(NetworkFlowGCN(input_dim=4, hidden_dim=32, num_classes=5))
+    with caplog.at_level(logging.WARNING, logger='training_gcn_model'):
+        trainer._check_fanout_depth(DEFAULT_NUM_NEIGHBORS)
+        assert not caplog.records
+        trainer._check_fanout_depth((10, 10))
+    assert 'nodes 3-5 hops away' in caplog.text
@@ -0,0 +1,30 @@
+import pytest
+
+import serving
+
+
+@pytest.fixture
+def eager_fp32(monkeypatch):
+    monkeypatch.setattr(serving, 'MODEL_RUNTIME', 'eager')
+    monkeypatch.setattr(serving, 'MODEL_VARIANT', 'fp32')
+
+
+def test_neighbour_window_is_off_by_default(eager_fp32, monkeypatch):
+    monkeypatch.setattr(serving, 'FLOW_INDEX_K', 0)
+    assert serving.flow_index_from_env() is None
+    monkeypatch.setattr(serving, 'FLOW_INDEX_K', 3)
+    assert serving.flow_index_from_env().k == 3
+
+
+@pytest.mark.parametrize('setting, value, worker_pool, reason', [
+    ('MODEL_VARIANT', 'int8', False, 'MODEL_VARIANT=int8'),
+    ('MODEL_RUNTIME', 'torchscript', False, 'MODEL_RUNTIME=torchscript'),
+    ('MODEL_VARIANT', 'fp32', True, 'DETECTION_WORKERS'),
+])
+def test_runtimes_without_neighbour_scoring_warn_and_disable_it(eager_fp32, monkeypatch, capsys,
+                                                                setting, value, worker_pool, reason):
+    monkeypatch.setattr(serving, 'FLOW_INDEX_K', 3)
+    monkeypatch.setattr(serving, setting, value)
+    assert serving.flow_index_from_env(worker_pool=worker_pool) is None
+    output = capsys.readouterr().out
+    assert 'FLOW_INDEX_K=3 is ignored' in output and reason in output
@@ -0,0 +1,92 @@
+import os
+import signal
+import time
+
+import pytest
+
+from conftest import make_model
+from utils import detect_threats
+from worker_pool import DetectionWorkerPool, WorkerCrashedError
+
+
+def kill_worker(pool, index=0):
+    worker = pool._workers[index]
+    os.kill(worker.pid, signal.SIGKILL)
+    worker.join(10)
+
+
+def threat_types(results):
+    return [result['threat_type'] for result in results]
+
+
+@pytest.fixture
+def pool_factory():
+    pools = []
+
+    def make(get_model, **options):
+        # A long interval keeps the collector from checking liveness on its own, so tests decide when
+        options.setdefault('liveness_interval', 60)
+        pool = DetectionWorkerPool(get_model, num_workers=1, **options)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close(timeout=10)
+
+
+def test_pool_matches_in_process_scoring(pool_factory, model, flows):
+    pool = pool_factory(lambda: model)
+    results = [future.result(timeout=60) for future in pool.submit_many(flows)]
+    assert threat_types(results) == threat_types(detect_threats(model, flows))
+
+
+def test_dead_worker_fails_its_batches_and_is_respawned(pool_factory, model, flows):
+    pool = pool_factory(lambda: model)
+    [future.result(timeout=60) for future in pool.submit_many(flows)]
+
+    kill_worker(pool)
+    lost = pool.submit_many(flows)
+    pool._check_workers()
+    for future in lost:
+        with pytest.raises(WorkerCrashedError):
+            future.result(timeout=10)
+
+    results = [future.result(timeout=60) for future in pool.submit_many(flows)]
+    assert threat_types(results) == threat_types(detect_threats(model, flows))
+    assert pool._restarts == [1]
+
+
+def test_retired_workers_fall_back_to_in_process_scoring(pool_factory, model, flows):
+    pool = pool_factory(lambda: model, max_restarts=0)
+    kill_worker(pool)
+    pool._check_workers()
+    assert pool._workers == [None]
+
+    results = [future.result(timeout=10) for future in pool.submit_many(flows)]
+    assert threat_types(results) == threat_types(detect_threats(model, flows))
+
+
+def test_superseded_weights_are_deleted_after_reload(pool_factory, flows):
+    current = {'model': make_model(seed=0)}
+    pool = pool_factory(lambda: current['model'])
+    current['model'] = make_model(seed=1)
+
+    results = [future.result(timeout=60) for future in pool.submit_many(flows)]
+    assert threat_types(results) == threat_types(detect_threats(current['model'], flows))
+    deadline = time.monotonic() + 30
+    while len(os.listdir(pool._weights_dir)) > 1 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert os.listdir(pool._weights_dir) == ['weights-2.pt']
+
+
+def test_collector_notices_a_dead_worker_on_its_own(pool_factory, model, flows):
+    pool = pool_factory(lambda: model, liveness_interval=0.1)
+    kill_worker(pool)
+    for future in pool.submit_many(flows):
+        try:
+            future.result(timeout=30)
+        except WorkerCrashedError:
+            pass
+    results = [future.result(timeout=60) for future in pool.submit_many(flows)]
+    assert threat_types(results) == threat_types(detect_threats(model, flows))
@@ -6,7 +6,6 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
-import joblib
 import json
 import logging
 from datetime import datetime
@@ -14,7 +13,11 @@ from sklearn.metrics import classification_report, confusion_matrix, accuracy_sc
 from sklearn.model_selection import train_test_split
 
 sys.path.append('.')
-from training_gcn_model import NetworkFlowGCN, NetworkGraphBuilder, ThreatDetectionTrainer, create_train_val_test_masks
+from training_gcn_model import (NetworkFlowGCN, NetworkGraphBuilder, ThreatDetectionTrainer, create_train_val_test_masks,
+                                knn_edge_index)
+from flow_ingest import RunningStats, fill_non_finite
+from feature_store import FeatureStore, builder_config, ingested_dataset, ingested_graph_config
+from model_bundle import save_bundle, scaler_arrays
 
 logging.basicConfig(
     level=logging.INFO,
@@ -103,19 +106,64 @@ class ThreatDetectionPipeline:
             logger.error(f"Error loading dataset: {e}")
             raise
 
+    def ingest_dataset(self, dataset_path):
+        """Stream the CSV into a memory-mapped cache (reused if already present)"""
+        return ingested_dataset(dataset_path, os.path.join(self.config.get('cache_dir', 'cache'), 'ingest'),
+                                chunksize=self.config.get('chunksize', 100000))
+
+    def feature_config(self):
+        """Feature store config: the builder that runs, a digest of its code and its parameters"""
+        knn_k = self.config.get('knn_k', 5)
+        if self.config.get('streaming_ingest'):
+            return ingested_graph_config(knn_k=knn_k, chunksize=self.config.get('chunksize', 100000))
+        return builder_config(NetworkGraphBuilder.create_graph_from_flows, ThreatDetectionPipeline.load_dataset,
+                              ThreatDetectionPipeline.preprocess_data, RunningStats, fill_non_finite,
+                              knn_edge_index, knn_k=knn_k)
+
+    def build_features(self, dataset_path):
+        graph_builder = NetworkGraphBuilder()
+        knn_k = self.config.get('knn_k', 5)
+        if self.config.get('streaming_ingest'):
+            # Out-of-core path: chunked CSV -> memory-mapped cache -> graph, never the whole DataFrame.
+            # It fills non-finite values and codes categorical columns like preprocess_data, but keeps
+            # duplicate rows and the original class balance; the non-negative shift cancels in scaling.
+            logger.info("Streaming ingest: duplicate removal and class rebalancing are skipped")
+            dataset = self.ingest_dataset(dataset_path)
+            data, _ = graph_builder.create_graph_from_ingested(
+                dataset, chunksize=self.config.get('chunksize', 100000), knn_k=knn_k)
+        else:
+            df, label_col = self.load_dataset(dataset_path)
+            df = self.preprocess_data(df, label_col)
+            data, _ = graph_builder.create_graph_from_flows(df, label_col, knn_k=knn_k)
+        return data, graph_builder
+
+    def load_features(self, dataset_path):
+        """Preprocessed graph from the feature store, rebuilt only when the dataset, config or builder code changes"""
+        store = FeatureStore(os.path.join(self.config.get('cache_dir', 'cache'), 'feature_store'))
+        return store.get_or_build(dataset_path, self.feature_config(), lambda: self.build_features(dataset_path))
+
     def preprocess_data(self, df, label_col):
         logger.info("Preprocessing data...")
 
-        missing_count = df.isnull().sum().sum()
+        # One pass over the float feature columns gathers NaN/inf counts, medians and finite min/max
+        float_cols = [col for col in df.columns if col != label_col and pd.api.types.is_float_dtype(df[col])]
+        other_cols = [col for col in df.columns if col not in float_cols]
+        values = df[float_cols].to_numpy(dtype=np.float64)
+        stats = RunningStats(len(float_cols), reservoir_size=max(len(df), 1))
+        stats.update(values)
+
+        missing_count = int(stats.nan_count.sum()) + int(df[other_cols].isnull().sum().sum())
         logger.info(f"Missing values: {missing_count}")
         if missing_count > 0:
-            for col in df.columns:
-                if col != label_col:
-                    if df[col].dtype in ['int64', 'float64']:
-                        df[col] = df[col].fillna(df[col].median())
-                    else:
-                        df[col] = df[col].fillna(df[col].mode()[0] if not df[col].mode().empty else 'unknown')
-            logger.info("Missing values handled")
+            for col in other_cols:
+                if col != label_col and df[col].dtype != 'int64' and df[col].isnull().any():
+                    df[col] = df[col].fillna(df[col].mode()[0] if not df[col].mode().empty else 'unknown')
+
+        # Then a single vectorized pass: NaN -> median, +inf -> finite max, -inf -> finite min
+        if (stats.nan_count + stats.posinf_count + stats.neginf_count).any():
+            df[float_cols] = fill_non_finite(values, stats)
+            if missing_count > 0:
+                logger.info("Missing values handled")
 
         initial_size = len(df)
         df = df.drop_duplicates()
@@ -123,20 +171,6 @@ class ThreatDetectionPipeline:
         if duplicates_removed > 0:
             logger.info(f"Removed {duplicates_removed} duplicate rows")
 
-        numeric_cols = df.select_dtypes(include=[np.number]).columns
-        for col in numeric_cols:
-            if col != label_col:
-                pos_inf_mask = np.isposinf(df[col])
-                neg_inf_mask = np.isneginf(df[col])
-
-                if pos_inf_mask.any():
-                    finite_max = df.loc[~pos_inf_mask, col].max()
-                    df.loc[pos_inf_mask, col] = finite_max if not pd.isna(finite_max) else 0
-
-                if neg_inf_mask.any():
-                    finite_min = df.loc[~neg_inf_mask, col].min()
-                    df.loc[neg_inf_mask, col] = finite_min if not pd.isna(finite_min) else 0
-
         categorical_cols = df.select_dtypes(include=['object']).columns
         categorical_cols = [col for col in categorical_cols if col != label_col]
 
@@ -182,9 +216,9 @@ class ThreatDetectionPipeline:
                 logger.warning(f"Converting remaining object column to numeric: {col}")
                 df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
 
-        for col in feature_cols:
-            if df[col].min() < 0:
-                df[col] = df[col] - df[col].min()
+        col_mins = df[feature_cols].min()
+        for col in col_mins.index[col_mins < 0]:
+            df[col] = df[col] - col_mins[col].astype(df[col].dtype)
 
         logger.info(f"Preprocessing complete. Final shape: {df.shape}")
         logger.info(f"Features: {len(feature_cols)}, Classes: {df[label_col].nunique()}")
@@ -194,11 +228,10 @@ class ThreatDetectionPipeline:
     def train_model(self, dataset_path):
         logger.info("Starting GCN model training...")
 
-        df, label_col = self.load_dataset(dataset_path)
-        df = self.preprocess_data(df, label_col)
-
-        self.graph_builder = NetworkGraphBuilder()
-        data, self.class_names = self.graph_builder.create_graph_from_flows(df, label_col)
+        features = self.load_features(dataset_path)
+        data = features.to_data()
+        self.graph_builder = features.graph_builder()
+        self.class_names = features.class_names
 
         data.train_mask, data.val_mask, data.test_mask = create_train_val_test_masks(
             data.num_nodes,
@@ -350,11 +383,16 @@ class ThreatDetectionPipeline:
             models_dir = Path("models")
             models_dir.mkdir(exist_ok=True)
 
-            torch.save(self.model.state_dict(), models_dir / "gcn_threat_detector.pth")
-
-            joblib.dump(self.graph_builder, models_dir / "graph_builder.pkl")
+            # Weights, scaler arrays, class names and architecture in one versioned bundle
+            bundle_path = save_bundle(
+                self.model, str(models_dir / "bundles"), self.class_names,
+                scaler=scaler_arrays(self.graph_builder.scaler),
+                feature_names=self.graph_builder.feature_names
+            )
+            logger.info(f"Model bundle saved: {bundle_path}")
 
             model_info = {
+                'bundle_version': os.path.basename(bundle_path),
                 'model_type': 'NetworkFlowGCN',
                 'input_dim': self.model.input_dim,
                 'hidden_dim': self.model.hidden_dim,
@@ -389,7 +427,11 @@ def main():
         'epochs': 200,
         'patience': 25,
         'test_size': 0.2,
-        'val_size': 0.2
+        'val_size': 0.2,
+        # Set for datasets that do not fit in memory; see build_features for what it skips
+        'streaming_ingest': False,
+        'cache_dir': 'cache',
+        'chunksize': 100000
     }
 
     pipeline = ThreatDetectionPipeline(config)
@@ -457,8 +499,7 @@ def main():
         logger.info(f"Training Duration: {len(results['training_history']['train_loss'])} epochs")
         logger.info("")
         logger.info("Generated Files:")
-        logger.info("   - models/gcn_threat_detector.pth")
-        logger.info("   - models/graph_builder.pkl")
+        logger.info("   - models/bundles/<version>/")
         logger.info("   - models/model_info.json")
         logger.info("   - logs/confusion_matrix.png")
         logger.info("   - logs/training_history.png")